@@ -5,6 +5,10 @@ trap 'echo "tests failed"; exit 1' ERR
 # remove test.db
 rm ./test.db
 
+# uni.database
+python3 -m uni.database.sqlite_test
+python3 -m uni.database.database_cache_test
+
 # uni.cache
 python3 -m uni.cache.dbcache_test
 
@@ -80,7 +80,7 @@ class CacheInDatabase(UniDefault):
         logger.debug(f"Checking for expired cache entries, model:{self._cache_model.__name__}")
 
         now_ts = timestamp_factory()
-        expired = database_factory().find({}, self._cache_model).filter(["expires", "!=", 0]).filter(["expires", "<", now_ts]).fetch()
+        expired = list(database_factory().find({}, self._cache_model).filter(["expires", "!=", 0]).filter(["expires", "<", now_ts]).fetch())
 
         for e in expired:
             self.thread_wait()
@@ -152,7 +152,8 @@ def __cmd_all(permissions_file: str, root: bool) -> int:
         int: Returns 0 if the permissions are set for all users, otherwise returns 1 if there is an error.
     """
 
-    users = database_factory().find({}, db_User).fetch()
+    # fetched before updates, fetch streams from open cursor
+    users = list(database_factory().find({}, db_User).fetch())
 
     for u in users:
         email = u.email
@@ -54,8 +54,17 @@ class Config(BaseModel):
     database_string: str = Field(default="sqlite://uni.db", description="Database connection string")
     database_export_directory: str = Field(default="./dumps", description="Database export directory")
 
+    sqlite_mmap_size: int = Field(default=268435456, description="SQLite memory-mapped I/O size in bytes (0 = disabled)")
+    sqlite_cache_size: int = Field(default=-65536, description="SQLite page cache size (negative value = size in KiB)")
+
     mongo_cache_enabled: bool = Field(default=False, description="Enable MongoDB cache")
     mongo_cache_size: int = Field(default=1000, description="MongoDB cache size")
+    mongo_cache_ttl: int = Field(default=30, description="MongoDB cache entry time to live in seconds (0 = no expiration)")
+    mongo_cache_max_bytes: int = Field(default=67108864, description="MongoDB cache byte budget of cached find results (0 = unlimited)")
+    mongo_cache_backend: str = Field(default="local", description="MongoDB cache backend (local = per process, redis = shared by all workers)")
+    mongo_cache_url: str = Field(default="redis://localhost:6379/0", description="MongoDB cache redis url (redis backend)")
+    mongo_cache_prefix: str = Field(default="uni", description="MongoDB cache redis key prefix (redis backend)")
+    mongo_sequence_block: int = Field(default=100, description="MongoDB sequence values reserved per process in one round trip (1 = no block allocation)")
 
     # security
     security_password_salt: str = Field(default="", description="Security password salt")
@@ -79,6 +88,10 @@ class Config(BaseModel):
     # performance
     performance_default_fetch_dict: bool = Field(default=False, description="Default fetch dictionary")
     multiple_count_use_threads: bool = Field(default=True, description="Use threads for multiple count")
+    database_async_workers: int = Field(default=32, description="Threads of database executor used by async database API (per database backend)")
+    database_record_cache_size: int = Field(default=10000, description="Maximum count of records in get_one cache (models with _cache_ttl)")
+    database_counter_ttl: int = Field(default=5, description="Materialized counter time to live in seconds, bounds drift from writes of other workers (without shared cache generations)")
+    database_counter_size: int = Field(default=10000, description="Maximum count of materialized counters (models with _counters)")
 
     # modules
     module_auth_enabled: bool = Field(default=True, description="Enable auth module")
@@ -13,7 +13,7 @@ from fastapi import params
 from ..exceptions import ServerError
 
 
-from .base import Database, DbOrder, DbParams, DbResult
+from .base import Database, DbAggregateParams, DbCountMode, DbOrder, DbParams, DbResult
 from .mongo import MongoDatabase
 from .sqlite import SQLiteDatabase
 from .model import DatabaseModel
@@ -26,6 +26,8 @@ logger = core_logger().getChild("database")
 
 __all__ = [
     'Database',
+    'DbAggregateParams',
+    'DbCountMode',
     'DbOrder',
     'DbParams',
     'DbResult',
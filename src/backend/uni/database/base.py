@@ -9,20 +9,34 @@ database module
 from __future__ import annotations
 from _collections_abc import dict_keys
 from abc import ABC, abstractmethod
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import contextvars
+import base64
 from copy import deepcopy
-from enum import IntEnum
+from enum import Enum, IntEnum
+import functools
+import itertools
+from inspect import isclass
+import json
 import operator as op
+import orjson
 import os
-from typing import Dict, Generic, Iterable, Optional, List, Type, TypeVar, Any
+import threading
+from typing import AsyncIterator, Callable, Dict, Generic, Iterable, Iterator, Optional, List, Tuple, Type, TypeVar, Any
 import uuid
 from pydantic import BaseModel, Field
-from pydantic.fields import ModelField
+from pydantic.fields import SHAPE_SINGLETON, ModelField
 
 
-from .model import DatabaseModel
+from .counters import ModelCounters
+from .database_cache import RecordCache
+from .model import DatabaseModel, _private_default
 from ..default import UniDefault
 from ..exceptions import BaseHTTPException, ServerError
 from ..logger import color_red, core_logger
+from ..events import register_event_subscriber
 from ..events.base import EventCreated, EventUpdated, EventDeleted, Event
 from ..config import get_config
 
@@ -48,6 +62,46 @@ def _get_maintenance() -> bool:
     """ returns true if maintenance flag is set """
     return __cfg.get("maintenance", False)
 
+# bounded executors of async database API, one per database backend
+_executors: Dict[str, ThreadPoolExecutor] = dict()
+_executors_lock = threading.Lock()
+
+def _executor(name: str) -> ThreadPoolExecutor:
+    """ returns executor of database backend, created on first use """
+    with _executors_lock:
+        executor = _executors.get(name, None)
+        if executor is None:
+            workers = max(int(get_config().database_async_workers), 1)
+            executor = _executors[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"uni-{name}")
+        return executor
+
+async def _run_in_executor(executor: Optional[ThreadPoolExecutor], fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """ runs blocking call in executor, caller context (context vars) is kept """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+# get_one identity map, invalidated by update/delete events
+_record_cache = RecordCache()
+register_event_subscriber(EventUpdated, _record_cache.on_event)
+register_event_subscriber(EventDeleted, _record_cache.on_event)
+
+# materialized counters of models with _counters, maintained from events
+_model_counters = ModelCounters()
+register_event_subscriber(EventCreated, _model_counters.on_created)
+register_event_subscriber(EventUpdated, _model_counters.on_updated)
+register_event_subscriber(EventDeleted, _model_counters.on_deleted)
+
+def _group_by_model(records: Iterable[DatabaseModel]) -> Dict[Type[DatabaseModel], List[DatabaseModel]]:
+    """ group records by model class (collection) """
+    ret: Dict[Type[DatabaseModel], List[DatabaseModel]] = dict()
+    for r in records:
+        ret.setdefault(r.__class__, []).append(r)
+    return ret
+
+# same as fastapi ORJSONResponse
+DB_JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
 DB_FILTER_OPERATORS = {
     ">": op.gt,
     "<": op.lt,
@@ -84,6 +138,67 @@ class DbOrder(IntEnum):
     ASC = 0
     DESC = 1
 
+class DbCountMode(str, Enum):
+    """ count of records: exact or estimated (huge collections) """
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+
+# estimated count, sampled records and matches needed in sample (selective filter is counted exactly)
+DB_COUNT_SAMPLE = 10000
+DB_COUNT_MIN_SAMPLE_MATCHES = 10
+
+# aggregate functions of DbResult.aggregate, metric is (function, field), count of records has no field
+DB_AGGREGATE_FUNCTIONS = ("count", "sum", "avg", "min", "max")
+# most frequent values per facet field
+DB_FACET_LIMIT = 100
+
+DbMetric = Tuple[str, Optional[str]]
+
+# records pulled from database executor per step of async iteration
+DB_ASYNC_FETCH_BATCH = 500
+
+# default sort of database backends, newest first
+DB_SORT_KEY = "created.timestamp"
+DB_SORT_ORDER = DbOrder.DESC
+
+class DbCursor(BaseModel):
+    """ keyset pagination cursor, position of record in result sorted by key and id """
+    key: str
+    order: DbOrder
+    value: Any = None
+    id: uuid.UUID
+
+    @classmethod
+    def from_record(cls, key: str, order: DbOrder, record: Any) -> DbCursor:
+        """ cursor pointing to record (model or dict) """
+        data = record if isinstance(record, dict) else record.dict()
+        value = data
+        for k in key.split("."):
+            value = value.get(k, None) if isinstance(value, dict) else None
+        return cls(key=key, order=order, value=value, id=data["id"])
+
+    @classmethod
+    def decode(cls, cursor: str) -> DbCursor:
+        """ decode opaque cursor string """
+        try:
+            key, order, value, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            # uuid value? same as FilterCondition
+            if isinstance(value, str):
+                try:
+                    value = uuid.UUID(value)
+                except:
+                    pass
+            return cls(key=key, order=DbOrder(order), value=value, id=id)
+        except Exception as e:
+            msg = f"bad cursor: {cursor}, {e}"
+            logger.error(color_red(msg))
+            raise ServerError(msg)
+
+    def encode(self) -> str:
+        """ opaque cursor string """
+        data = json.dumps([self.key, int(self.order), self.value, str(self.id)], default=str)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
 class DbParams(BaseModel):
     """ DbResult parameters"""
     sort_key: Optional[str] = None
@@ -93,7 +208,34 @@ class DbParams(BaseModel):
     filters: Optional[List[Any]] = None
     join: Optional[List[List[str]]] = None
     fetch_dict: bool = Field(default_factory=_fetch_dict_default_factory)
+    after: Optional[str] = None
+    before: Optional[str] = None
+    fields: Optional[List[str]] = None
+    count_mode: DbCountMode = DbCountMode.EXACT
     
+    @property
+    def sorting(self) -> Tuple[str, DbOrder]:
+        """ sort key and order of result """
+        if self.sort_key is None: return DB_SORT_KEY, DB_SORT_ORDER
+        if self.sort_order is None: return self.sort_key, DbOrder.ASC
+        return self.sort_key, self.sort_order
+
+    def cursors(self, items: List[Any], count: Optional[int] = None) -> Dict[str, str]:
+        """ next and previous page cursors of fetched items, keyset pagination, count if items are only first and last record """
+        ret: Dict[str, str] = dict()
+        if not items: return ret
+        if count is None: count = len(items)
+
+        key, order = self.sorting
+        full = False
+        if self.limit_from is not None and self.limit_to:
+            full = count >= self.limit_to - self.limit_from
+
+        if full or self.before is not None:
+            ret["next"] = DbCursor.from_record(key, order, items[-1]).encode()
+        if self.after is not None or (full and self.before is not None):
+            ret["prev"] = DbCursor.from_record(key, order, items[0]).encode()
+        return ret
     
     def apply(self, result: DbResult[T_DatabaseModel]) -> DbResult[T_DatabaseModel]:
         """ apply user database params """
@@ -119,11 +261,36 @@ class DbParams(BaseModel):
                 result = result.sort(self.sort_key, self.sort_order)
             else: result = result.sort(self.sort_key)
 
+        # keyset pagination, cursor has to match sort
+        if self.after is not None and self.before is not None:
+            raise ServerError("after and before cursors can not be combined")
+        if self.after is not None or self.before is not None:
+            cursor = DbCursor.decode(self.after if self.after is not None else self.before)  # type: ignore
+            if (cursor.key, cursor.order) != self.sorting:
+                raise ServerError(f"cursor does not match sort: {cursor.key}, {cursor.order.name}")
+            result = result.keyset(cursor, before=self.before is not None)
+
+        # projection of fetched dicts, sort key is kept for cursors
+        if self.fields:
+            key = self.sorting[0]
+            fields = [f for f in self.fields if not (f.startswith("-") and (key == f[1:] or key.startswith(f[1:]+".")))]
+            if fields and not fields[0].startswith("-"):
+                fields.append(key)
+            if fields:
+                result = result.project(fields)
+
         #limit
         if self.limit_from is not None:
             result = result.limit(self.limit_from, self.limit_to)
 
         return result
+
+class DbAggregateParams(DbParams):
+    """ DbResult parameters with aggregation, limit applies to group rows """
+    group_by: List[str] = []
+    metrics: Dict[str, DbMetric] = {}
+    facets: List[str] = []
+    facet_limit: int = DB_FACET_LIMIT
     
 class DbResult(Generic[T_DatabaseModel], UniDefault):
     """ 
@@ -142,6 +309,12 @@ class DbResult(Generic[T_DatabaseModel], UniDefault):
         else:
             self._data = data
         self._model = model
+        self._reversed = False
+        self._fields: List[str] = []
+        self._fields_exclude = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # count, first and last record of fetch_json_bytes/fetch_json_stream (cursors)
+        self.edges: Tuple[int, List[Any]] = (0, [])
 
     def __len__(self) -> int:
         """ return records in resultset"""
@@ -153,6 +326,29 @@ class DbResult(Generic[T_DatabaseModel], UniDefault):
         self._length = length
         return self
 
+    def _nullable_key(self, key: str) -> bool:
+        """ checks if (nested) model key can store None """
+        model: Any = self._model
+        for k in key.split("."):
+            field = model.__fields__.get(k, None) if model else None
+            if field is None or field.allow_none: return True
+            model = field.type_ if isclass(field.type_) and issubclass(field.type_, BaseModel) else None
+        return False
+
+    def _scalar_key(self, key: Any) -> None:
+        """ checks if (nested) model key is scalar field (not model, list or dict), key is used in aggregation query """
+        model: Any = self._model
+        field: Optional[ModelField] = None
+        for k in key.split(".") if isinstance(key, str) and key else []:
+            field = model.__fields__.get(k, None) if model else None
+            if field is None: break
+            model = field.type_ if isclass(field.type_) and issubclass(field.type_, BaseModel) else None
+
+        if field is None or model is not None or field.shape != SHAPE_SINGLETON or field.type_ in (dict, list, Any):
+            msg = f"key can not be aggregated: {key}"
+            logger.error(color_red(msg))
+            raise ServerError(msg)
+
     def _model_keys(self) -> dict_keys[str, ModelField]:
         """ model keys """
         return self._model.__fields__.keys()
@@ -207,10 +403,35 @@ class DbResult(Generic[T_DatabaseModel], UniDefault):
     def _filter_expression(self, exp: FilterExpression) -> DbResult[T_DatabaseModel]:
         raise NotImplementedError()
 
+    def _keyset(self, cursor: DbCursor, before: bool = False) -> DbResult[T_DatabaseModel]:
+        """ private keyset pagination, records after cursor in reversed order when before """
+        raise NotImplementedError()
+
     def _fetch(self, as_dict: bool = False) -> Iterable[T_DatabaseModel]:
         """ private basik fetch, returns result data """
         return self._data
 
+    def _fetch_json(self) -> Iterable[Tuple[bytes, Any]]:
+        """ private fetch, records (dicts) serialized to json one by one """
+        for i in self._fetch(as_dict=True):
+            yield orjson.dumps(i, option=DB_JSON_OPTIONS), i
+
+    def _fetch_with_total(self, as_dict: bool = False) -> Tuple[List[Any], int]:
+        """ private fetch with total count, fetch and count queries """
+        return list(self._fetch(as_dict=as_dict)), len(self)
+
+    def _estimated_len(self) -> Tuple[int, bool]:
+        """ private estimated count, override in database implementation """
+        return len(self), False
+
+    def _group(self, group_by: List[str], metrics: Dict[str, DbMetric]) -> List[Dict[str, Any]]:
+        """ private aggregation, override in database implementation """
+        raise NotImplementedError()
+
+    def _facets(self, fields: List[str], limit: int) -> Dict[str, List[Dict[str, Any]]]:
+        """ private facet counts, override in database implementation """
+        raise NotImplementedError()
+
     def limit(self, limit_from: int, limit_to: Optional[int] = None) -> DbResult[T_DatabaseModel]:
         """ limit result"""
         # input check
@@ -257,26 +478,186 @@ class DbResult(Generic[T_DatabaseModel], UniDefault):
             table, local_field, output_field, foreign_field = foreign_field
         )
 
+    def project(self, fields: List[str]) -> DbResult[T_DatabaseModel]:
+        """ projection of fetch_dict, fields to include or fields to exclude (prefixed by "-"), id is always included """
+        exclude = [f[1:] for f in fields if f.startswith("-")]
+        if exclude and len(exclude) != len(fields):
+            msg = f"included and excluded fields can not be combined: {fields}"
+            logger.error(color_red(msg))
+            raise ServerError(msg)
+
+        self._fields_exclude = bool(exclude)
+        if exclude:
+            self._fields = [f for f in exclude if f != "id"]
+        else:
+            self._fields = ["id"] + [f for f in fields if f != "id"]
+        return self
+
+    def keyset(self, cursor: DbCursor, before: bool = False) -> DbResult[T_DatabaseModel]:
+        """ keyset pagination, records after (or before) cursor, result has to be sorted by cursor key """
+        self._reversed = before
+        return self._keyset(cursor, before)
+
     def fetch(self) -> Iterable[T_DatabaseModel]:
-        """ returns result data """
+        """ returns result data, records may be streamed from connection of calling thread, consume it in the same thread """
+        if self._reversed: return reversed(list(self._fetch()))
         return self._fetch()
     
     def fetch_dict(self) -> Iterable[Dict[str, Any]]:
-        """ returns result data """
+        """ returns result data, streamed as fetch """
+        if self._reversed: return reversed(list(self._fetch(as_dict=True)))
         return self._fetch(as_dict=True)
     
+    def find_with_total(self, as_dict: bool = False) -> Tuple[List[Any], int]:
+        """ returns fetched records and count of all records matching filters (limit excluded), single query if database supports it """
+        items, total = self._fetch_with_total(as_dict=as_dict)
+        if self._reversed: items.reverse()
+        return items, total
+
+    def estimated_len(self) -> Tuple[int, bool]:
+        """ returns estimated count of records (limit excluded) and estimate flag, count is exact if it is cheap """
+        return self._estimated_len()
+
+    def find_page(self, as_dict: bool = False, count_mode: DbCountMode = DbCountMode.EXACT) -> Tuple[List[Any], int, bool]:
+        """ returns fetched records, count of all records matching filters (exact or estimated) and estimate flag """
+        if count_mode != DbCountMode.ESTIMATED:
+            return self.find_with_total(as_dict=as_dict) + (False,)
+        items = list(self._fetch(as_dict=as_dict))
+        if self._reversed: items.reverse()
+        return (items,) + self._estimated_len()
+
+    def aggregate(self, group_by: Optional[List[str]] = None, metrics: Optional[Dict[str, DbMetric]] = None) -> List[Dict[str, Any]]:
+        """ metrics computed by database per group (GROUP BY, $group), rows of group keys and metric names sorted by group keys,
+            without group_by one row of all records, metrics default to count of records, sort is ignored and limit applies to groups,
+            e.g. aggregate(["user_id"], {"total": ("sum", "price"), "n": ("count", None)}) """
+        group_by = list(group_by or [])
+        metrics = dict(metrics or {"count": ("count", None)})
+        for key in group_by: self._scalar_key(key)
+        for name, (fn, key) in metrics.items():
+            if fn not in DB_AGGREGATE_FUNCTIONS or name in group_by or (key is None and fn != "count"):
+                msg = f"bad metric: {name}, {fn}, {key}"
+                logger.error(color_red(msg))
+                raise ServerError(msg)
+            if key is not None: self._scalar_key(key)
+
+        rows = self._group(group_by, metrics)
+        # empty result without groups, same as SQL aggregate of no rows
+        if not group_by and not rows:
+            rows = [{name: 0 if fn in ("count", "sum") else None for name, (fn, _) in metrics.items()}]
+        return rows
+
+    def facets(self, fields: List[str], limit: int = DB_FACET_LIMIT) -> Dict[str, List[Dict[str, Any]]]:
+        """ value counts (histograms) of fields in one query, {field: [{"value": ..., "count": ...}]}, most frequent values first """
+        if limit < 1:
+            msg = f"bad facet limit: {limit}"
+            logger.error(color_red(msg))
+            raise ServerError(msg)
+        fields = list(dict.fromkeys(fields))
+        for key in fields: self._scalar_key(key)
+        if not fields: return dict()
+        return self._facets(fields, limit)
+
+    def fetch_json_stream(self) -> Iterable[bytes]:
+        """ returns records (as fetch_dict) as json array in chunks, one chunk per record, only first and last record
+            are kept (edges, updated while streaming), reversed result (keyset before) is serialized at once """
+        if self._reversed:
+            yield self.fetch_json_bytes()
+            return
+        count, first = 0, None
+        for chunk, record in self._fetch_json():
+            if first is None: first = record
+            count += 1
+            self.edges = (count, [first, record])
+            yield (b"[" if count == 1 else b",") + chunk
+        yield b"]" if count else b"[]"
+
+    def fetch_json_bytes(self) -> bytes:
+        """ returns records (as fetch_dict) as json array, records are serialized one by one, no list of dicts is built """
+        if not self._reversed: return b"".join(self.fetch_json_stream())
+
+        # last records come first, all chunks are needed
+        chunks: List[bytes] = []
+        first, last = None, None
+        for chunk, record in self._fetch_json():
+            chunks.append(chunk)
+            if first is None: first = record
+            last = record
+        chunks.reverse()
+        first, last = last, first
+        self.edges = (len(chunks), [first, last] if chunks else [])
+        return b"[" + b",".join(chunks) + b"]"
+
     def fetch_one(self) -> Optional[T_DatabaseModel]:
         """ returns first record """
-        for i in self._fetch():
+        for i in self.fetch():
             return i
         return None
         
     def fetch_one_dict(self) -> Optional[Dict[str, Any]]:
         """ returns first record """
-        for i in self._fetch(as_dict=True):
+        for i in self.fetch_dict():
             return i
         return None
 
+    # async API, blocking calls run in database executor (Database.afind)
+    async def afetch(self) -> List[T_DatabaseModel]:
+        """ returns result data, async """
+        return await _run_in_executor(self._executor, lambda: list(self.fetch()))
+
+    async def afetch_dict(self) -> List[Dict[str, Any]]:
+        """ returns result data, async """
+        return await _run_in_executor(self._executor, lambda: list(self.fetch_dict()))
+
+    async def afetch_one(self) -> Optional[T_DatabaseModel]:
+        """ returns first record, async """
+        return await _run_in_executor(self._executor, self.fetch_one)
+
+    async def afetch_one_dict(self) -> Optional[Dict[str, Any]]:
+        """ returns first record, async """
+        return await _run_in_executor(self._executor, self.fetch_one_dict)
+
+    async def afetch_json_bytes(self) -> bytes:
+        """ returns records as json array, async """
+        return await _run_in_executor(self._executor, self.fetch_json_bytes)
+
+    async def afind_with_total(self, as_dict: bool = False) -> Tuple[List[Any], int]:
+        """ returns fetched records and count of all records matching filters, async """
+        return await _run_in_executor(self._executor, self.find_with_total, as_dict)
+
+    async def afind_page(self, as_dict: bool = False, count_mode: DbCountMode = DbCountMode.EXACT) -> Tuple[List[Any], int, bool]:
+        """ returns fetched records, count and estimate flag, async """
+        return await _run_in_executor(self._executor, self.find_page, as_dict, count_mode)
+
+    async def aestimated_len(self) -> Tuple[int, bool]:
+        """ estimated count of records and estimate flag, async """
+        return await _run_in_executor(self._executor, self.estimated_len)
+
+    async def aaggregate(self, group_by: Optional[List[str]] = None, metrics: Optional[Dict[str, DbMetric]] = None) -> List[Dict[str, Any]]:
+        """ metrics per group, async """
+        return await _run_in_executor(self._executor, self.aggregate, group_by, metrics)
+
+    async def afacets(self, fields: List[str], limit: int = DB_FACET_LIMIT) -> Dict[str, List[Dict[str, Any]]]:
+        """ value counts of fields, async """
+        return await _run_in_executor(self._executor, self.facets, fields, limit)
+
+    async def alen(self) -> int:
+        """ count of records, async """
+        return await _run_in_executor(self._executor, len, self)
+
+    async def __aiter__(self) -> AsyncIterator[T_DatabaseModel]:
+        """ async iteration over fetched records, streamed fetch is pulled from database executor in batches """
+        records = await _run_in_executor(self._executor, lambda: iter(self.fetch()))
+        try:
+            while True:
+                batch = await _run_in_executor(self._executor, lambda: list(itertools.islice(records, DB_ASYNC_FETCH_BATCH)))
+                if not batch: break
+                for i in batch:
+                    yield i
+        finally:
+            # iteration stopped early, close database cursor
+            close = getattr(records, "close", None)
+            if close is not None: await _run_in_executor(self._executor, close)
+
 
 class DatabaseABC(ABC, UniDefault):
     """Abstract database class"""
@@ -324,25 +705,109 @@ class DatabaseABC(ABC, UniDefault):
         """Export database"""
 
 class Database(DatabaseABC):
+    # export reads consistent snapshot, database stays available (no maintenance)
+    _online_export: bool = False
+
     def __init__(self):
         super().__init__()
+        self._transaction_local = threading.local()
 
     @property
     @abstractmethod
     def ok(self) -> bool:
         """ returns true if connection is ok """
+
+    def _transaction_begin(self) -> None:
+        """ begin transaction, override in database implementation """
+
+    def _transaction_commit(self) -> None:
+        """ commit transaction, override in database implementation """
+
+    def _transaction_rollback(self) -> None:
+        """ rollback transaction, override in database implementation """
+
+    @property
+    def in_transaction(self) -> bool:
+        """ returns true if current thread is inside transaction """
+        return getattr(self._transaction_local, "depth", 0) > 0
+
+    @contextmanager
+    def transaction(self) -> Iterator[Database]:
+        """
+        Unit of work, all writes inside the block are committed at once.
+
+        Nested blocks join the outer transaction, the transaction is bound to the current thread.
+        On exception all writes are rolled back and the exception is re-raised.
+
+        Usage:
+            with database.transaction():
+                database.create(a)
+                database.update(b)
+        """
+        depth = getattr(self._transaction_local, "depth", 0)
+        self._transaction_local.depth = depth + 1
+
+        # nested, join outer transaction
+        if depth:
+            try:
+                yield self
+            finally:
+                self._transaction_local.depth = depth
+            return
+
+        try:
+            self._transaction_begin()
+        except Exception as e:
+            self._transaction_local.depth = depth
+            raise ServerError(f"error starting database transaction: {e}")
+
+        _record_cache.begin()
+        _model_counters.begin()
+        committed = False
+        try:
+            try:
+                yield self
+            except BaseException:
+                self._transaction_local.depth = depth
+                try:
+                    self._transaction_rollback()
+                except Exception as e:
+                    logger.error(color_red(f"error rolling back database transaction: {e}"))
+                raise
+
+            self._transaction_local.depth = depth
+            try:
+                self._transaction_commit()
+            except Exception as e:
+                raise ServerError(f"error committing database transaction: {e}")
+            committed = True
+        finally:
+            _record_cache.end()
+            _model_counters.end(committed)
     
-    def _publish_event(self, record: DatabaseModel, event: Type[Event]) -> None:
-        """ publish event, if needed """
-        if not record._event: return None
+    def _publish_event(self, record: DatabaseModel, event: Type[Event], previous: Optional[DatabaseModel] = None) -> None:
+        """ publish event, if needed, previous is stored record before update """
+        if not record._event:
+            # caches are maintained by events, no subscriber is called here
+            if event is not EventCreated: _record_cache.discard(record.__class__.__name__, record.id)
+            if record._counters: _model_counters.drop(record.__class__)
+            return None
         e = event(record)
+        if previous is not None: e.previous = previous
         e.publish()
 
+    def _previous(self, record: DatabaseModel) -> Optional[DatabaseModel]:
+        """ stored record before update, loaded for models with materialized counters only """
+        if not record._counters: return None
+        return self._get_one(record.id, record.__class__)
+
     def create(self, record: DatabaseModel) -> Optional[uuid.UUID]:
         """Save record to database"""
         try:
-            r = self._create(record)
-            if r: self._publish_event(record, EventCreated)
+            record.perm_bits = record.permissions.bits()
+            with _model_counters.writing(record.__class__):
+                r = self._create(record)
+                if r: self._publish_event(record, EventCreated)
             return r
         except BaseHTTPException as e:
             raise
@@ -352,8 +817,11 @@ class Database(DatabaseABC):
     def update(self, record: DatabaseModel) -> Optional[uuid.UUID]:
         """Update record in database"""
         try:
-            r = self._update(record)
-            if r: self._publish_event(record, EventUpdated)
+            record.perm_bits = record.permissions.bits()
+            previous = self._previous(record)
+            with _model_counters.writing(record.__class__):
+                r = self._update(record)
+                if r: self._publish_event(record, EventUpdated, previous)
             return r
         except BaseHTTPException as e:
             raise
@@ -363,23 +831,92 @@ class Database(DatabaseABC):
     def delete(self, record: DatabaseModel) -> Optional[uuid.UUID]:
         """delete record from database"""
         try:
-            r = self._delete(record)
-            if r: self._publish_event(record, EventDeleted)
+            with _model_counters.writing(record.__class__):
+                r = self._delete(record)
+                if r: self._publish_event(record, EventDeleted)
             return r
         except BaseHTTPException as e:
             raise
         except Exception as e:
             raise ServerError(f"error deleting database record: {e}")
 
+    def _create_many(self, records: List[DatabaseModel]) -> List[uuid.UUID]:
+        """ create records of one model, override with bulk operation in database implementation """
+        return [r for r in (self._create(record) for record in records) if r]
+
+    def _update_many(self, records: List[DatabaseModel]) -> List[uuid.UUID]:
+        """ update records of one model, override with bulk operation in database implementation """
+        return [r for r in (self._update(record) for record in records) if r]
+
+    def _delete_many(self, records: List[DatabaseModel]) -> List[uuid.UUID]:
+        """ delete records of one model, override with bulk operation in database implementation """
+        return [r for r in (self._delete(record) for record in records) if r]
+
+    def _bulk(self, records: Iterable[DatabaseModel], fn: Any, event: Type[Event]) -> List[uuid.UUID]:
+        """ run bulk operation per model in one transaction, publish event for every affected record """
+        ret: List[uuid.UUID] = []
+        with self.transaction():
+            for model, _records in _group_by_model(records).items():
+                for record in _records: record.perm_bits = record.permissions.bits()
+                previous = {r.id: self._previous(r) for r in _records} if event is EventUpdated else {}
+                with _model_counters.writing(model):
+                    ids = fn(_records)
+                    _ids = set(ids)
+                    for record in _records:
+                        if record.id in _ids: self._publish_event(record, event, previous.get(record.id, None))
+                ret += ids
+        return ret
+
+    def create_many(self, records: Iterable[DatabaseModel]) -> List[uuid.UUID]:
+        """Save records to database in one bulk operation, returns ids of created records"""
+        try:
+            return self._bulk(records, self._create_many, EventCreated)
+        except BaseHTTPException as e:
+            raise
+        except Exception as e:
+            raise ServerError(f"error creating database records: {e}")
+
+    def update_many(self, records: Iterable[DatabaseModel]) -> List[uuid.UUID]:
+        """Update records in database in one bulk operation, returns ids of updated records"""
+        try:
+            return self._bulk(records, self._update_many, EventUpdated)
+        except BaseHTTPException as e:
+            raise
+        except Exception as e:
+            raise ServerError(f"error updating database records: {e}")
+
+    def delete_many(self, records: Iterable[DatabaseModel]) -> List[uuid.UUID]:
+        """Delete records from database in one bulk operation, returns ids of deleted records"""
+        try:
+            return self._bulk(records, self._delete_many, EventDeleted)
+        except BaseHTTPException as e:
+            raise
+        except Exception as e:
+            raise ServerError(f"error deleting database records: {e}")
+
     def get_one(self, id: uuid.UUID, model: Type[T_DatabaseModel]) -> Optional[T_DatabaseModel]:
-        """Get record from database by id and model(collection)"""
+        """Get record from database by id and model(collection), cached for models with _cache_ttl (outside of transaction)"""
         try:
-            return self._get_one(id, model)
+            ttl = _private_default(model, "_cache_ttl")
+            if not ttl or self.in_transaction: return self._get_one(id, model)
+
+            record = _record_cache.get(model, id)
+            if record is not None: return record
+            version = _record_cache.version()
+            record = self._get_one(id, model)
+            if record is not None: _record_cache.set(record, ttl, version)
+            return record
         except BaseHTTPException as e:
             raise
         except Exception as e:
             raise ServerError(f"error getting database record: {e}")
 
+    def count(self, model: Type[T_DatabaseModel], params: DbParams, counter: Callable[[], int], user_id: Optional[uuid.UUID] = None) -> int:
+        """ count of records matching params visible to user (None = all records), answered by materialized counter
+            of model (_counters) if filters are equality conditions on declared keys, otherwise (or in transaction) counter() is called """
+        if self.in_transaction: return counter()
+        return _model_counters.count(model, params, user_id, counter)
+
     def find(self, query: dict, model: Type[T_DatabaseModel]) -> DbResult[T_DatabaseModel]:
         """Get record from database by id and model(collection)"""
         try:
@@ -389,6 +926,39 @@ class Database(DatabaseABC):
         except Exception as e:
             raise ServerError(f"error finding database record: {e}")
         
+    # async API, blocking database calls run in bounded executor of database backend,
+    # event loop is not blocked and no threadpool slot of web server is used, calls are outside of current transaction
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """ executor of async database API """
+        return _executor(self.__class__.__name__)
+
+    async def arun(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """ runs blocking call in database executor """
+        return await _run_in_executor(self.executor, fn, *args, **kwargs)
+
+    async def acreate(self, record: DatabaseModel) -> Optional[uuid.UUID]:
+        """Save record to database, async"""
+        return await self.arun(self.create, record)
+
+    async def aupdate(self, record: DatabaseModel) -> Optional[uuid.UUID]:
+        """Update record in database, async"""
+        return await self.arun(self.update, record)
+
+    async def adelete(self, record: DatabaseModel) -> Optional[uuid.UUID]:
+        """Delete record from database, async"""
+        return await self.arun(self.delete, record)
+
+    async def aget_one(self, id: uuid.UUID, model: Type[T_DatabaseModel]) -> Optional[T_DatabaseModel]:
+        """Get record from database by id and model(collection), async"""
+        return await self.arun(self.get_one, id, model)
+
+    def afind(self, query: dict, model: Type[T_DatabaseModel]) -> DbResult[T_DatabaseModel]:
+        """Find records, result is built without I/O, fetch with afetch/afetch_dict/... or async for"""
+        r = self.find(query, model)
+        r._executor = self.executor
+        return r
+
     def create_table(self, table: str, model: Type[T_DatabaseModel]) -> None:
         try:
             self._create_table(table, model)
@@ -399,7 +969,7 @@ class Database(DatabaseABC):
         
     def export_database(self) -> str:
         try:
-            _set_maintenance(True)
+            _set_maintenance(not self._online_export)
             export_filename = self._export_database()
             _set_maintenance(False)
             return export_filename
@@ -414,6 +984,8 @@ class Database(DatabaseABC):
         try:
             _set_maintenance(True)
             export_filename = self._import_database(filename, drop)
+            _record_cache.clear()
+            _model_counters.clear()
             _set_maintenance(False)
             return export_filename
         except BaseHTTPException as e:
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+"""
+uni.database.counters
+
+materialized counters of models with _counters, count of records matching equality filters
+on declared keys, maintained from create/update/delete events
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Generator, List, Optional, Tuple, Type
+import uuid
+
+from ..default import UniDefault
+from ..logger import core_logger
+from ..services.permission import perm_bits_mask
+from .database_cache import DatabaseCache, Generations
+from .model import DatabaseModel, _private_default
+
+if TYPE_CHECKING:
+    from .base import DbParams
+
+
+logger = core_logger().getChild("database.counters")
+
+# scope of counter: all records (root and public handlers) or user id (own and shared records)
+COUNTER_SCOPE_ALL = "*"
+
+CounterKey = Tuple[str, Tuple[str, ...], Tuple[Any, ...]]
+CounterChange = Tuple[CounterKey, Optional[uuid.UUID], bool, int]
+
+
+def _value(value: Any) -> Any:
+    """ filter value as compared by database (FilterCondition), uuid strings are uuids """
+    if isinstance(value, str):
+        try: return uuid.UUID(value)
+        except ValueError: return value
+    return value
+
+def _field(record: Any, key: str) -> Any:
+    """ value of (dotted) field of record """
+    for k in key.split("."):
+        record = record.get(k, None) if isinstance(record, dict) else getattr(record, k, None)
+    return record
+
+
+class ModelCounters(UniDefault):
+    """ ModelCounters class
+
+        counter per declared key set, key values and scope, first count is read from database,
+        then it is adjusted by events in O(1), changes inside transaction are applied on commit,
+        counters are not stored while write of model is in flight (count may already include written record),
+        counters are in-process, writes of other workers invalidate them through shared write generations
+        of database cache (if mongo_cache_enabled), else they expire after database_counter_ttl seconds
+    """
+    def __init__(self):
+        self._counters: OrderedDict[CounterKey, Dict[Any, Tuple[int, float, Generations]]] = OrderedDict()
+        self._versions: Dict[str, int] = dict()
+        self._inflight: Dict[str, int] = dict()
+        self._shared = DatabaseCache("counters")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def ttl(self) -> int:
+        """ get cfg, counter time to live in seconds """
+        return self.config.database_counter_ttl
+
+    @property
+    def max_size(self) -> int:
+        """ get cfg, maximum count of counted key values """
+        return self.config.database_counter_size
+
+    def stats(self) -> Dict[str, int]:
+        """ hit/miss counters """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._counters)}
+
+    def _generations(self, name: str) -> Generations:
+        """ shared write generation of model, empty if shared invalidation is disabled """
+        if not self._shared.enabled: return ()
+        return self._shared.generations([name])
+
+    def _match(self, model: Type[DatabaseModel], params: DbParams) -> Optional[CounterKey]:
+        """ counter key of params, filters have to be equality conditions on declared key set """
+        declared: List[List[str]] = _private_default(model, "_counters")
+        if not declared or params.join or params.after is not None or params.before is not None: return None
+
+        # repeated condition (e.g. injected by event subscriber) has to have same value
+        conditions: Dict[str, Any] = dict()
+        for f in params.filters or []:
+            if not isinstance(f, (list, tuple)) or len(f) != 3 or f[1] != "==" or isinstance(f[2], (list, dict)): return None
+            value = _value(f[2])
+            if conditions.setdefault(f[0], value) != value: return None
+
+        keys = tuple(sorted(conditions))
+        if not any(tuple(sorted(d)) == keys for d in declared): return None
+        return model.__name__, keys, tuple(conditions[k] for k in keys)
+
+    def count(self, model: Type[DatabaseModel], params: DbParams, user_id: Optional[uuid.UUID], counter: Callable[[], int]) -> int:
+        """ count of records matching params visible to user (None = all records),
+            from counter if params are equality filters on declared keys, else counter() is called """
+        key = self._match(model, params)
+        if key is None: return counter()
+
+        scope = user_id if user_id is not None else COUNTER_SCOPE_ALL
+        # taken before counting, write of other worker committed later makes stored counter stale
+        generations = self._generations(key[0])
+        with self._lock:
+            cached = self._counters.get(key, {}).get(scope, None)
+            if cached is not None and cached[1] >= time.monotonic() and cached[2] == generations:
+                self._counters.move_to_end(key)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+            version = self._versions.get(key[0], 0)
+            inflight = self._inflight.get(key[0], 0)
+
+        count = counter()
+        with self._lock:
+            # counted during write, count may include record of event not applied yet
+            if inflight or self._versions.get(key[0], 0) != version: return count
+            # unknown shared generation (cache server unavailable)
+            if any(g < 0 for _, g in generations): return count
+            self._counters.setdefault(key, dict())[scope] = (count, time.monotonic() + self.ttl, generations)
+            self._counters.move_to_end(key)
+            while len(self._counters) > self.max_size:
+                self._counters.popitem(last=False)
+        return count
+
+    def _changes(self, record: DatabaseModel, delta: int) -> List[CounterChange]:
+        """ counter changes of record, record is shared (visible to other users) if group/other/all read is set """
+        declared: List[List[str]] = _private_default(record, "_counters")
+        if not declared: return []
+
+        name = record.__class__.__name__
+        shared = bool(record.permissions.bits() & perm_bits_mask())
+        ret: List[CounterChange] = []
+        for d in declared:
+            keys = tuple(sorted(d))
+            ret.append(((name, keys, tuple(_value(_field(record, k)) for k in keys)), record.created.user_id, shared, delta))
+        return ret
+
+    def _apply(self, changes: List[CounterChange]) -> None:
+        """ adjust existing counters of scopes that see the record """
+        with self._lock:
+            for key, owner, shared, delta in changes:
+                self._versions[key[0]] = self._versions.get(key[0], 0) + 1
+                scopes = self._counters.get(key, None)
+                if not scopes: continue
+                for scope, (count, expires, generations) in scopes.items():
+                    if shared or scope == COUNTER_SCOPE_ALL or scope == owner:
+                        scopes[scope] = (count + delta, expires, generations)
+
+    def _publish(self, changes: List[CounterChange]) -> None:
+        pending = getattr(self._local, "pending", None)
+        if pending is not None: pending += changes
+        else: self._apply(changes)
+
+    @contextmanager
+    def writing(self, model: Type[DatabaseModel]) -> Generator[None, None, None]:
+        """ write of model records is in flight until its events are applied (end of transaction),
+            counters read meanwhile are not stored """
+        if not _private_default(model, "_counters"):
+            yield None
+            return
+        name = model.__name__
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            self._inflight[name] = self._inflight.get(name, 0) + 1
+        try:
+            yield None
+        finally:
+            writes = getattr(self._local, "writes", None)
+            if writes is not None: writes.append(name)
+            else: self._written([name])
+
+    def _written(self, names: List[str]) -> None:
+        """ writes committed and their changes applied, other workers drop their counters """
+        for name in set(names): self._shared.bump(name)
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+                self._inflight[name] -= 1
+                if not self._inflight[name]: del self._inflight[name]
+
+    def drop(self, model: Type[DatabaseModel]) -> None:
+        """ drop all counters of model, write without event """
+        name = model.__name__
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            for key in [k for k in self._counters if k[0] == name]:
+                del self._counters[key]
+
+    def clear(self) -> None:
+        """ drop all counters """
+        with self._lock:
+            for name in self._versions: self._versions[name] += 1
+            self._counters.clear()
+
+    def begin(self) -> None:
+        """ outermost transaction of current thread started """
+        self._local.pending = []
+        self._local.writes = []
+
+    def end(self, committed: bool) -> None:
+        """ outermost transaction of current thread ended, changes are applied if committed, then writes end """
+        pending, self._local.pending = getattr(self._local, "pending", None), None
+        writes, self._local.writes = getattr(self._local, "writes", None), None
+        if committed and pending: self._apply(pending)
+        if writes: self._written(writes)
+
+    def on_created(self, event: Any) -> None:
+        """ EventCreated subscriber """
+        self._publish(self._changes(event.data, 1))
+
+    def on_updated(self, event: Any) -> None:
+        """ EventUpdated subscriber, stored record before update is event.previous """
+        record = event.data
+        if not _private_default(record, "_counters"): return None
+        if event.previous is None:
+            self.drop(record.__class__)
+            return None
+        self._publish(self._changes(event.previous, -1) + self._changes(record, 1))
+
+    def on_deleted(self, event: Any) -> None:
+        """ EventDeleted subscriber """
+        self._publish(self._changes(event.data, -1))
+
+
+if __name__ == "__main__":
+    exit()
@@ -1,105 +1,439 @@
 #!/usr/bin/env python3
 
 """
-uni.database.mongo
+uni.database.database_cache
 
-mongo database cache module
-
-TODO: refactor - use redis or other cache
+mongo database cache module, pluggable backends:
+    local - in-process LRU, per worker
+    redis - shared by all workers (redis protocol server), write generations are kept in redis,
+            so invalidation reaches every worker
 """
 
 from __future__ import annotations
 import threading
-from typing import Any, Dict, List, Tuple
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Protocol, Tuple, Type
+
+import bson
 
 from ..default import UniDefault
+from ..exceptions import ValidationError
 from ..logger import core_logger
+from .redis_client import RedisClient
 
 
 logger = core_logger().getChild("database_cache")
 
+Generations = Tuple[Tuple[str, int], ...]
+
+REDIS_CACHE_RETRY_SECONDS = 5
+
+
+class DatabaseCacheEntry(NamedTuple):
+    """ cached data, write generations it was read at, expiration (monotonic, 0 = never), size in bytes """
+    data: Any
+    generations: Generations
+    expires: float
+    size: int
+
+
+class DatabaseCacheBackend(Protocol):
+    """ storage of cache entries and write generations """
+
+    def generations(self, collections: Iterable[str]) -> Generations:
+        """ current write generations of collections """
+        ...
+
+    def bump(self, collection: str) -> None:
+        """ new write generation of collection, entries read from it are stale """
+        ...
+
+    def get(self, collection: str, key: str) -> Optional[DatabaseCacheEntry]:
+        """ valid entry or None, stale entries are removed """
+        ...
+
+    def set(self, collection: str, key: str, data: Any, generations: Generations, size: int, ttl: int) -> None:
+        """ store entry, ttl in seconds (0 = no expiration) """
+        ...
+
+    def delete(self, collection: str, key: str) -> None:
+        """ remove entry """
+        ...
+
+    def stats(self) -> Dict[str, int]:
+        """ backend counters """
+        ...
+
+
+class LocalCacheBackend(UniDefault):
+    """ LocalCacheBackend class
+
+        in-process LRU with per entry ttl and byte budget, all operations are synchronous O(1),
+        writes only bump generation counter of collection (no clearing), stale entries are dropped lazily
+    """
+    def __init__(self, name: str = ""):
+        # per collection lru (size limit) and global lru (byte budget), most recently used last
+        self._data: Dict[str, OrderedDict[str, DatabaseCacheEntry]] = dict()
+        self._lru: OrderedDict[Tuple[str, str], None] = OrderedDict()
+        self._generations: Dict[str, int] = dict()
+        self._bytes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self) -> int:
+        """ get cfg, maximum cache size per collection"""
+        return self.config.mongo_cache_size
+
+    @property
+    def max_bytes(self) -> int:
+        """ get cfg, byte budget of all entries """
+        return self.config.mongo_cache_max_bytes
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"evictions": self.evictions, "entries": len(self._lru), "bytes": self._bytes}
+
+    def generations(self, collections: Iterable[str]) -> Generations:
+        with self._lock:
+            return tuple((c, self._generations.get(c, 0)) for c in collections)
+
+    def bump(self, collection: str) -> None:
+        with self._lock:
+            self._generations[collection] = self._generations.get(collection, 0) + 1
+
+    def _valid(self, entry: DatabaseCacheEntry) -> bool:
+        """ entry is not expired and collections were not written since it was read """
+        if entry.expires and entry.expires < time.monotonic(): return False
+        for c, g in entry.generations:
+            if self._generations.get(c, 0) != g: return False
+        return True
+
+    def _remove(self, collection: str, key: str) -> None:
+        """ remove entry, lock is held """
+        entry = self._data[collection].pop(key, None)
+        if entry is None: return
+        self._bytes -= entry.size
+        del self._lru[(collection, key)]
+
+    def _evict(self, collection: str, key: str) -> None:
+        """ remove entry to make room, lock is held """
+        logger.debug(f"MongoCache: cache too big, removing least recently used key: {key}, collection: {collection}")
+        self._remove(collection, key)
+        self.evictions += 1
+
+    def get(self, collection: str, key: str) -> Optional[DatabaseCacheEntry]:
+        with self._lock:
+            entries = self._data.get(collection)
+            entry = entries.get(key) if entries else None
+            if entry is None: return None
+            if not self._valid(entry):
+                self._remove(collection, key)
+                return None
+            entries.move_to_end(key)
+            self._lru.move_to_end((collection, key))
+            return entry
+
+    def set(self, collection: str, key: str, data: Any, generations: Generations, size: int, ttl: int) -> None:
+        if self.max_bytes and size > self.max_bytes: return None
+
+        with self._lock:
+            entries = self._data.setdefault(collection, OrderedDict())
+            self._remove(collection, key)
+
+            while entries and len(entries) >= self.max_size:
+                self._evict(collection, next(iter(entries)))
+            while self._lru and self.max_bytes and self._bytes + size > self.max_bytes:
+                self._evict(*next(iter(self._lru)))
+
+            expires = time.monotonic() + ttl if ttl else 0
+            entries[key] = DatabaseCacheEntry(data, generations, expires, size)
+            self._lru[(collection, key)] = None
+            self._bytes += size
+
+    def delete(self, collection: str, key: str) -> None:
+        with self._lock:
+            if collection in self._data:
+                self._remove(collection, key)
+
+
+class RedisCacheBackend(UniDefault):
+    """ RedisCacheBackend class
+
+        entries and write generations are stored in redis (mongo_cache_url), shared by all workers,
+        bump is a redis INCR, so invalidation is seen by every worker on its next read,
+        expiration uses redis key ttl, memory limit is redis maxmemory (entries over mongo_cache_max_bytes are skipped),
+        unavailable server is a cache miss, server is skipped for REDIS_CACHE_RETRY_SECONDS after error
+    """
+    def __init__(self, name: str = ""):
+        self._client = RedisClient(self.config.mongo_cache_url)
+        self._prefix = f"{self.config.mongo_cache_prefix}:{name}"
+        self._retry_at = 0.0
+        self.errors = 0
+
+    def _entry_key(self, collection: str, key: str) -> str:
+        return f"{self._prefix}:entry:{collection}:{key}"
+
+    def _generation_key(self, collection: str) -> str:
+        return f"{self._prefix}:gen:{collection}"
+
+    def _available(self) -> bool:
+        return self._retry_at < time.monotonic()
+
+    def _error(self, e: Exception) -> None:
+        self.errors += 1
+        self._retry_at = time.monotonic() + REDIS_CACHE_RETRY_SECONDS
+        logger.warning(f"MongoCache: redis cache unavailable: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"errors": self.errors}
+
+    def _generations(self, collections: List[str]) -> Generations:
+        values = self._client.mget(*[self._generation_key(c) for c in collections])
+        return tuple((c, int(v) if v else 0) for c, v in zip(collections, values))
+
+    def generations(self, collections: Iterable[str]) -> Generations:
+        collections = list(collections)
+        if not self._available(): return tuple((c, -1) for c in collections)
+        try:
+            return self._generations(collections)
+        except Exception as e:
+            # unknown generation (-1) is never stored, entries read now are not cached
+            self._error(e)
+            return tuple((c, -1) for c in collections)
+
+    def bump(self, collection: str) -> None:
+        try:
+            # also while server is skipped, write must not be lost
+            self._client.incr(self._generation_key(collection))
+        except Exception as e:
+            # other workers keep serving entries until ttl expires
+            self._error(e)
+
+    def get(self, collection: str, key: str) -> Optional[DatabaseCacheEntry]:
+        if not self._available(): return None
+        entry_key = self._entry_key(collection, key)
+        try:
+            value = self._client.get(entry_key)
+            if value is None: return None
+            doc = bson.decode(value)
+            generations = tuple((c, g) for c, g in doc["g"])
+            if self._generations([c for c, _ in generations]) != generations:
+                self._client.delete(entry_key)
+                return None
+        except Exception as e:
+            self._error(e)
+            return None
+        return DatabaseCacheEntry(doc["d"], generations, 0, doc["s"])
+
+    def set(self, collection: str, key: str, data: Any, generations: Generations, size: int, ttl: int) -> None:
+        if self.config.mongo_cache_max_bytes and size > self.config.mongo_cache_max_bytes: return None
+        if any(g < 0 for _, g in generations) or not self._available(): return None
+        try:
+            value = bson.encode({"d": data, "g": [list(g) for g in generations], "s": size})
+            self._client.set(self._entry_key(collection, key), value, ttl * 1000)
+        except Exception as e:
+            self._error(e)
+
+    def delete(self, collection: str, key: str) -> None:
+        try:
+            self._client.delete(self._entry_key(collection, key))
+        except Exception as e:
+            self._error(e)
+
+
 class DatabaseCache(UniDefault):
-    def __init__(self):
-        self._data: Dict[str, Dict[str, Any]] = dict()
-        self._meta: Dict[str, List[str]] = dict()
+    """ DatabaseCache class
+
+        entries are valid for write generations of collections they were read from,
+        writes only bump generation counter of collection (no clearing), stale entries are dropped lazily,
+        storage is backend from mongo_cache_backend
+    """
+    backends: Dict[str, Type[DatabaseCacheBackend]] = {
+        "local": LocalCacheBackend,
+        "redis": RedisCacheBackend,
+    }
+
+    def __init__(self, name: str = ""):
+        self._name = name
+        self._backend: Optional[DatabaseCacheBackend] = None
+        self._backend_type = ""
+        self.hits = 0
+        self.misses = 0
         self._lock = threading.Lock()
-        
-    @property   
+
+    @property
     def enabled(self) -> bool:
         """ get cfg, is caching enabled """
         return self.config.mongo_cache_enabled
 
     @property
-    def max_size(self) -> int:
-        """ get cfg, maximum cache size per collection"""
-        return self.config.mongo_cache_size
-    
+    def ttl(self) -> int:
+        """ get cfg, entry time to live in seconds, 0 = no expiration """
+        return self.config.mongo_cache_ttl
+
+    @property
+    def backend(self) -> DatabaseCacheBackend:
+        """ backend of configured type, created on first use """
+        backend_type = self.config.mongo_cache_backend
+        if self._backend is None or self._backend_type != backend_type:
+            with self._lock:
+                if self._backend is None or self._backend_type != backend_type:
+                    backend = self.backends.get(backend_type, None)
+                    if not backend:
+                        raise ValidationError(f"invalid cache backend: {backend_type}")
+                    self._backend = backend(self._name)
+                    self._backend_type = backend_type
+        return self._backend
+
+    def stats(self) -> Dict[str, int]:
+        """ cache counters """
+        return {"hits": self.hits, "misses": self.misses, **self.backend.stats()}
+
     def _encode(self, data: Any) -> Any:
         return data
-    
+
     def _decode(self, data: Any) -> Any:
         return data
-        
+
+    def generations(self, collections: Iterable[str]) -> Generations:
+        """ current write generations of collections, taken before reading data to cache """
+        return self.backend.generations(collections)
+
+    def bump(self, collection: str) -> None:
+        """ invalidate entries read from collection, new write generation """
+        if not self.enabled: return None
+        self.backend.bump(collection)
+
     def get(self, collection: str, key: str) -> Tuple[Any, bool]:
         if not self.enabled: return None, False
-        
-        with self._lock:
-            if collection in self._data and key in self._data[collection]:
-                logger.debug(f"MongoCache: key({key}) found, using cache, collection: {collection}")
-                return self._decode( self._data[collection][key]), True
-        
-        return None, False
-    
-    @UniDefault.thread
-    def set(self, collection: str, key: str, data: Any) -> None:
-        """ set cache for key in collection"""
+
+        entry = self.backend.get(collection, key)
+        if entry is None:
+            self.misses += 1
+            return None, False
+        self.hits += 1
+        logger.debug(f"MongoCache: key({key}) found, using cache, collection: {collection}")
+        return self._decode(entry.data), True
+
+    def set(self, collection: str, key: str, data: Any, generations: Optional[Generations] = None, size: int = 0) -> None:
+        """ set cache for key in collection, generations of read collections (default: collection), size in bytes """
         if not self.enabled: return None
-        
-        with self._lock:
-            logger.debug(f"MongoCache: setting cache for key: {key}, collection: {collection}")
-            if not collection in self._data:
-                self._data[collection] = dict()
-                self._meta[collection] = []
-                
-            while len(self._meta[collection]) >= self.max_size:
-                logger.debug(f"MongoCache: cache too big, removing oldest records, collection: {collection}")
-                first = self._meta[collection][0]
-                try:
-                    del self._data[collection][first]
-                except KeyError as e:
-                    logger.warning("key not in found in cache, removing from meta")
-                    
-                self._meta[collection].pop(0)
-                
-            self._data[collection][key] = self._encode(data)
-            self._meta[collection].append(key)
-
-    @UniDefault.thread
+
+        if generations is None: generations = self.generations([collection])
+        logger.debug(f"MongoCache: setting cache for key: {key}, collection: {collection}")
+        self.backend.set(collection, key, self._encode(data), generations, size, self.ttl)
+
     def delete(self, collection: str, key: str) -> None:
-        """ set cache for key in collection"""
+        """ delete cache for key in collection"""
         if not self.enabled: return None
-        
+
+        logger.debug(f"MongoCache: deleting cache for key: {key}, collection: {collection}")
+        self.backend.delete(collection, key)
+
+    def clear(self, collection: str) -> None:
+        """ clear cache for given collection, entries are invalidated by generation """
+        self.bump(collection)
+
+
+class RecordCache(UniDefault):
+    """ RecordCache class
+
+        identity map of Database.get_one for models with _cache_ttl, in-process LRU (database_record_cache_size),
+        entries are dropped on update/delete events, records are copied in and out (callers modify them),
+        records written inside transaction are dropped again when it ends (commit is visible then),
+        entry is keyed by collection and id and holds record per model class (models can share collection)
+    """
+    def __init__(self):
+        self._data: OrderedDict[Tuple[str, uuid.UUID], Dict[type, Tuple[Any, float]]] = OrderedDict()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def max_size(self) -> int:
+        """ get cfg, maximum count of cached records """
+        return self.config.database_record_cache_size
+
+    def stats(self) -> Dict[str, int]:
+        """ cache counters """
         with self._lock:
-            if not collection in self._data:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._data)}
+
+    @staticmethod
+    def _key(model_name: str, id: Any) -> Optional[Tuple[str, uuid.UUID]]:
+        try:
+            return model_name, id if isinstance(id, uuid.UUID) else uuid.UUID(str(id))
+        except ValueError:
+            return None
+
+    def version(self) -> int:
+        """ write counter, taken before reading record, record read during concurrent write is not cached """
+        return self._writes
+
+    def get(self, model: type, id: Any) -> Optional[Any]:
+        """ copy of cached record or None """
+        key = self._key(model.__name__, id)
+        with self._lock:
+            records = self._data.get(key) if key else None
+            cached = records.get(model) if records else None
+            if cached is None or cached[1] < time.monotonic():
+                if cached is not None: del records[model]
+                self.misses += 1
                 return None
-                
-            if key in self._data[collection]:
-                logger.debug(f"MongoCache: deleting cache for key: {key}, collection: {collection}")
-                del self._data[collection][key]
-                self._meta[collection].remove(key)
-                
-    
-    @UniDefault.thread
-    def clear(self, collection: str) -> None:
-        """ clear cache for given collection"""
-        if not self.enabled: return None
-        
+            self._data.move_to_end(key)
+            self.hits += 1
+        return cached[0].copy(deep=True)
+
+    def set(self, record: Any, ttl: int, version: int) -> None:
+        """ cache copy of record for ttl seconds """
+        key = self._key(record.__class__.__name__, record.id)
+        if key is None: return None
+        record = record.copy(deep=True)
         with self._lock:
-            if collection in self._data:
-                logger.debug(f"MongoCache: clearing cache for collection: {collection}")
-                del self._data[collection]
-                del self._meta[collection]
-    
+            if version != self._writes: return None
+            self._data.setdefault(key, dict())[record.__class__] = (record, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def discard(self, model_name: str, id: Any) -> None:
+        """ drop record, written record is reloaded on next get """
+        key = self._key(model_name, id)
+        with self._lock:
+            self._writes += 1
+            if key: self._data.pop(key, None)
+        pending = getattr(self._local, "pending", None)
+        if pending is not None and key: pending.add(key)
+
+    def clear(self) -> None:
+        """ drop all records """
+        with self._lock:
+            self._writes += 1
+            self._data.clear()
+
+    def begin(self) -> None:
+        """ outermost transaction of current thread started """
+        self._local.pending = set()
+
+    def end(self) -> None:
+        """ outermost transaction of current thread ended (commit or rollback) """
+        pending, self._local.pending = getattr(self._local, "pending", None), None
+        for model_name, id in pending or ():
+            self.discard(model_name, id)
+
+    def on_event(self, event: Any) -> None:
+        """ EventUpdated/EventDeleted subscriber """
+        record = event.data
+        self.discard(record.__class__.__name__, record.id)
+
 
 if __name__ == "__main__":
-    exit()
\ No newline at end of file
+    exit()
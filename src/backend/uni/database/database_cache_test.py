@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+"""
+uni.database.database_cache_test
+
+module test
+"""
+
+import socketserver
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from ..testing import AppTesting
+from ..logger import core_logger
+
+from .database_cache import DatabaseCache
+from .redis_client import RedisClient, RedisError
+
+
+logger = core_logger().getChild("database_cache")
+
+
+class _RedisStandIn(socketserver.ThreadingTCPServer):
+    """ local stand-in for redis server, commands used by cache backend only """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _RedisStandInHandler)
+        self.data: Dict[bytes, Tuple[bytes, float]] = dict()
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+    def value(self, key: bytes) -> bytes:
+        value, expires = self.data.get(key, (None, 0))
+        if expires and expires < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+
+class _RedisStandInHandler(socketserver.StreamRequestHandler):
+    def _command(self) -> List[bytes]:
+        line = self.rfile.readline()
+        if not line: return []
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def _bulk(self, value: bytes) -> bytes:
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self) -> None:
+        server: _RedisStandIn = self.server
+        while True:
+            args = self._command()
+            if not args: return
+            cmd = args[0].upper()
+            with server.lock:
+                if cmd == b"GET":
+                    out = self._bulk(server.value(args[1]))
+                elif cmd == b"MGET":
+                    out = b"*%d\r\n" % (len(args) - 1) + b"".join(self._bulk(server.value(k)) for k in args[1:])
+                elif cmd == b"SET":
+                    expires = time.monotonic() + int(args[4]) / 1000 if len(args) > 4 else 0
+                    server.data[args[1]] = (args[2], expires)
+                    out = b"+OK\r\n"
+                elif cmd == b"DEL":
+                    out = b":%d\r\n" % sum(1 for k in args[1:] if server.data.pop(k, None) is not None)
+                elif cmd == b"INCR":
+                    value = int(server.value(args[1]) or 0) + 1
+                    server.data[args[1]] = (str(value).encode(), 0)
+                    out = b":%d\r\n" % value
+                else:
+                    out = b"-ERR unknown command\r\n"
+            self.wfile.write(out)
+
+
+if __name__ == '__main__':
+    cfg = AppTesting.basic("database cache")
+    cfg.mongo_cache_enabled = True
+    cfg.mongo_cache_ttl = 0
+
+    # local backend, lru and byte budget
+    cfg.mongo_cache_size = 2
+    cfg.mongo_cache_max_bytes = 100
+    cache = DatabaseCache("test")
+    cache.set("a", "1", 1, size=10)
+    cache.set("a", "2", 2, size=10)
+    assert cache.get("a", "1") == (1, True)
+    cache.set("a", "3", 3, size=10)
+    assert cache.get("a", "2") == (None, False), "least recently used entry evicted"
+    cache.set("b", "x", "x", size=90)
+    assert cache.stats()["bytes"] <= 100
+    cache.bump("b")
+    assert cache.get("b", "x") == (None, False), "bumped generation invalidates"
+    cfg.mongo_cache_ttl = 1
+    cache.set("c", "t", 1)
+    time.sleep(1.05)
+    assert cache.get("c", "t") == (None, False), "expired"
+    assert cache.stats()["evictions"] == 2
+    cfg.mongo_cache_ttl = 0
+
+    # redis client
+    server = _RedisStandIn()
+    client = RedisClient(server.url)
+    client.set("k", b"v\r\nv")
+    assert client.get("k") == b"v\r\nv"
+    assert client.mget("k", "missing") == [b"v\r\nv", None]
+    assert client.incr("n") == 1 and client.incr("n") == 2
+    assert client.delete("k", "missing") == 1
+    try:
+        client.execute("UNKNOWN")
+        raise AssertionError("RedisError not raised")
+    except RedisError:
+        pass
+
+    # redis backend, two workers share entries and invalidation
+    cfg.mongo_cache_backend = "redis"
+    cfg.mongo_cache_url = server.url
+    worker1, worker2 = DatabaseCache("test"), DatabaseCache("test")
+    generations = worker1.generations(["a", "b"])
+    worker1.set("a", "page", [b"\x01\x02", b"\x03"], generations, size=3)
+    assert worker2.get("a", "page") == ([b"\x01\x02", b"\x03"], True)
+    worker1.set("a", "count", 42)
+    assert worker2.get("a", "count") == (42, True)
+    worker2.bump("b")
+    assert worker1.get("a", "page") == (None, False), "joined collection written by other worker"
+    assert worker1.get("a", "count") == (42, True)
+    worker2.bump("a")
+    assert worker1.get("a", "count") == (None, False)
+
+    # entry read before concurrent write is never served
+    generations = worker1.generations(["a"])
+    worker2.bump("a")
+    worker1.set("a", "stale", 1, generations)
+    assert worker2.get("a", "stale") == (None, False)
+
+    # unavailable server is a miss
+    server.shutdown()
+    server.server_close()
+    cfg.mongo_cache_url = "redis://127.0.0.1:1/0"
+    offline = DatabaseCache("test")
+    offline.set("a", "page", 1)
+    assert offline.get("a", "page") == (None, False)
+    assert offline.stats()["errors"] == 1, "server is skipped after error"
+
+    cfg.mongo_cache_backend = "local"
+    cfg.mongo_cache_enabled = False
+    logger.info("uni.database.database_cache_test tests passed")
@@ -8,7 +8,7 @@ base database model
 
 from pydantic import BaseModel, Field, PrivateAttr
 import uuid
-from typing import Any, List, Optional, Dict
+from typing import Any, List, Optional, Dict, Type, Union
 
 from ..logger import core_logger
 from ..utils import id_factory, timestamp_factory
@@ -18,7 +18,7 @@ from ..services.permission import ModelMeta, Permissions
 logger = core_logger().getChild("database")
 
 
-DB_UPDATE_EXCLUDE={'created', 'updated', 'accessed', 'permissions'}
+DB_UPDATE_EXCLUDE={'created', 'updated', 'accessed', 'permissions', 'perm_bits'}
 
 class DatabaseModel(BaseModel):
     """ Base model """
@@ -34,15 +34,24 @@ class DatabaseModel(BaseModel):
     updated: ModelMeta = Field(default_factory=ModelMeta.default)
     accessed: ModelMeta = Field(default_factory=ModelMeta.default)
     permissions: Permissions = Field(default_factory=Permissions.default)
+    # permissions bitmask, maintained on write, used by permission_db_filter
+    perm_bits: int = 0
 
     # index, private, not stored in db
     _unique: List[str] = PrivateAttr(default_factory=list)
     _index: List[str] = PrivateAttr(default_factory=list)
     _compound_index: List[List[str]] = PrivateAttr(default_factory=list)
+    # full-text search index, fields searched by "search" filter operator
+    _text_index: List[str] = PrivateAttr(default_factory=list)
 
     # event, private, not stored in db
     _event: bool = PrivateAttr(default=True)
 
+    # get_one cache time to live in seconds, 0 = not cached, private, not stored in db
+    _cache_ttl: int = PrivateAttr(default=0)
+    # materialized counters, key sets of counted equality filters (count handler), private, not stored in db
+    _counters: List[List[str]] = PrivateAttr(default_factory=list)
+
     # field to store joined records from DbResult.join
     joined_collections: Optional[Any] = None
 
@@ -84,6 +93,13 @@ class DatabaseModel(BaseModel):
             **(m.dict())
         )
 
+
+def _private_default(model: Union[DatabaseModel, Type[DatabaseModel]], name: str) -> Any:
+    """ returns default value of model private attribute """
+    attr = model.__private_attributes__.get(name, None)
+    if attr is None: return None
+    return attr.get_default()
+
 class DatabaseUpdateModel(BaseModel):
     """ Base model for update"""
     id: uuid.UUID
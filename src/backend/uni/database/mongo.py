@@ -7,35 +7,53 @@ mongo database module
 """
 
 from __future__ import annotations
+from contextlib import contextmanager
+import hashlib
+import re
 import tempfile
-from typing import Any, Dict, Iterable, List, Optional, Type, Union
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
 import uuid
 from copy import deepcopy
 import pymongo # type: ignore
-from pymongo.errors import DuplicateKeyError  # type: ignore
-from pymongo import ReturnDocument  #type: ignore
+from pymongo.errors import DuplicateKeyError, OperationFailure  # type: ignore
+from pymongo import ReturnDocument, UpdateOne  #type: ignore
+from pymongo.client_session import ClientSession  # type: ignore
+from bson import decode as bson_decode, encode as bson_encode
+from bson.binary import UuidRepresentation
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
 from bson.son import SON
+import orjson
 
 from .. import utils
-from ..exceptions import ServerError
+from ..default import UniDefault
+from ..exceptions import ServerError, ValidationError
 from ..logger import color_red, core_logger, disable_logger
-from .base import Database, FilterCondition, FilterExpression, T_DatabaseModel, DbOrder, DbResult
-from .model import DatabaseModel
+from ..services.permission import PERM_BITS
+from .base import DB_COUNT_MIN_SAMPLE_MATCHES, DB_COUNT_SAMPLE, DB_JSON_OPTIONS, Database, DbMetric, DbCursor, FilterCondition, FilterExpression, T_DatabaseModel, DbOrder, DbResult
+from .model import DatabaseModel, _private_default
 from .database_cache import DatabaseCache
 
 
 logger = core_logger().getChild("database.mongo")
 
-_find_cache = DatabaseCache()
-_count_cache = DatabaseCache()
+_find_cache = DatabaseCache("find")
+_count_cache = DatabaseCache("count")
+
+# collections with ensured indexes and backfilled fields, in-process registry
+_ensured_indexes: set = set()
 
 
 MONGO_SORT = ( "body.created.timestamp", -1)
+MONGO_RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+MONGO_DECODE_CODEC_OPTIONS = CodecOptions(uuid_representation=UuidRepresentation.STANDARD)
 MONGO_SEQUENCE_COLLECTION = "auto_increment"
 MONGO_AGGREGATION_COUNT_FIELD = "count"
 MONGO_SEQUENCE_FIELD = "seq"
 MONGO_SORT_FIELD = "created.timestamp"
 MONGO_JOINED_COLLECTIONS_FIELD = "joined_collections"
+MONGO_TRANSACTION_TOPOLOGIES = ("ReplicaSetWithPrimary", "Sharded", "LoadBalanced")
 MONGO_FILTER_OPERATORS = {
     ">": "$gt",
     "<": "$lt",
@@ -43,7 +61,15 @@ MONGO_FILTER_OPERATORS = {
     "<=": "$lte",
     "==": "$eq",
     "!=": "$ne",
-    "regex": "$regex"
+    "regex": "$regex",
+    "search": "$text",
+    "in": "$in"
+}
+MONGO_AGGREGATE_FUNCTIONS = {
+    "sum": "$sum",
+    "avg": "$avg",
+    "min": "$min",
+    "max": "$max",
 }
 MONGO_LOGIC_OPERATORS = {
     "AND": "$and",
@@ -63,6 +89,41 @@ def _get_nested_keys(data: Union[Dict, List], keys: list) -> None:
         for i in data:
             _get_nested_keys(i, keys)
             
+def _pop_text(query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """ removes $text from query and from its nested $and expressions (conjunction with rest of query), returns it """
+    text = query.pop("$text", None)
+    if isinstance(query.get("$and", None), list):
+        for sub in query["$and"]:
+            nested = _pop_text(sub) if isinstance(sub, dict) else None
+            if nested is None: continue
+            if text is not None:
+                raise ValidationError("only one search filter is allowed")
+            text = nested
+        query["$and"] = [sub for sub in query["$and"] if sub]
+        if not query["$and"]: del query["$and"]
+    return text
+
+def _has_text(data: Any) -> bool:
+    """ true if $text is anywhere in query """
+    if isinstance(data, dict): return "$text" in data or any(_has_text(v) for v in data.values())
+    if isinstance(data, list): return any(_has_text(i) for i in data)
+    return False
+
+def _pipeline_key(pipeline: List[Dict[str, Any]]) -> str:
+    """ cache key of pipeline, fingerprint of bson (keeps stage and key order), filter values are not exposed in shared cache keys """
+    return hashlib.sha1(bson_encode({"pipeline": pipeline}, codec_options=MONGO_DECODE_CODEC_OPTIONS)).hexdigest()
+
+def _spec_key(keys: List[Tuple[str, Any]]) -> Tuple[Any, ...]:
+    """ comparable keys of declared index, fields of text index are unordered """
+    text = tuple(sorted(k for k, d in keys if d == pymongo.TEXT))
+    return tuple((k, d) for k, d in keys if d != pymongo.TEXT) + ((("$text", text),) if text else ())
+
+def _index_key(info: Dict[str, Any]) -> Tuple[Any, ...]:
+    """ comparable keys of index read by list_indexes, server stores text index as _fts/_ftsx with weights """
+    keys = [(k, d) for k, d in info["key"].items() if k not in ("_fts", "_ftsx")]
+    if "_fts" in info["key"]: keys += [(k, pymongo.TEXT) for k in info.get("weights", {})]
+    return _spec_key([(k, int(d) if isinstance(d, float) else d) for k, d in keys])
+
 def _count_projection(keys: List[str]) -> Dict[str, Dict[str, int]]:
     """ get projection for counting"""
     proj = dict()
@@ -75,10 +136,50 @@ def _count_projection(keys: List[str]) -> Dict[str, Dict[str, int]]:
     } 
 
 
+class MongoSequenceAllocator(UniDefault):
+    """ MongoSequenceAllocator class
+
+        hi/lo sequence allocator, reserves blocks of mongo_sequence_block values per process,
+        values are strictly increasing per process, unused values of block are lost on restart (gaps, never duplicates)
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks: Dict[str, Tuple[int, int]] = dict()  # key -> (next, last)
+
+    def allocate(self, collection: Any, key: str, name: str, seq_field: str = MONGO_SEQUENCE_FIELD, count: int = 1) -> int:
+        """ reserves `count` contiguous values of sequence `name`, returns the last one """
+        with self._lock:
+            _next, last = self._blocks.get(key, (1, 0))
+
+            # block exhausted, reserve new one (remaining values are skipped to keep values contiguous)
+            if last - _next + 1 < count:
+                size = max(int(self.config.mongo_sequence_block), count, 1)
+                # no session, reserved block must survive rollback of current transaction
+                r = collection.find_one_and_update(
+                    {"_id": name},
+                    {"$inc": {seq_field: size}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                last = r[seq_field]
+                _next = last - size + 1
+
+            self._blocks[key] = (_next + count, last)
+            return _next + count - 1
+
+    def clear(self) -> None:
+        """ forget reserved blocks """
+        with self._lock:
+            self._blocks.clear()
+
+_sequence = MongoSequenceAllocator()
+
+
 class MongoFilterCondition(FilterCondition):
-    def __init__(self, key: str, operator, value, joined: Optional[List] = None):
+    def __init__(self, key: str, operator, value, joined: Optional[List] = None, text_index: Optional[List[str]] = None):
         super().__init__(key, operator, value)
         self._joined = joined
+        self._text_index = text_index or []
 
     def get(self):
         if self.operator not in MONGO_FILTER_OPERATORS.keys():
@@ -92,6 +193,14 @@ class MongoFilterCondition(FilterCondition):
                 if str(self.key).startswith(name+"."):
                     self.key = str(self.key).replace(name+".", MONGO_JOINED_COLLECTIONS_FIELD+"."+name+".body.")
         
+        # full-text search (text index covers all indexed fields), without text index same as regex
+        if self.operator == "search":
+            if self.key in self._text_index:
+                if not str(self.value).strip(): return {}
+                return {"$text": {"$search": str(self.value)}}
+            self.operator = "regex"
+            self.value = re.escape(str(self.value))
+
         try:
             key = self.key
             if key != "id": key = f"body.{key}"
@@ -117,6 +226,11 @@ class MongoResult(DbResult[T_DatabaseModel]):
         super().__init__(data, model, copy)
         self._joined = []
 
+    @property
+    def _session(self) -> Optional[ClientSession]:
+        """ session of current transaction, if any """
+        return self._data.get("session", None)
+
     def _limit(self, limit_from: int, limit_to: Optional[int] = None) -> DbResult[T_DatabaseModel]:
         """ private limit mongo result """
         limit = 0
@@ -137,10 +251,34 @@ class MongoResult(DbResult[T_DatabaseModel]):
         else: 
             _order = -1
 
-        self._data['pipeline'].append({"$sort": SON([("body."+key, _order)])})
+        self._data['pipeline'].append({"$sort": SON([("body."+key, _order), ("_id", _order)])})
         
         return self
 
+    def _keyset(self, cursor: DbCursor, before: bool = False) -> DbResult[T_DatabaseModel]:
+        """ private keyset pagination, range on sort key (index can be used) with _id as tiebreaker """
+        key = "body."+cursor.key
+        desc = (cursor.order == DbOrder.DESC) != before
+        op = "$lt" if desc else "$gt"
+
+        # nulls are sorted first
+        if cursor.value is None:
+            if desc:
+                query: Dict[str, Any] = {key: None, "_id": {"$lt": cursor.id}}
+            else:
+                query = {"$or": [{key: None, "_id": {"$gt": cursor.id}}, {key: {"$ne": None}}]}
+        else:
+            query = {"$and": [{key: {op+"e": cursor.value}}, {"$or": [{key: {op: cursor.value}}, {"_id": {op: cursor.id}}]}]}
+            if desc and self._nullable_key(cursor.key):
+                query = {"$or": [query, {key: None}]}
+
+        self._data["pipeline"].append({"$match": query})
+
+        # before cursor, fetched in reversed order
+        if before:
+            self.sort(cursor.key, DbOrder.ASC if cursor.order == DbOrder.DESC else DbOrder.DESC)
+        return self
+
     def _join(self, table: str, local_field: str, output_field: str, foreign_field: Optional[str] = None) -> DbResult[T_DatabaseModel]:
         """ private join mongo result """   
 
@@ -165,6 +303,24 @@ class MongoResult(DbResult[T_DatabaseModel]):
     def _filter(self, query: Any) -> DbResult[T_DatabaseModel]:
         """ private filter mongo result """
         _query = self._filter_factory(query)
+
+        # text search must be in first $match stage, only once per query, search in AND expression is moved there
+        text = _pop_text(_query)
+        if text is not None:
+            first = self._data["pipeline"][0]["$match"]
+            if "$text" in first:
+                msg = "only one search filter is allowed"
+                logger.error(color_red(msg))
+                raise ValidationError(msg)
+            first["$text"] = text
+
+        # search in OR expression can not be moved to first stage (mongo rejects it)
+        if _has_text(_query):
+            msg = "search filter can not be nested in OR expression"
+            logger.error(color_red(msg))
+            raise ValidationError(msg)
+        if not _query: return self
+
         self._data["pipeline"].append(
             {"$match": _query}
         )
@@ -195,7 +351,7 @@ class MongoResult(DbResult[T_DatabaseModel]):
                 msg = f"Error, filtering data, filter: {query}"
                 logger.error(color_red(msg))
                 raise ServerError(msg)
-            return MongoFilterCondition(query[0], query[1], query[2], self._joined).get()
+            return MongoFilterCondition(query[0], query[1], query[2], self._joined, _private_default(self._model, "_text_index")).get()
 
         # bad type
         else:
@@ -211,64 +367,167 @@ class MongoResult(DbResult[T_DatabaseModel]):
         keys = ["_id"]
         _get_nested_keys(self._data['pipeline'], keys)
         
-        # disable projection if joined
-        if len(self._joined) > 0:
-            pipeline: List[Any] = []
-        else:
-            pipeline: List[Any] = [_count_projection(keys)]        
-
         # exclude skip and limit from pipeline
+        pipeline: List[Any] = []
         for p in self._data['pipeline']:
             if "$skip" in p or "$limit" in p:
                 continue
             pipeline.append(p)
+
+        # disable projection if joined, after first $match (text search must be first stage)
+        if len(self._joined) == 0:
+            pipeline.insert(1, _count_projection(keys))
             
         # add count, project only _id
         pipeline.append({"$project": {"_id": 1}})
         pipeline.append({"$count": "count"})
         
-        # data in cache?
-        c_key = str(pipeline)
-        c, ok = _count_cache.get(self._model.__name__, c_key)
-        if ok: return c
+        # data in cache? not in transaction (uncommitted writes)
+        name = self._model.__name__
+        cached = self._session is None
+        if cached:
+            c_key = _pipeline_key(pipeline)
+            c, ok = _count_cache.get(name, c_key)
+            if ok: return c
+            generations = _count_cache.generations([name] + [p["$lookup"]["from"] for p in pipeline if "$lookup" in p])
 
         # aggregate
         try:
             logger.debug(f"Counting pipeline: {pipeline}")
-            r = self._data['collection'].aggregate(pipeline, allowDiskUse=True)
+            r = self._data['collection'].aggregate(pipeline, allowDiskUse=True, session=self._session)
         except Exception as e:
             msg = f"mongo database exception: {e}"
             logger.error(color_red(msg))
             raise ServerError(msg)
 
         # get result
-        if not r:
-            _count_cache.set(self._model.__name__, c_key, 0)
-            return 0
+        count = 0
         for i in r:
-            _count_cache.set(self._model.__name__, c_key,  i[MONGO_AGGREGATION_COUNT_FIELD])
-            return i[MONGO_AGGREGATION_COUNT_FIELD]
+            count = i[MONGO_AGGREGATION_COUNT_FIELD]
+            break
+
+        if cached: _count_cache.set(name, c_key, count, generations)
+        return count
+
+    def _estimated_len(self) -> Tuple[int, bool]:
+        """ estimated count, collection size from metadata, share of matching documents from random sample """
+        # text search has to be first stage, uncommitted writes are not in metadata
+        matches = [p["$match"] for p in self._data['pipeline'] if "$match" in p and p["$match"]]
+        if self._joined or self._session is not None or any("$text" in m for m in matches):
+            return len(self), False
+
+        collection = self._data['collection']
+        total = collection.estimated_document_count()
+        if total <= DB_COUNT_SAMPLE: return len(self), False
+        if not matches: return total, True
+
+        pipeline = [{"$sample": {"size": DB_COUNT_SAMPLE}}, {"$match": {"$and": matches}}, {"$count": "count"}]
+        matched = 0
+        for r in collection.aggregate(pipeline, allowDiskUse=True):
+            matched = r["count"]
+        # selective filter, exact count (index)
+        if matched < DB_COUNT_MIN_SAMPLE_MATCHES: return len(self), False
+        return round(total * matched / DB_COUNT_SAMPLE), True
+
+    def _aggregate(self, pipeline: List[Dict[str, Any]], raw: bool = False) -> Iterable[Any]:
+        """ aggregate, result pages (limited pipelines) outside of transaction are cached as raw bson,
+            cache entries are valid until collection or joined collections are written """
+        collection = self._data['collection']
+        cached = _find_cache.enabled and self._session is None and any("$limit" in p or "$facet" in p for p in pipeline)
+        if not cached:
+            if raw: collection = collection.with_options(codec_options=MONGO_RAW_CODEC_OPTIONS)
+            return collection.aggregate(pipeline, allowDiskUse=True, session=self._session)
+
+        key = _pipeline_key(pipeline)
+        name = self._model.__name__
+        documents, ok = _find_cache.get(name, key)
+        if not ok:
+            # generations before read, concurrent write makes entry stale
+            joined = [p["$lookup"]["from"] for p in pipeline if "$lookup" in p]
+            generations = _find_cache.generations([name] + joined)
+            result = collection.with_options(codec_options=MONGO_RAW_CODEC_OPTIONS).aggregate(pipeline, allowDiskUse=True)
+            documents = [d.raw for d in result]
+            _find_cache.set(name, key, documents, generations, sum(len(d) for d in documents))
+
+        if raw: return [RawBSONDocument(d) for d in documents]
+        return [bson_decode(d, MONGO_DECODE_CODEC_OPTIONS) for d in documents]
+
+    def _aggregate_pipeline(self) -> List[Dict[str, Any]]:
+        """ filter stages of pipeline, joined documents would be counted multiple times """
+        if self._joined:
+            msg = "aggregation of joined result is not supported"
+            logger.error(color_red(msg))
+            raise ServerError(msg)
+        return [p for p in deepcopy(self._data['pipeline']) if not ("$skip" in p or "$limit" in p or "$sort" in p)]
 
-        # no result
-        _count_cache.set(self._model.__name__, c_key, 0)
-        return 0
+    def _aggregate_documents(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        try:
+            logger.debug(f"Aggregating pipeline: {pipeline}")
+            return list(self._aggregate(pipeline))
+        except Exception as e:
+            msg = f"mongo database exception: {e}"
+            logger.error(color_red(msg))
+            raise ServerError(msg)
+
+    def _group(self, group_by: List[str], metrics: Dict[str, DbMetric]) -> List[Dict[str, Any]]:
+        """ private aggregation, $group stage, limit applies to groups, dotted keys are positional fields (g0, m0) """
+        group: Dict[str, Any] = {"_id": {f"g{i}": f"$body.{k}" for i, k in enumerate(group_by)} if group_by else None}
+        for i, (fn, k) in enumerate(metrics.values()):
+            if fn != "count":
+                group[f"m{i}"] = {MONGO_AGGREGATE_FUNCTIONS[fn]: f"$body.{k}"}
+            elif k is None:
+                group[f"m{i}"] = {"$sum": 1}
+            else:
+                # missing and null values are not counted, same as COUNT(column)
+                group[f"m{i}"] = {"$sum": {"$cond": [{"$gt": [f"$body.{k}", None]}, 1, 0]}}
+
+        pipeline = self._aggregate_pipeline() + [{"$group": group}]
+        if group_by:
+            pipeline.append({"$sort": SON([(f"_id.g{i}", 1) for i in range(len(group_by))])})
+            pipeline += [p for p in self._data['pipeline'] if "$skip" in p or "$limit" in p]
+
+        ret: List[Dict[str, Any]] = []
+        for d in self._aggregate_documents(pipeline):
+            row = {k: (d["_id"] or {}).get(f"g{i}", None) for i, k in enumerate(group_by)}
+            row.update({name: d.get(f"m{i}", None) for i, name in enumerate(metrics)})
+            ret.append(row)
+        return ret
+
+    def _facets(self, fields: List[str], limit: int) -> Dict[str, List[Dict[str, Any]]]:
+        """ private facet counts, one $facet stage with sub-pipeline per field """
+        facet = {
+            f"f{i}": [
+                {"$group": {"_id": f"$body.{k}", MONGO_AGGREGATION_COUNT_FIELD: {"$sum": 1}}},
+                {"$sort": SON([(MONGO_AGGREGATION_COUNT_FIELD, -1), ("_id", 1)])},
+                {"$limit": limit}
+            ] for i, k in enumerate(fields)
+        }
+        ret: Dict[str, List[Dict[str, Any]]] = {f: [] for f in fields}
+        for d in self._aggregate_documents(self._aggregate_pipeline() + [{"$facet": facet}]):
+            for i, k in enumerate(fields):
+                ret[k] = [dict(value=v["_id"], count=v[MONGO_AGGREGATION_COUNT_FIELD]) for v in d.get(f"f{i}", [])]
+        return ret
+
+    def _projection(self, as_dict: bool) -> List[Dict[str, Any]]:
+        """ $project stage, projection is used for dicts only (models need all fields) """
+        if not as_dict or not self._fields: return []
+
+        value = 0 if self._fields_exclude else 1
+        project = {f"body.{f}": value for f in self._fields}
+        if not self._fields_exclude and len(self._joined) > 0:
+            project[f"body.{MONGO_JOINED_COLLECTIONS_FIELD}"] = 1
+        return [{"$project": project}]
 
     def _fetch(self, as_dict: bool = False) -> Iterable[T_DatabaseModel]:
         """ private fetch mongo records """
 
         # prepare pipeline
-        pipeline = deepcopy(self._data['pipeline'])
-
-        # TODO: need to be fixed, not working with iterators
-        # data in cache?
-        # c_key = str(pickle.dumps({"pipeline": pipeline, "as_dict": as_dict}))
-        # c, ok = _find_cache.get(self._model.__name__, c_key)
-        # if ok: return c
+        pipeline = deepcopy(self._data['pipeline']) + self._projection(as_dict)
 
-        # aggregate result
+        # aggregate result, cached pages
         try:
             logger.debug(f"Fetching pipeline: {pipeline}")
-            result = self._data['collection'].aggregate(pipeline, allowDiskUse=True)
+            result = self._aggregate(pipeline)
         except Exception as e:
             msg = f"mongo database exception: {e}"
             logger.error(color_red(msg))
@@ -276,17 +535,75 @@ class MongoResult(DbResult[T_DatabaseModel]):
 
         for i in result:
             self.thread_wait()
-            # handle joined tables, remove body keyword
-            joined = i['body'].get(MONGO_JOINED_COLLECTIONS_FIELD, None)
-            if joined:
-                for j in joined:
-                    i['body'][MONGO_JOINED_COLLECTIONS_FIELD][j] = [x['body'] for x in i['body'][MONGO_JOINED_COLLECTIONS_FIELD][j]] 
+            yield self._record(i, as_dict)
+
+    def _fetch_json(self) -> Iterable[Tuple[bytes, Any]]:
+        """ private fetch, raw bson documents of body (joined collections shaped by server), decoded and serialized one by one """
+        pipeline = deepcopy(self._data['pipeline']) + self._projection(True)
+        if self._joined:
+            pipeline.append({"$set": {
+                f"body.{MONGO_JOINED_COLLECTIONS_FIELD}.{j}": f"$body.{MONGO_JOINED_COLLECTIONS_FIELD}.{j}.body" for j in self._joined
+            }})
+        pipeline.append({"$replaceRoot": {"newRoot": "$body"}})
 
-            if as_dict: yield i['body']
-            else: yield self._model(**i['body'])
+        try:
+            logger.debug(f"Fetching raw pipeline: {pipeline}")
+            result = self._aggregate(pipeline, raw=True)
+        except Exception as e:
+            msg = f"mongo database exception: {e}"
+            logger.error(color_red(msg))
+            raise ServerError(msg)
 
-        # _find_cache.set(self._model.__name__, c_key, ret)
-        # return ret
+        for i in result:
+            self.thread_wait()
+            # documents are decoded, json has to be same as of fetch_dict (uuid strings, numbers of datetimes),
+            # bson.json_util writes extended json ({"$binary": ...}), only list of records is not built
+            record = bson_decode(i.raw, MONGO_DECODE_CODEC_OPTIONS)
+            yield orjson.dumps(record, option=DB_JSON_OPTIONS), record
+
+    def _record(self, document: Dict[str, Any], as_dict: bool = False) -> Any:
+        """ aggregated document to record """
+        # handle joined tables, remove body keyword
+        joined = document['body'].get(MONGO_JOINED_COLLECTIONS_FIELD, None)
+        if joined:
+            for j in joined:
+                document['body'][MONGO_JOINED_COLLECTIONS_FIELD][j] = [x['body'] for x in document['body'][MONGO_JOINED_COLLECTIONS_FIELD][j]] 
+
+        if as_dict: return document['body']
+        return self._model(**document['body'])
+
+    def _fetch_with_total(self, as_dict: bool = False) -> Tuple[List[Any], int]:
+        """ fetch with total count in one aggregation ($facet), unlimited or joined results are counted separately """
+        # trailing skip and limit stages are the page, the rest of pipeline is counted
+        n = len(self._data['pipeline'])
+        while n and ("$skip" in self._data['pipeline'][n-1] or "$limit" in self._data['pipeline'][n-1]):
+            n -= 1
+        pipeline, page = deepcopy(self._data['pipeline'][:n]), deepcopy(self._data['pipeline'][n:])
+
+        # facet result is one document (16MB), lookups would run for every matched document
+        if not any("$limit" in p for p in page) or any("$skip" in p or "$limit" in p for p in pipeline) or len(self._joined) > 0:
+            return super()._fetch_with_total(as_dict)
+
+        pipeline.append({"$facet": {
+            "items": page + self._projection(as_dict),
+            "total": [{"$count": MONGO_AGGREGATION_COUNT_FIELD}]
+        }})
+
+        try:
+            logger.debug(f"Fetching pipeline: {pipeline}")
+            result = list(self._aggregate(pipeline))
+        except Exception as e:
+            msg = f"mongo database exception: {e}"
+            logger.error(color_red(msg))
+            raise ServerError(msg)
+
+        items: List[Any] = []
+        total = 0
+        for r in result:
+            items = [self._record(i, as_dict) for i in r["items"]]
+            for t in r["total"]:
+                total = t[MONGO_AGGREGATION_COUNT_FIELD]
+        return items, total
         
 class MongoDatabase(Database):
     """ MongoDatabase class"""
@@ -317,104 +634,250 @@ class MongoDatabase(Database):
         except Exception as e:
             return False
         
-    def _clear_cache(self, collection: str) -> None:
-        _find_cache.clear(collection)
-        _count_cache.clear(collection)
+    @property
+    def _session(self) -> Optional[ClientSession]:
+        """ session of current thread transaction, None outside of transaction """
+        return getattr(self._transaction_local, "session", None)
 
-    def _indexes(self, record: DatabaseModel) -> None:
-        """Create indexes if needed. (Unique, Asc)"""
-        # get collection
-        collection = self._database[record.__class__.__name__]
+    @property
+    def _transactions_supported(self) -> bool:
+        """ multi-document transactions need replica set or sharded cluster """
+        return self._client.topology_description.topology_type_name in MONGO_TRANSACTION_TOPOLOGIES
+
+    def _transaction_begin(self) -> None:
+        """ start session, multi-document transaction if supported by server """
+        session = self._client.start_session()
+        if self._transactions_supported:
+            session.start_transaction()
+        else:
+            logger.debug("mongo transactions not supported by server topology, using session only")
+        self._transaction_local.session = session
+
+    def _transaction_end(self) -> None:
+        """ end session of current thread, collections written in transaction are invalidated again (commit is visible now) """
+        session = self._session
+        self._transaction_local.session = None
+        if session: session.end_session()
+        for collection in getattr(self._transaction_local, "written", set()):
+            self._clear_cache(collection)
+        self._transaction_local.written = set()
+
+    def _transaction_commit(self) -> None:
+        """ commit transaction """
+        try:
+            session = self._session
+            if session and session.in_transaction:
+                session.commit_transaction()
+        finally:
+            self._transaction_end()
+
+    def _transaction_rollback(self) -> None:
+        """ abort transaction """
+        try:
+            session = self._session
+            if session and session.in_transaction:
+                session.abort_transaction()
+        finally:
+            self._transaction_end()
+
+    @contextmanager
+    def _writing(self, collection: str) -> Iterator[None]:
+        """ invalidate cached results of collection before and after write,
+            reader between first bump and write would store pre-write data under current generation """
+        self._clear_cache(collection)
+        try:
+            yield
+        finally:
+            self._clear_cache(collection)
+
+    def _clear_cache(self, collection: str) -> None:
+        """ invalidate cached results of collection, new write generation """
+        _find_cache.bump(collection)
+        _count_cache.bump(collection)
+        if self._session is not None:
+            if not hasattr(self._transaction_local, "written"): self._transaction_local.written = set()
+            self._transaction_local.written.add(collection)
+
+    def _index_specs(self, model: Type[DatabaseModel]) -> Dict[str, Tuple[List[Tuple[str, Any]], Dict[str, Any]]]:
+        """ indexes declared by model: name -> (keys, create_index options) """
+        specs: Dict[str, Tuple[List[Tuple[str, Any]], Dict[str, Any]]] = dict()
+        index = _private_default(model, "_index") or []
+        unique = _private_default(model, "_unique") or []
+
+        def add(keys: List[Tuple[str, Any]], **options):
+            name = options.setdefault("name", "_".join(f"{k}_{d}" for k, d in keys))
+            specs.setdefault(name, (keys, options))
 
         # sequence
-        if MONGO_SEQUENCE_FIELD not in record._index and MONGO_SEQUENCE_FIELD not in record._unique:
-            try:
-                collection.create_index(f"body.{MONGO_SEQUENCE_FIELD}")
-            except DuplicateKeyError as e:
-                pass
+        if MONGO_SEQUENCE_FIELD not in index and MONGO_SEQUENCE_FIELD not in unique:
+            add([(f"body.{MONGO_SEQUENCE_FIELD}", pymongo.ASCENDING)])
 
-        # sorting field
-        if MONGO_SORT_FIELD not in record._index and MONGO_SORT_FIELD not in record._unique:
-            try:
-                collection.create_index(f"body.{MONGO_SORT_FIELD}")
-            except DuplicateKeyError as e:
-                pass
-            
-        # no indexes
-        if not record._unique and not record._index:
-            return
+        # sorting field, _id is sort tiebreaker
+        add([(f"body.{MONGO_SORT_FIELD}", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)])
 
-        for index in record._unique:
-            try:
-                collection.create_index(f"body.{index}", unique=True)
-            except DuplicateKeyError as e:
-                pass
+        # permission filter, owner or perm_bits
+        for i in ("created.user_id", "perm_bits"):
+            add([(f"body.{i}", pymongo.ASCENDING)])
 
-        for index in record._index:
-            # can not create duplicated index
-            if index in record._unique:
-                continue
+        # full-text index, one per collection
+        text_index = _private_default(model, "_text_index")
+        if text_index:
+            add([(f"body.{i}", pymongo.TEXT) for i in text_index], name=f"uni_text_{model.__name__}")
 
-            try:
-                collection.create_index(f"body.{index}")
-            except DuplicateKeyError as e:
-                pass
+        for i in unique:
+            add([(f"body.{i}", pymongo.ASCENDING)], unique=True)
+
+        # can not create duplicated index, unique first
+        for i in index:
+            add([(f"body.{i}", pymongo.ASCENDING)])
 
         # Compound indexes
-        for ci in record._compound_index:
-            _fields = []
-            for i in ci:
-                _fields.append((f"body.{i}", pymongo.ASCENDING))
+        for ci in _private_default(model, "_compound_index") or []:
+            add([(f"body.{i}", pymongo.ASCENDING) for i in ci])
+
+        return specs
+
+    def _indexes(self, model: Type[DatabaseModel]) -> None:
+        """ create missing indexes once per collection (model registration), existing indexes are read from server,
+            index with changed keys or options is rebuilt, indexes not declared by model are reported """
+        name = model.__name__
+        key = f"{self._database.name}.{name}"
+        if key in _ensured_indexes: return
+
+        collection = self._database[name]
+        existing = {i["name"]: i for i in collection.list_indexes()}
+        specs = self._index_specs(model)
+        # declared keys are indexed under other name (created by hand or older version)
+        existing_keys = {_index_key(i): n for n, i in existing.items()}
+
+        for index, (keys, options) in specs.items():
+            info = existing.get(index, None)
+            if info is not None:
+                if _index_key(info) == _spec_key(keys) and bool(info.get("unique", False)) == options.get("unique", False): continue
+                logger.warning(f"mongo: index changed, rebuilding: {index}, collection: {name}, stored: {info}")
+                try:
+                    collection.drop_index(index)
+                except OperationFailure as e:
+                    # dropped by other worker
+                    logger.warning(f"mongo: can not drop index: {index}, collection: {name}, error: {e}")
+            elif _spec_key(keys) in existing_keys:
+                logger.warning(f"mongo: index {index} exists as {existing_keys[_spec_key(keys)]}, collection: {name}")
+                continue
             try:
-                collection.create_index(_fields)
+                collection.create_index(keys, **options)
+                logger.info(f"mongo: index created: {index}, collection: {name}")
             except DuplicateKeyError as e:
                 pass
+            except OperationFailure as e:
+                logger.warning(f"mongo: can not create index: {index}, collection: {name}, error: {e}")
 
-    def _auto_increment(self, record: DatabaseModel, seq_field=MONGO_SEQUENCE_FIELD) -> int:
-        """ sequence autoincrement """
+        spec_keys = set(_spec_key(keys) for keys, _ in specs.values())
+        declared = set(specs) | set(n for k, n in existing_keys.items() if k in spec_keys)
+        for index in existing:
+            if index != "_id_" and index not in declared:
+                logger.warning(f"mongo: index not declared by model: {index}, collection: {name}")
+
+        _ensured_indexes.add(key)
+
+    def _auto_increment(self, record: DatabaseModel, seq_field=MONGO_SEQUENCE_FIELD, count: int = 1) -> int:
+        """ sequence autoincrement, reserves `count` values, returns the last one """
         seq_collection = self._database[MONGO_SEQUENCE_COLLECTION]
+        name = record.__class__.__name__
 
-        r = seq_collection.find_one_and_update(
-            {"_id": record.__class__.__name__},
-            {"$inc": {seq_field: 1}},
-            return_document=ReturnDocument.AFTER
-        )
+        # values from block reserved by this process
+        return _sequence.allocate(seq_collection, f"{self._database.name}.{name}.{seq_field}", name, seq_field, count)
 
-        # no record, init sequence
-        if not r:
-            seq_collection.insert_one(
-                {"_id": record.__class__.__name__, seq_field: 1}
+    def _body(self, record: DatabaseModel) -> Dict[str, Any]:
+        """ record body stored in database """
+        data = deepcopy(record.dict(exclude={'unique'}))
+        if MONGO_JOINED_COLLECTIONS_FIELD in data:
+            del data[MONGO_JOINED_COLLECTIONS_FIELD]
+        return data
+
+    def _document(self, record: DatabaseModel) -> Dict[str, Any]:
+        """ prepare record for insert """
+        _data: Dict[str, Any] = dict()
+        data = self._body(record)
+        _data['_id'] = data['id']
+        _data['body'] = data
+        return _data
+
+    def _existing_ids(self, collection: Any, ids: List[uuid.UUID]) -> set:
+        """ returns ids stored in collection """
+        r = collection.find({"_id": {"$in": ids}}, {"_id": 1}, session=self._session)
+        return set(i["_id"] for i in r)
+
+    def _create_many(self, records: List[DatabaseModel]) -> List[uuid.UUID]:
+        """Private. Save records of one model to database, one insert_many"""
+        self._indexes(records[0].__class__)
+
+        collection = self._database[records[0].__class__.__name__]
+
+        # one auto_increment for all records
+        last = self._auto_increment(records[0], count=len(records))
+        documents = []
+        for i, record in enumerate(records):
+            _data = self._document(record)
+            _data['body']['seq'] = last - len(records) + 1 + i
+            documents.append(_data)
+
+        with self._writing(records[0].__class__.__name__):
+            collection.insert_many(documents, session=self._session)
+
+        logger.info(f"records created: {len(documents)}, model: {records[0].__class__.__name__}")
+        return [d['_id'] for d in documents]
+
+    def _update_many(self, records: List[DatabaseModel]) -> List[uuid.UUID]:
+        """Private. Update records of one model, one bulk_write"""
+        collection = self._database[records[0].__class__.__name__]
+
+        # only stored records are updated
+        existing = self._existing_ids(collection, [r.id for r in records])
+        records = [r for r in records if r.id in existing]
+        if not records: return []
+
+        with self._writing(records[0].__class__.__name__):
+            collection.bulk_write(
+                [UpdateOne({"_id": r.id}, {'$set': {'body': self._body(r)}}) for r in records],
+                ordered=False,
+                session=self._session
             )
-            return 1
-        
-        # return sequence
-        return r[seq_field]
+
+        logger.info(f"records updated: {len(records)}, model: {records[0].__class__.__name__}")
+        return [r.id for r in records]
+
+    def _delete_many(self, records: List[DatabaseModel]) -> List[uuid.UUID]:
+        """Private. Delete records of one model, one delete_many"""
+        collection = self._database[records[0].__class__.__name__]
+
+        existing = self._existing_ids(collection, [r.id for r in records])
+        ids = [r.id for r in records if r.id in existing]
+        if not ids: return []
+
+        with self._writing(records[0].__class__.__name__):
+            collection.delete_many({"_id": {"$in": ids}}, session=self._session)
+
+        logger.info(f"records deleted: {len(ids)}, model: {records[0].__class__.__name__}")
+        return ids
 
     def _create(self, record: DatabaseModel) -> Optional[uuid.UUID]:
         """Private. Save data to database"""
         super()._create(record)
-        # index ?
-        self._indexes(record)
+        # indexes, created on model registration or first insert
+        self._indexes(record.__class__)
 
         # get collection
         collection = self._database[record.__class__.__name__]
-        
-        # clear cache
-        self._clear_cache(record.__class__.__name__)
 
         # prepare record
-        _data = dict()
-        data = deepcopy(record.dict(exclude={'unique'}))
-        _data['_id'] = data['id']
-        _data['body'] = data
-        if MONGO_JOINED_COLLECTIONS_FIELD in _data['body']:
-            del _data['body'][MONGO_JOINED_COLLECTIONS_FIELD]
+        _data = self._document(record)
 
         # auto_increment
         _data['body']['seq'] = self._auto_increment(record)
 
-        # save
-        collection.insert_one(_data)
+        # save, cached results invalidated
+        with self._writing(record.__class__.__name__):
+            collection.insert_one(_data, session=self._session)
 
         logger.info(f"record created: {record.id}, model: {record.__class__.__name__}")
         return _data['_id']
@@ -424,22 +887,17 @@ class MongoDatabase(Database):
         super()._update(record)
         # get collection
         collection = self._database[record.__class__.__name__]
-        
-        # clear cache
-        self._clear_cache(record.__class__.__name__)
 
         # prepare record
-        data = deepcopy(record.dict(exclude={'unique'}))
+        data = self._body(record)
         query = dict(
             _id=data['id']
         )
 
-                
-        if MONGO_JOINED_COLLECTIONS_FIELD in data:
-            del data[MONGO_JOINED_COLLECTIONS_FIELD]
-
-        # update
-        if not collection.update_one(query, {'$set': {'body': data}}).matched_count:
+        # update, cached results invalidated
+        with self._writing(record.__class__.__name__):
+            matched = collection.update_one(query, {'$set': {'body': data}}, session=self._session).matched_count
+        if not matched:
             logger.warning(f"record does not exist: {record}")
             return None
 
@@ -451,15 +909,15 @@ class MongoDatabase(Database):
         super()._delete(record)
         # get collection
         collection = self._database[record.__class__.__name__]
-        
-        # clear cache
-        self._clear_cache(record.__class__.__name__)
 
         query = dict(
             _id=record.id
         )
 
-        if not collection.delete_one(query).deleted_count:
+        # delete, cached results invalidated
+        with self._writing(record.__class__.__name__):
+            deleted = collection.delete_one(query, session=self._session).deleted_count
+        if not deleted:
             logger.warning(f"record does not exist: {record}")
             return None
 
@@ -477,7 +935,7 @@ class MongoDatabase(Database):
         )
 
         # find
-        r = collection.find_one(query)
+        r = collection.find_one(query, session=self._session)
 
         if not r:
             return None
@@ -509,13 +967,32 @@ class MongoDatabase(Database):
         # find
         r = dict(
             collection=collection,
-            pipeline=[{"$match": _query}, {"$sort": SON([MONGO_SORT])}],
+            pipeline=[{"$match": _query}, {"$sort": SON([MONGO_SORT, ("_id", MONGO_SORT[1])])}],
+            session=self._session
         )
 
         return MongoResult[T_DatabaseModel](r, model)
     
     def _create_table(self, table: str, model: type[T_DatabaseModel]) -> Any:
-        return super()._create_table(table, model)
+        super()._create_table(table, model)
+        self._indexes(model)
+
+        # perm_bits of documents stored before the field existed, computed from permissions,
+        # once per collection, missing field is looked up in perm_bits index (ensured above)
+        key = f"{self._database.name}.{table}.perm_bits"
+        if key in _ensured_indexes: return
+        bits = [
+            {"$cond": [{"$ifNull": [f"$body.permissions.{name}", False]}, bit, 0]}
+            for name, bit in PERM_BITS.items()
+        ]
+        try:
+            self._database[table].update_many(
+                {"body.perm_bits": {"$exists": False}},
+                [{"$set": {"body.perm_bits": {"$add": bits}}}]
+            )
+            _ensured_indexes.add(key)
+        except Exception as e:
+            logger.warning(f"mongo: can not compute perm_bits, collection: {table}, error: {e}")
     
     def _export_database(self) -> Any:
         super()._export_database()
@@ -554,6 +1031,10 @@ class MongoDatabase(Database):
 
             utils.shell(restore_cmd)
 
+        # dropped or restored indexes and sequences, ensure and reserve again
+        _ensured_indexes.clear()
+        _sequence.clear()
+
 
 # disable mongo loggers
 disable_logger("pymongo.serverSelection")
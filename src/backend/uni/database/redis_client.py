@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+"""
+uni.database.redis_client
+
+minimal redis protocol (RESP2) client, used by shared database cache
+"""
+
+from __future__ import annotations
+import socket
+import threading
+from typing import Any, List, Optional, Sequence, Union
+from urllib.parse import unquote, urlparse
+
+from ..logger import core_logger
+
+
+logger = core_logger().getChild("database.redis_client")
+
+REDIS_DEFAULT_PORT = 6379
+
+RedisValue = Union[None, int, bytes, List[Any]]
+
+
+class RedisError(Exception):
+    """ error reply of redis server """
+
+
+class RedisClient():
+    """ RedisClient class
+
+        blocking client with connection pool, safe to share between threads,
+        url: redis://[[user]:password@]host[:port][/db]
+    """
+    def __init__(self, url: str, timeout: float = 1.0, pool_size: int = 8):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", ""):
+            raise ValueError(f"unsupported redis url scheme: {parsed.scheme}")
+        self._host = parsed.hostname or "localhost"
+        self._port = parsed.port or REDIS_DEFAULT_PORT
+        self._username = unquote(parsed.username) if parsed.username else None
+        self._password = unquote(parsed.password) if parsed.password else None
+        self._db = int(parsed.path.strip("/") or 0)
+        self._timeout = timeout
+        self._pool_size = pool_size
+        self._pool: List[socket.socket] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        """ new connection, authenticated and with selected db """
+        sock = socket.create_connection((self._host, self._port), timeout=self._timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        setup: List[Sequence[Any]] = []
+        if self._password is not None:
+            setup.append(("AUTH", self._username, self._password) if self._username else ("AUTH", self._password))
+        if self._db:
+            setup.append(("SELECT", self._db))
+        if setup:
+            try:
+                for reply in self._roundtrip(sock, setup):
+                    if isinstance(reply, RedisError): raise reply
+            except Exception:
+                sock.close()
+                raise
+        return sock
+
+    def _acquire(self) -> socket.socket:
+        with self._lock:
+            if self._pool: return self._pool.pop()
+        return self._connect()
+
+    def _release(self, sock: socket.socket) -> None:
+        with self._lock:
+            if len(self._pool) < self._pool_size:
+                self._pool.append(sock)
+                return
+        sock.close()
+
+    def close(self) -> None:
+        """ close pooled connections """
+        with self._lock:
+            pool, self._pool = self._pool, []
+        for sock in pool: sock.close()
+
+    @staticmethod
+    def _encode(command: Sequence[Any]) -> bytes:
+        """ command as resp array of bulk strings """
+        out = [b"*%d\r\n" % len(command)]
+        for arg in command:
+            if isinstance(arg, bytes): data = arg
+            elif isinstance(arg, str): data = arg.encode()
+            else: data = str(arg).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(out)
+
+    @classmethod
+    def _read(cls, reader: Any) -> Union[RedisValue, RedisError]:
+        """ read one reply, error replies are returned (not raised) to keep pipeline in sync """
+        line = reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+": return rest
+        if kind == b"-": return RedisError(rest.decode(errors="replace"))
+        if kind == b":": return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0: return None
+            data = reader.read(size + 2)
+            if len(data) != size + 2: raise ConnectionError("redis connection closed")
+            return data[:-2]
+        if kind == b"*":
+            size = int(rest)
+            if size < 0: return None
+            return [cls._read(reader) for _ in range(size)]
+        raise ConnectionError(f"invalid redis reply: {line[:32]!r}")
+
+    def _roundtrip(self, sock: socket.socket, commands: Sequence[Sequence[Any]]) -> List[Union[RedisValue, RedisError]]:
+        """ send commands in one write, read all replies """
+        sock.sendall(b"".join(self._encode(c) for c in commands))
+        with sock.makefile("rb") as reader:
+            return [self._read(reader) for _ in commands]
+
+    def pipeline(self, commands: Sequence[Sequence[Any]]) -> List[Union[RedisValue, RedisError]]:
+        """ execute commands in one round trip, error replies are returned in place """
+        if not commands: return []
+        sock = self._acquire()
+        try:
+            replies = self._roundtrip(sock, commands)
+        except Exception:
+            # connection state is unknown, do not reuse
+            sock.close()
+            raise
+        self._release(sock)
+        return replies
+
+    def execute(self, *command: Any) -> RedisValue:
+        """ execute command, raises RedisError on error reply """
+        reply = self.pipeline([command])[0]
+        if isinstance(reply, RedisError): raise reply
+        return reply
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.execute("GET", key)
+
+    def set(self, key: str, value: bytes, ttl_ms: int = 0) -> None:
+        if ttl_ms: self.execute("SET", key, value, "PX", ttl_ms)
+        else: self.execute("SET", key, value)
+
+    def delete(self, *keys: str) -> int:
+        return self.execute("DEL", *keys)
+
+    def incr(self, key: str) -> int:
+        return self.execute("INCR", key)
+
+    def mget(self, *keys: str) -> List[Optional[bytes]]:
+        return self.execute("MGET", *keys)
+
+
+if __name__ == "__main__":
+    exit()
@@ -7,9 +7,14 @@ uni.database.sqlite
 from __future__ import annotations
 
 from enum import Enum
+from functools import lru_cache
 from inspect import isclass
+import operator
+import os
+import re
+import tempfile
 import threading
-from typing import Any, Dict, List, Optional, Tuple, Type, get_origin
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, get_origin
 import uuid
 import json
 from pydantic import BaseModel
@@ -17,14 +22,17 @@ import sqlite3
 from devtools import debug
 
 
+from .. import utils
 from ..default import UniDefault
 from ..encoders import UniJsonDecoder, UniJsonEncoder
 from ..exceptions import ServerError
 from ..logger import color_red, core_logger
-from .base import Database, DbOrder, FilterCondition, FilterExpression, T_DatabaseModel, DbResult
-from .model import DatabaseModel
+from ..services.permission import PERM_BITS
+from .base import DB_COUNT_MIN_SAMPLE_MATCHES, DB_COUNT_SAMPLE, Database, DbMetric, DbCursor, DbOrder, FilterCondition, FilterExpression, T_DatabaseModel, DbResult
+from .model import DatabaseModel, _private_default
 
-SQL_LOCK = threading.Lock()
+# serializes writers, readers run concurrently (WAL)
+SQL_LOCK = threading.RLock()
 
 
 logger = core_logger().getChild("database.sqlite")
@@ -32,7 +40,16 @@ logger = core_logger().getChild("database.sqlite")
 SQLITE_FIELDS_EXCLUDE: List[str] = ["_index", "_unique", "joined_collections"]
 SQLITE_NESTING_SEPARATOR: str = "__"
 SQLITE_JOINED_COLLECTIONS_FIELD = "joined_collections"
+SQLITE_TOTAL_FIELD = "uni_total"
 SQLITE_ENCODING = "utf8"
+SQLITE_TIMEOUT = 5
+SQLITE_READ_STATEMENTS = ("SELECT", "PRAGMA", "WITH", "EXPLAIN")
+SQLITE_FETCH_BATCH = 500
+# row decoders of column sets, bounded (fields projections of clients)
+SQLITE_DECODER_CACHE_SIZE = 1024
+SQLITE_MAX_VARIABLES = 500
+SQLITE_BACKUP_PAGES = 1024
+SQLITE_IMPORT_SCHEMA = "uni_import"
 SQLITE_TYPES = {
             int: "int",
             float: "float",
@@ -45,6 +62,18 @@ SQLITE_TYPES = {
         }
 
 SQLITE_SORT = ( "created__timestamp", "DESC")
+SQLITE_INDEX_PREFIX = "uni_idx"
+SQLITE_UNIQUE_INDEX_PREFIX = "uni_ux"
+SQLITE_TEXT_INDEX_PREFIX = "uni_fts"
+SQLITE_SAMPLE_HASH = 2654435761
+SQLITE_TEXT_INDEX_TRIGGERS = ("ai", "ad", "au")
+SQLITE_TEXT_INDEX_TOKENIZE = "unicode61 remove_diacritics 2"
+# indexes created for every table: default sort key and columns used by permission_db_filter
+SQLITE_DEFAULT_INDEXES: List[List[str]] = [
+    ["created.timestamp"],
+    ["created.user_id"],
+    ["perm_bits"],
+]
 SQLITE_FILTER_OPERATORS = {
     ">": ">",
     "<": "<",
@@ -52,7 +81,16 @@ SQLITE_FILTER_OPERATORS = {
     "<=": "<=",
     "==": "=",
     "!=": "!=",
-    "regex": "LIKE"
+    "regex": "LIKE",
+    "search": "LIKE",
+    "in": "IN"
+}
+SQLITE_AGGREGATE_FUNCTIONS = {
+    "count": "COUNT({})",
+    "sum": "COALESCE(SUM({}), 0)",
+    "avg": "AVG({})",
+    "min": "MIN({})",
+    "max": "MAX({})",
 }
 SQLITE_LOGIC_OPERATORS = {
     "AND": "AND",
@@ -67,24 +105,114 @@ sqlite3.register_converter('JSON', lambda x: json.loads(x, cls=UniJsonDecoder))
 sqlite3.register_adapter(list, lambda x: json.dumps(x, cls=UniJsonEncoder))
 sqlite3.register_converter('JSON', lambda x: json.loads(x, cls=UniJsonDecoder))
 
-def _dict_from_row(row: sqlite3.Row, separator: str = SQLITE_NESTING_SEPARATOR) -> Dict[str, Any]:
-    """ create nested dict from sql row"""
-    r = {}
-    origin = dict(row)
-
-    def parse_recursive(data: Dict[str, Any], field: str, value: Any):
-        """ parse nested fields"""
-        if separator in field:
-            name = field.split(separator)[0]
-            if name not in data: data[name] = dict()
-            parse_recursive(data[name], field.replace(f"{name}{separator}", ""), value)
-        else:
-            data[field] = value
+sqlite3.register_converter('boolean', lambda x: bool(int(x)))
 
-    for i in row.keys():
-        parse_recursive(r, i, origin[i])
+class SQLiteRowDecoder():
+    """ SQLiteRowDecoder class
 
-    return r
+        compiled once per result columns, maps column indexes straight to nested dict paths
+        (column `created__user_id` -> data["created"]["user_id"])
+    """
+    def __init__(self, columns: Tuple[str, ...], separator: str = SQLITE_NESTING_SEPARATOR):
+        # nested dicts as (parent container, key), container 0 is the root dict
+        self._containers: List[Tuple[int, str]] = []
+        # values as (container, key, column index)
+        self._fields: List[Tuple[int, str, int]] = []
+
+        index: Dict[Tuple[str, ...], int] = {(): 0}
+        seen = set()
+        for i, column in enumerate(columns):
+            # duplicated column names (SELECT * with join), first one wins
+            if column in seen: continue
+            seen.add(column)
+
+            path = tuple(column.split(separator))
+            parent = 0
+            for depth in range(1, len(path)):
+                if path[:depth] not in index:
+                    index[path[:depth]] = len(self._containers) + 1
+                    self._containers.append((parent, path[depth - 1]))
+                parent = index[path[:depth]]
+            self._fields.append((parent, path[-1], i))
+
+    def __call__(self, row: Tuple[Any, ...]) -> Dict[str, Any]:
+        """ decode row to nested dict """
+        containers: List[Dict[str, Any]] = [dict()]
+        for parent, key in self._containers:
+            d: Dict[str, Any] = dict()
+            containers[parent][key] = d
+            containers.append(d)
+        for c, key, i in self._fields:
+            containers[c][key] = row[i]
+        return containers[0]
+
+# joined tables columns cache, {table: [column, ...]}
+_table_columns: Dict[str, List[str]] = dict()
+
+@lru_cache(maxsize=SQLITE_DECODER_CACHE_SIZE)
+def _columns_decoder(table: str, columns: Tuple[str, ...]) -> SQLiteRowDecoder:
+    """ row decoder of table columns, least recently used decoders are dropped """
+    return SQLiteRowDecoder(columns)
+
+def _row_decoder(table: str, cursor: sqlite3.Cursor) -> SQLiteRowDecoder:
+    """ returns cached row decoder for table and cursor columns """
+    return _columns_decoder(table, tuple(d[0] for d in cursor.description))
+
+def _clean_joined(data: Dict[str, Any]) -> Dict[str, Any]:
+    """ joined collections to lists, removes empty joined records (no id), same as DatabaseModel.__init__ """
+    joined = data.get(SQLITE_JOINED_COLLECTIONS_FIELD, None)
+    if not joined: return data
+
+    for j in joined:
+        items = joined[j] if isinstance(joined[j], list) else [joined[j]]
+        joined[j] = [i for i in items if i.get("id", None)]
+    return data
+
+def _is_read(sql: str) -> bool:
+    """ returns true if sql statement does not write to database """
+    return sql.lstrip()[:7].upper().startswith(SQLITE_READ_STATEMENTS)
+
+class SQLiteConnectionPool(UniDefault):
+    """ SQLiteConnectionPool class
+
+        thread-local connection pool, every worker thread gets its own connection per database file,
+        connections are opened in WAL mode and reused across requests
+    """
+    def __init__(self):
+        self._local = threading.local()
+
+    def _connect(self, filename: str) -> sqlite3.Connection:
+        """ open and configure new connection """
+        # autocommit mode, transactions are handled explicitly by SQLiteDatabase.transaction()
+        conn = sqlite3.connect(filename, SQLITE_TIMEOUT, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute(f"PRAGMA mmap_size={int(self.config.sqlite_mmap_size)};")
+        conn.execute(f"PRAGMA cache_size={int(self.config.sqlite_cache_size)};")
+
+        logger.debug(f"SQLite connection opened: {filename}, thread: {threading.get_ident()}")
+        return conn
+
+    def connection(self, filename: str) -> sqlite3.Connection:
+        """ returns connection for current thread, opens new one if needed """
+        connections: Optional[Dict[str, sqlite3.Connection]] = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = dict()
+
+        conn = connections.get(filename, None)
+        if conn is None:
+            conn = connections[filename] = self._connect(filename)
+        return conn
+
+    def close(self) -> None:
+        """ close connections of current thread """
+        connections: Dict[str, sqlite3.Connection] = getattr(self._local, "connections", dict())
+        for conn in connections.values():
+            conn.close()
+        self._local.connections = dict()
+
+_pool = SQLiteConnectionPool()
 
 class SQLiteColumn(BaseModel):
     """ SQLColumn model
@@ -159,8 +287,52 @@ class SQLiteColumn(BaseModel):
             
         return r
 
+class SQLiteStatements():
+    """ SQLiteStatements class
+
+        column layout and prepared INSERT/UPDATE sql of one model class,
+        record values are extracted by precomputed accessors
+    """
+    def __init__(self, table: str, model: Type[T_DatabaseModel], separator: str = SQLITE_NESTING_SEPARATOR):
+        self.columns = SQLiteColumn.from_model(model)
+        names = [c.name for c in self.columns]
+
+        insert_names = [n for n in names if n != "seq"]
+        update_names = [n for n in names if n not in ("id", "seq")]
+
+        self.insert_sql = f"INSERT INTO {table} ({', '.join(insert_names)}) VALUES({', '.join('?' * len(insert_names))});"
+        self.update_sql = f"UPDATE {table} SET {', '.join(f'{n} = ?' for n in update_names)} WHERE id = ?;"
+
+        self._insert_values = self._accessor(insert_names, separator)
+        self._update_values = self._accessor(update_names + ["id"], separator)
+
+    @staticmethod
+    def _accessor(names: List[str], separator: str) -> operator.attrgetter:
+        """ one getter for all columns, `created__user_id` -> record.created.user_id """
+        return operator.attrgetter(*[n.replace(separator, ".") for n in names])
+
+    def insert_values(self, record: DatabaseModel) -> List[Any]:
+        """ values for insert_sql """
+        return list(self._insert_values(record))
+
+    def update_values(self, record: DatabaseModel) -> List[Any]:
+        """ values for update_sql """
+        return list(self._update_values(record))
+
 class SQLiteQueryBuilder(UniDefault):
     """ SQLQueryBuilder class contains methods for building sql queries """
+
+    # prepared statements per (model class, table)
+    _statements: Dict[Tuple[Type[DatabaseModel], str], SQLiteStatements] = dict()
+
+    def statements(self, table: str, model: Type[T_DatabaseModel]) -> SQLiteStatements:
+        """ returns cached column layout and prepared statements for model class """
+        key = (model, table)
+        statements = SQLiteQueryBuilder._statements.get(key, None)
+        if statements is None:
+            statements = SQLiteQueryBuilder._statements[key] = SQLiteStatements(table, model)
+        return statements
+
     def get_columns(self, data: T_DatabaseModel | Type[T_DatabaseModel]) -> List[SQLiteColumn]:
         """ returns table name and columns from record"""
         return SQLiteColumn.from_model(data)
@@ -193,6 +365,77 @@ class SQLiteQueryBuilder(UniDefault):
 
         return sql, columns
     
+    def _index_name(self, prefix: str, table: str, columns: List[str]) -> str:
+        """ managed index name, always used quoted """
+        return f"{prefix}:{table}:{','.join(columns)}"
+
+    def indexes(self, table: str, model: Type[T_DatabaseModel]) -> Dict[str, str]:
+        """ returns managed indexes as {name: sql}, declared (_index, _compound_index, _unique) and default ones """
+        columns = [c.name for c in self.get_columns(model)]
+        ret: Dict[str, str] = dict()
+
+        def add(keys: List[str], unique: bool = False) -> None:
+            cols = [k.replace(".", SQLITE_NESTING_SEPARATOR) for k in keys]
+            for c in cols:
+                if c not in columns:
+                    logger.warning(f"SQL: can not create index, unknown column: {c}, table: {table}")
+                    return None
+
+            prefix = SQLITE_UNIQUE_INDEX_PREFIX if unique else SQLITE_INDEX_PREFIX
+            name = self._index_name(prefix, table, cols)
+            _unique = "UNIQUE " if unique else ""
+            ret[name] = f"CREATE {_unique}INDEX IF NOT EXISTS \"{name}\" ON {table} ({', '.join(cols)});"
+
+        unique = _private_default(model, "_unique") or []
+        for keys in SQLITE_DEFAULT_INDEXES:
+            if keys[0] in unique: continue
+            add(keys)
+        for key in _private_default(model, "_index") or []:
+            if key in unique: continue
+            add([key])
+        for keys in _private_default(model, "_compound_index") or []:
+            add(list(keys))
+        for key in unique:
+            add([key], unique=True)
+
+        return ret
+
+    def text_index_name(self, table: str) -> str:
+        """ full-text index (FTS5 table) name """
+        return f"{SQLITE_TEXT_INDEX_PREFIX}_{table}"
+
+    def text_index_columns(self, table: str, model: Type[T_DatabaseModel]) -> List[str]:
+        """ text index columns declared in model (_text_index) """
+        columns = [c.name for c in self.get_columns(model)]
+        ret = []
+        for key in _private_default(model, "_text_index") or []:
+            col = key.replace(".", SQLITE_NESTING_SEPARATOR)
+            if col not in columns:
+                logger.warning(f"SQL: can not create text index, unknown column: {col}, table: {table}")
+                continue
+            ret.append(col)
+        return ret
+
+    def text_index(self, table: str, model: Type[T_DatabaseModel]) -> List[str]:
+        """ full-text index statements, external content FTS5 table (rowid = seq) kept in sync by triggers """
+        columns = self.text_index_columns(table, model)
+        if not columns: return []
+
+        name = self.text_index_name(table)
+        cols = ", ".join(columns)
+        new = ", ".join(f"new.{c}" for c in columns)
+        old = ", ".join(f"old.{c}" for c in columns)
+        return [
+            f"CREATE VIRTUAL TABLE {name} USING fts5({cols}, content='{table}', content_rowid='seq', tokenize='{SQLITE_TEXT_INDEX_TOKENIZE}')",
+            f"CREATE TRIGGER {name}_ai AFTER INSERT ON {table} BEGIN INSERT INTO {name}(rowid, {cols}) VALUES (new.seq, {new}); END",
+            f"CREATE TRIGGER {name}_ad AFTER DELETE ON {table} BEGIN INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.seq, {old}); END",
+            f"CREATE TRIGGER {name}_au AFTER UPDATE ON {table} BEGIN INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.seq, {old}); INSERT INTO {name}(rowid, {cols}) VALUES (new.seq, {new}); END",
+        ]
+
+    def text_query(self, value: Any) -> str:
+        """ FTS5 query from user input, every word as quoted prefix term """
+        return " ".join(f'"{w}"*' for w in re.findall(r"\w+", str(value)))
+
     def insert(self, table: str, cols: List[SQLiteColumn], exclude: Optional[List[str]] = None) -> Tuple[str, List[Any]]:
         """ create inserts sql, returns sql + param/values for execute()"""
         _exclude = ["seq"]
@@ -246,26 +489,37 @@ class SQLiteQueryBuilder(UniDefault):
         return sql, values
     
     def _query_join_fields(self, fields: str, table: str, join: Dict[str,Dict[str, Any]]) -> str:
-        """ prepare query join fields"""
+        """ prepare query join fields, equality join for scalar fields, json_each join for list fields """
         ret = ""
         for key in join:
             j = join[key]
             if not j['fields']: continue  # table not exists?
             fields += f", {j['fields']}"
-            ret += f" LEFT OUTER JOIN {j['table']} ON {table}.{j['local_field']} LIKE '%' || {j['table']}.{j['foreign_field']} || '%'"
+            alias = j['alias']
+            if j['list']:
+                ret += f" LEFT OUTER JOIN json_each({table}.{j['local_field']}) AS {alias}_each"
+                ret += f" LEFT OUTER JOIN {j['table']} AS {alias} ON {alias}.{j['foreign_field']} = {alias}_each.value"
+            else:
+                ret += f" LEFT OUTER JOIN {j['table']} AS {alias} ON {alias}.{j['foreign_field']} = {table}.{j['local_field']}"
         ret = f"SELECT {fields} FROM {table}"+ret
 
         return ret
     
-    def query(self, table: str, values: List[Any], filters: str = "", sort: str = "", limit: str = "", join: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, List[Any]]:
-        """ query """
+    def query(self, table: str, values: List[Any], filters: str = "", sort: str = "", limit: str = "", join: Optional[List[Dict[str, Any]]] = None, total: bool = False, columns: Optional[List[str]] = None) -> Tuple[str, List[Any]]:
+        """ query, total adds count of all filtered rows (window function, limit excluded) to every row, columns selects only given table columns """
         sql = ""
+        fields = ", ".join(f"{table}.{c}" for c in columns) if columns else f"{table}.*"
         if join:
-            sql = self._query_join_fields("*", table, join)
+            sql = self._query_join_fields(fields, table, join)
+        elif total:
+            sql = f"SELECT {fields}, COUNT(*) OVER() AS {SQLITE_TOTAL_FIELD} FROM {table}"
         else:
-            sql = f"SELECT * FROM {table}"
+            sql = f"SELECT {fields} FROM {table}"
         if filters:
             sql += f" WHERE {filters}"
+        if join and not sort:
+            # joined rows of one entity have to be adjacent for streamed merge, sort ends with id
+            sort = f"ORDER BY {table}.id"
         if sort:
             sql += f" {sort}"
         if limit:
@@ -278,7 +532,7 @@ class SQLiteQueryBuilder(UniDefault):
         """ count query """
         sql = ""
         if join:
-            sql = self._query_join_fields(f"COUNT(DISTINCT {table}.id), *", table, join)
+            sql = self._query_join_fields(f"COUNT(DISTINCT {table}.id)", table, join)
         else:
             sql = f"SELECT COUNT(DISTINCT id) FROM {table}"
         if filters:
@@ -286,6 +540,47 @@ class SQLiteQueryBuilder(UniDefault):
         sql+= ";"
         return sql, values
     
+    def seq_range(self, table: str) -> Tuple[str, List[Any]]:
+        """ first and last seq (rowid) of table, separate subqueries, each is O(log n) """
+        return f"SELECT (SELECT MIN(seq) FROM {table}), (SELECT MAX(seq) FROM {table});", []
+
+    def count_sample(self, table: str, values: List[Any], filters: str, seq_from: int, step: int, size: int) -> Tuple[str, List[Any]]:
+        """ count of rows matching filters among one row of every step seq values (rowid lookups, deleted rows are not matched),
+            position in step is hashed (multiplicative hash), periodic inserts are not aliased """
+        sql = (
+            f"WITH RECURSIVE uni_sample(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM uni_sample LIMIT ?)"
+            f" SELECT COUNT(*) FROM uni_sample CROSS JOIN {table}"
+            f" WHERE {table}.seq = ? + uni_sample.i * ? + (uni_sample.i * {SQLITE_SAMPLE_HASH}) % ? AND ({filters});"
+        )
+        return sql, [size, seq_from, step, step] + values
+
+    def group(self, table: str, values: List[Any], group_by: List[str], metrics: List[DbMetric], filters: str = "", limit: str = "") -> Tuple[str, List[Any]]:
+        """ aggregation query, group columns are selected directly (declared types, converters), rows sorted by group columns """
+        groups = [f"{table}.{c}" for c in group_by]
+        fields = groups + [SQLITE_AGGREGATE_FUNCTIONS[fn].format(f"{table}.{c}" if c else "*") for fn, c in metrics]
+        sql = f"SELECT {', '.join(fields)} FROM {table}"
+        if filters:
+            sql += f" WHERE {filters}"
+        if groups:
+            sql += f" GROUP BY {', '.join(groups)} ORDER BY {', '.join(groups)}"
+            if limit:
+                sql += f" {limit}"
+        sql += ";"
+        return sql, values
+
+    def facets(self, table: str, values: List[Any], columns: List[str], filters: str = "", limit: int = 0) -> Tuple[str, List[Any]]:
+        """ value counts of columns in one compound query, one value column per facet,
+            first (empty) select gives every value column its declared type (converters) """
+        where = f" WHERE {filters}" if filters else ""
+        parts = [f"SELECT NULL, {', '.join(f'{table}.{c}' for c in columns)}, 0 FROM {table} WHERE 0"]
+        for i, column in enumerate(columns):
+            fields = ", ".join(f"{table}.{c}" if c == column else "NULL" for c in columns)
+            parts.append(
+                f"SELECT * FROM (SELECT {i}, {fields}, COUNT(*) AS {SQLITE_TOTAL_FIELD} FROM {table}{where}"
+                f" GROUP BY {table}.{column} ORDER BY {SQLITE_TOTAL_FIELD} DESC, {table}.{column} LIMIT {int(limit)})"
+            )
+        return " UNION ALL ".join(parts) + ";", values * len(columns)
+
     def log_sql(self, sql: str, values: Optional[List[Any]]) -> str:
         """ returns sql with filled values """
         if not values:
@@ -296,11 +591,12 @@ class SQLiteQueryBuilder(UniDefault):
         return sql
 
 class SQLiteFilterCondition(FilterCondition):
-    def __init__(self, key: str, operator, value, table: str, joined: Optional[List] = None):
+    def __init__(self, key: str, operator, value, table: str, joined: Optional[List] = None, text_index: Optional[List[str]] = None):
         super().__init__(key, operator, value)
         self.key = self.key.replace(".", SQLITE_NESTING_SEPARATOR)
         self._joined = joined
         self._table = table
+        self._text_index = text_index or []
 
     def get(self, values: List[Any]):
         if self.operator not in SQLITE_FILTER_OPERATORS.keys():
@@ -325,10 +621,24 @@ class SQLiteFilterCondition(FilterCondition):
                         return ""
                     values.append(f"%{self.value}%")
                     return f"{self.key} {op} ?"
+        # full-text search in indexed column, without text index same as regex
+        if self.operator == "search" and self.key in self._text_index:
+            query = SQLiteQueryBuilder().text_query(self.value)
+            if not query: return "1 = 1"
+            name = SQLiteQueryBuilder().text_index_name(self._table)
+            values.append(f"{self.key} : ({query})")
+            return f"{self._table}.seq IN (SELECT rowid FROM {name} WHERE {name} MATCH ?)"
+
+        # value in list
+        if self.operator == "in":
+            if not self.value: return "1 = 0"
+            values += list(self.value)
+            return f"{self._table}.{self.key} IN ({', '.join('?' for _ in self.value)})"
+
         try:
             #values.append(self.key)
             values.append(self.value)
-            if self.operator == "regex":
+            if self.operator == "regex" or self.operator == "search":
                 values[-1] = (f"%{self.value}%")
             
             return f"{self._table}.{self.key} {SQLITE_FILTER_OPERATORS[self.operator]} ?"
@@ -354,31 +664,56 @@ class SQLiteResult(DbResult[T_DatabaseModel]):
 
         self._joined = {}
 
-    def _joined_table_fields(self, table: str, output: str):
-        sql = f"PRAGMA table_info('{table}')"
-        fields = self._sql(sql).fetchall()
-        if not len(fields):
-            return ""
-
-        names = ""
-        for f in fields:
-            f = dict(f)
-            names += f"{table}.{f['name']} AS joined_collections__{output.replace('.', SQLITE_NESTING_SEPARATOR)}__{f['name']}, "
-
-        return names[:-2]
-
+    def _table_columns(self, table: str) -> List[str]:
+        """ table columns, cached """
+        columns = _table_columns.get(table, None)
+        if columns is None:
+            columns = [dict(f)['name'] for f in self._sql(f"PRAGMA table_info('{table}')").fetchall()]
+            if not len(columns):
+                return []  # table not exists (yet), not cached
+            _table_columns[table] = columns
+        return columns
+
+    def _columns(self, as_dict: bool) -> Optional[List[str]]:
+        """ selected table columns, projection is used for dicts only (models need all fields), None for all """
+        if not as_dict or not self._fields: return None
+
+        fields = [f.replace(".", SQLITE_NESTING_SEPARATOR) for f in self._fields]
+        return [
+            c for c in self._table_columns(self.q_table)
+            if any(c == f or c.startswith(f+SQLITE_NESTING_SEPARATOR) for f in fields) != self._fields_exclude
+        ]
+
+    def _joined_table_fields(self, table: str, alias: str, output: str):
+        """ select fields of joined table, table columns are cached """
+        columns = self._table_columns(table)
+        if not columns:
+            return ""  # table not exists (yet)
+
+        output = output.replace('.', SQLITE_NESTING_SEPARATOR)
+        return ", ".join(f"{alias}.{c} AS {SQLITE_JOINED_COLLECTIONS_FIELD}{SQLITE_NESTING_SEPARATOR}{output}{SQLITE_NESTING_SEPARATOR}{c}" for c in columns)
+
+    def _is_list_field(self, field: str) -> bool:
+        """ returns true if model column stores list (JSON array) """
+        for c in self.builder.statements(self.q_table, self._model).columns:
+            if c.name == field: return c.field_type == list
+        return False
 
     def _join(self, table: str, local_field: str, output_field: str, foreign_field: Optional[str] = None) -> DbResult[T_DatabaseModel]:
         if foreign_field: foreign_field = foreign_field
         if not foreign_field: foreign_field = "id"
 
         foreign_field = foreign_field.replace(".", SQLITE_NESTING_SEPARATOR)
+        local_field = local_field.replace(".", SQLITE_NESTING_SEPARATOR)
+        alias = f"{SQLITE_JOINED_COLLECTIONS_FIELD}_{len(self._joined)}"
 
         self._joined[output_field] = dict(
             table=table,
+            alias=alias,
             local_field=local_field,
             foreign_field = foreign_field,
-            fields=self._joined_table_fields(table, output_field)
+            list=self._is_list_field(local_field),
+            fields=self._joined_table_fields(table, alias, output_field)
         )
         return self
 
@@ -404,7 +739,33 @@ class SQLiteResult(DbResult[T_DatabaseModel]):
         key = key.replace(".", SQLITE_NESTING_SEPARATOR)
         _order = "DESC"
         if order == DbOrder.ASC: _order = "ASC"
-        self.q_sort = f"ORDER BY {key} {_order}"
+        self.q_sort = f"ORDER BY {key} {_order}, {self.q_table}.id {_order}"
+        return self
+
+    def _keyset(self, cursor: DbCursor, before: bool = False) -> DbResult[T_DatabaseModel]:
+        """ private keyset pagination, range on sort key (index can be used) with id as tiebreaker """
+        key = f"{self.q_table}.{cursor.key.replace('.', SQLITE_NESTING_SEPARATOR)}"
+        id = f"{self.q_table}.id"
+        desc = (cursor.order == DbOrder.DESC) != before
+        op = "<" if desc else ">"
+
+        # NULLs are sorted first
+        if cursor.value is None:
+            if desc:
+                sql, values = f"{key} IS NULL AND {id} < ?", [cursor.id]
+            else:
+                sql, values = f"({key} IS NULL AND {id} > ?) OR {key} IS NOT NULL", [cursor.id]
+        else:
+            sql, values = f"{key} {op}= ? AND ({key} {op} ? OR {id} {op} ?)", [cursor.value, cursor.value, cursor.id]
+            if desc and self._nullable_key(cursor.key):
+                sql = f"({sql}) OR {key} IS NULL"
+
+        self.q_filters.append(f"({sql})")
+        self.q_values += values
+
+        # before cursor, fetched in reversed order
+        if before:
+            self.sort(cursor.key, DbOrder.ASC if cursor.order == DbOrder.DESC else DbOrder.DESC)
         return self
     
     def _filter(self, query: Any) -> DbResult[T_DatabaseModel]:
@@ -443,7 +804,10 @@ class SQLiteResult(DbResult[T_DatabaseModel]):
                 msg = f"Error, filtering data, filter: {query}"
                 logger.error(color_red(msg))
                 raise ServerError(msg)
-            return SQLiteFilterCondition(query[0], query[1], query[2], self.q_table, self._joined).get(self.q_values)
+            text_index = None
+            if query[1] == "search":
+                text_index = self.builder.text_index_columns(self.q_table, self._model)
+            return SQLiteFilterCondition(query[0], query[1], query[2], self.q_table, self._joined, text_index).get(self.q_values)
 
         # bad type
         else:
@@ -453,87 +817,165 @@ class SQLiteResult(DbResult[T_DatabaseModel]):
 
         return FilterExpression(data=filtered).get()
 
+    def _where(self) -> str:
+        """ filters joined by AND """
+        return " AND ".join(self.q_filters)
+
     def __len__(self) -> int:
         """ Count aggregation entities"""
-        filters = ""
-        for f in self.q_filters:
-            filters += f"{f} AND "
-        if filters:
-            filters = filters[:-5]
-
         # count rows
-        sql, values = self.builder.count(self.q_table, self.q_values, filters, join=self._joined)
+        sql, values = self.builder.count(self.q_table, self.q_values, self._where(), join=self._joined)
         r = self._sql(sql, values).fetchone()
         if r:
             return list(r)[0]
         return 0
 
-    
-    def _fetch(self, as_dict: bool = False) -> List[T_DatabaseModel]:
-        """ run queries and fetch data """
-        # TODO: as dict
-        ret = []
-        ret_dict = {}
-        filters = ""
-        
-        for f in self.q_filters:
-            filters += f"{f} AND "
-        if filters:
-            filters = filters[:-5]
-
-        sql, values = self.builder.query(self.q_table, self.q_values, filters, self.q_sort, self.q_limit, join=self._joined)        
-        for r in  self._sql(sql, values).fetchall():
-            self.thread_wait()
-            entity = self._model(**_dict_from_row(r))
-            if entity.id not in ret_dict:
-                ret_dict[entity.id] = entity
-                ret.append(
-                    entity
-                )
-            else:
-                if entity.joined_collections:
-                    for j in entity.joined_collections:
-                        ret_dict[entity.id].joined_collections[j] += entity.joined_collections[j]
+    def _estimated_len(self) -> Tuple[int, bool]:
+        """ estimated count, table size from seq (rowid) range (deleted rows included),
+            share of matching rows from sample spread over whole seq range (time-correlated filters are not skewed) """
+        if self._joined: return len(self), False
+
+        first, last = self._sql(*self.builder.seq_range(self.q_table)).fetchone()
+        if first is None: return 0, False
+        total = last - first + 1
+        where = self._where()
+        if total <= DB_COUNT_SAMPLE: return len(self), False
+        if not where: return total, True
+
+        # at most DB_COUNT_SAMPLE probes, every step-th seq of whole range
+        step = -(-total // DB_COUNT_SAMPLE)
+        probes = -(-total // step)
+        sql, values = self.builder.count_sample(self.q_table, self.q_values, where, first, step, probes)
+        matched = self._sql(sql, values).fetchone()[0]
+        # selective filter, exact count (index)
+        if matched < DB_COUNT_MIN_SAMPLE_MATCHES: return len(self), False
+        return round(total * matched / probes), True
+
+    def _aggregate_columns(self, keys: List[str]) -> Optional[List[str]]:
+        """ table columns of aggregated keys, None if table not exists (yet), joined rows would be counted multiple times """
+        if self._joined:
+            msg = "aggregation of joined result is not supported"
+            logger.error(color_red(msg))
+            raise ServerError(msg)
+        if not self._table_columns(self.q_table): return None
+        return [k.replace(".", SQLITE_NESTING_SEPARATOR) for k in keys]
+
+    def _group(self, group_by: List[str], metrics: Dict[str, DbMetric]) -> List[Dict[str, Any]]:
+        """ private aggregation, GROUP BY query, limit applies to groups """
+        columns = self._aggregate_columns(group_by + [k for _, k in metrics.values() if k])
+        if columns is None: return []
+
+        functions = [(fn, k.replace(".", SQLITE_NESTING_SEPARATOR) if k else None) for fn, k in metrics.values()]
+        sql, values = self.builder.group(self.q_table, self.q_values, columns[:len(group_by)], functions, self._where(), self.q_limit)
+        names = group_by + list(metrics)
+        cursor = self._sql(sql, values)
+        try:
+            return [dict(zip(names, r)) for r in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def _facets(self, fields: List[str], limit: int) -> Dict[str, List[Dict[str, Any]]]:
+        """ private facet counts, one compound query """
+        ret: Dict[str, List[Dict[str, Any]]] = {f: [] for f in fields}
+        columns = self._aggregate_columns(fields)
+        if columns is None: return ret
+
+        sql, values = self.builder.facets(self.q_table, self.q_values, columns, self._where(), limit)
+        cursor = self._sql(sql, values)
+        try:
+            for r in cursor.fetchall():
+                ret[fields[r[0]]].append(dict(value=r[r[0] + 1], count=r[-1]))
+        finally:
+            cursor.close()
         return ret
-        
+
+    def _fetch(self, as_dict: bool = False) -> Iterable[T_DatabaseModel]:
+        """ run query and stream records in batches, dicts are returned without model validation """
+        sql, values = self.builder.query(self.q_table, self.q_values, self._where(), self.q_sort, self.q_limit, join=self._joined, columns=self._columns(as_dict))
+        return self._records(sql, values, as_dict)
+
+    def _fetch_with_total(self, as_dict: bool = False) -> Tuple[List[Any], int]:
+        """ fetch with total count in one query (window function), joined rows are counted by count query """
+        if self._joined: return super()._fetch_with_total(as_dict)
+
+        totals: List[int] = []
+        sql, values = self.builder.query(self.q_table, self.q_values, self._where(), self.q_sort, self.q_limit, total=True, columns=self._columns(as_dict))
+        items = list(self._records(sql, values, as_dict, totals))
+        if totals: return items, totals[0]
+
+        # no rows, skipped records still have to be counted
+        return items, len(self) if self.q_limit else 0
+
+    def _records(self, sql: str, values: List[Any], as_dict: bool, totals: Optional[List[int]] = None) -> Iterable[T_DatabaseModel]:
+        """ stream query records in batches, total count column is moved to totals """
+        cursor = self._sql(sql, values)
+        decoder = _row_decoder(self.q_table, cursor)
+
+        # joined rows of one entity are adjacent (sorted by id within sort key), merged into current record
+        current: Optional[Dict[str, Any]] = None
+        try:
+            while True:
+                rows = cursor.fetchmany(SQLITE_FETCH_BATCH)
+                if not rows: break
+                self.thread_wait()
+                for r in rows:
+                    entity = _clean_joined(decoder(r))
+                    if totals is not None:
+                        total = entity.pop(SQLITE_TOTAL_FIELD)
+                        if not totals: totals.append(total)
+                    if current is not None and current["id"] == entity["id"]:
+                        # several joins multiply rows, keep each joined record once
+                        joined = entity.get(SQLITE_JOINED_COLLECTIONS_FIELD, None) or {}
+                        for j in joined:
+                            known = {i["id"] for i in current[SQLITE_JOINED_COLLECTIONS_FIELD][j]}
+                            current[SQLITE_JOINED_COLLECTIONS_FIELD][j] += [i for i in joined[j] if i["id"] not in known]
+                        continue
+
+                    if current is not None:
+                        yield current if as_dict else self._model(**current)
+                    current = entity
+
+            if current is not None:
+                yield current if as_dict else self._model(**current)
+        finally:
+            cursor.close()
+
 class SQLiteDatabase(Database):
     """ SQLiteDatabase class"""
+    _online_export = True
 
     # cache to store runtime info about tables, ...
     __cache = dict(
         tables=dict(
-            created=[]
+            created=[],
+            # registered models, tables are checked again after import
+            models=dict()
         )
     )
 
     def __init__(self):
-        db_filename = self._get_db_filename()
+        super().__init__()
+        self._db_filename = self._get_db_filename()
         self.builder = SQLiteQueryBuilder()
         
-        # create connection
+        # check connection
         try:
-            self._client = sqlite3.connect(db_filename, 5, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+            self._client
         except Exception as e:
             logger.error(color_red(str(e)))
             raise ServerError(str(e))
 
-        self._client.row_factory = sqlite3.Row
-        self._cursor = self._client.cursor()
-
         logger.debug(f"{self.__class__.__name__}.__init__()")
-        
-    @classmethod
-    def is_cachable(cls):
-        return False
+
+    @property
+    def _client(self) -> sqlite3.Connection:
+        """ connection for current thread """
+        return _pool.connection(self._db_filename)
 
     @property
     def ok(self) -> bool:
         # TODO: fixme
         return True
-        
-    def __del__(self):
-        if self._client:
-            self._client.close()
 
     @property
     def db_name(self):
@@ -551,21 +993,67 @@ class SQLiteDatabase(Database):
         except Exception as e:
             logger.error(color_red(str(e)))
             raise ServerError(str(e))
-    def _commit(self):
-        self._client.commit()
+
+    def _transaction_begin(self) -> None:
+        """ begin transaction, writers from other threads wait until commit/rollback """
+        SQL_LOCK.acquire()
+        try:
+            self._execute("BEGIN IMMEDIATE;")
+        except Exception:
+            SQL_LOCK.release()
+            raise
+
+    def _transaction_commit(self) -> None:
+        """ commit transaction """
+        try:
+            self._execute("COMMIT;")
+        except Exception:
+            self._client.rollback()
+            raise
+        finally:
+            SQL_LOCK.release()
+
+    def _transaction_rollback(self) -> None:
+        """ rollback transaction """
+        try:
+            self._execute("ROLLBACK;")
+        finally:
+            SQL_LOCK.release()
+
+    def _execute(self, sql: str, values: Optional[List[Any]] = None) -> sqlite3.Cursor:
+        """ execute sql on connection of current thread """
+        if values: return self._client.execute(sql, values)
+        return self._client.execute(sql)
 
     def _sql(self, sql: str, values: Optional[List[Any]] = None) -> sqlite3.Cursor:
-        """ execute sql """
+        """ execute sql, only writers are serialized, outside of transaction every write is committed immediately """
         logger.debug(f"Running SQL: {self.builder.log_sql(sql, values)}\n values: {values}")
+        if _is_read(sql):
+            return self._execute(sql, values)
+
         with SQL_LOCK:
-            if values: c = self._cursor.execute(sql, values)
-            else: c = self._cursor.execute(sql)
-            self._client.commit()    
-        return c
+            return self._execute(sql, values)
         
+    def _sql_many(self, sql: str, values: List[List[Any]]) -> sqlite3.Cursor:
+        """ execute write sql for every values item """
+        logger.debug(f"Running SQL: {sql}\n records: {len(values)}")
+        with SQL_LOCK:
+            return self._client.executemany(sql, values)
+
+    def _existing_ids(self, table: str, ids: List[uuid.UUID]) -> set:
+        """ returns ids stored in table """
+        ret = set()
+        for i in range(0, len(ids), SQLITE_MAX_VARIABLES):
+            chunk = ids[i:i+SQLITE_MAX_VARIABLES]
+            sql = f"SELECT id FROM {table} WHERE id IN ({', '.join('?' * len(chunk))});"
+            for r in self._sql(sql, chunk).fetchall():
+                ret.add(r[0])
+        return ret
+
     def _create_table(self, table: str, record: DatabaseModel) -> List[SQLiteColumn]:
         """ create table if not exists"""
         sql, cols = self.builder.create_table(table, record)
+        SQLiteDatabase.__cache["tables"]["models"][table] = record
 
         # alreaddy createdd?
         if sql in SQLiteDatabase.__cache["tables"]["created"]:
@@ -574,26 +1062,105 @@ class SQLiteDatabase(Database):
         
         try:
             self._sql(sql)
+            _table_columns.pop(table, None)
+            self._add_columns(table, cols)
+            self._create_indexes(table, record)
+            self._create_text_index(table, record)
             SQLiteDatabase.__cache["tables"]["created"].append(sql)
             logger.debug(f"Table {table} created: sql")
         except Exception as e:
             raise ServerError(f"SQL: {e}")
         
         return cols
+
+    def _unique_columns(self, table: str) -> List[str]:
+        """ returns single columns with unique index (table constraints included) """
+        ret = []
+        for index in self._sql(f"PRAGMA index_list('{table}');").fetchall():
+            if not index["unique"]: continue
+            info = self._sql(f"PRAGMA index_info('{index['name']}');").fetchall()
+            if len(info) == 1: ret.append(info[0]["name"])
+        return ret
+
+    def _create_indexes(self, table: str, model: Type[T_DatabaseModel]) -> None:
+        """ create missing managed indexes, drop managed indexes no longer declared in model """
+        indexes = self.builder.indexes(table, model)
+        
+        # existing managed indexes
+        existing = []
+        for r in self._sql("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name=?;", [table]).fetchall():
+            name = r["name"]
+            if name.startswith(f"{SQLITE_INDEX_PREFIX}:") or name.startswith(f"{SQLITE_UNIQUE_INDEX_PREFIX}:"):
+                existing.append(name)
+
+        # drop
+        for name in existing:
+            if name in indexes: continue
+            self._sql(f"DROP INDEX IF EXISTS \"{name}\";")
+            logger.info(f"SQL: index dropped: {name}")
+
+        # unique constraints from create table, no need to duplicate
+        unique_columns = self._unique_columns(table)
+
+        # create
+        for name, sql in indexes.items():
+            if name in existing: continue
+            if name.startswith(f"{SQLITE_UNIQUE_INDEX_PREFIX}:") and name.split(":")[-1] in unique_columns: continue
+            self._sql(sql)
+            logger.info(f"SQL: index created: {name}")
     
+    def _add_columns(self, table: str, cols: List[SQLiteColumn]) -> None:
+        """ add columns missing in existing table (new model fields), perm_bits is computed from permissions """
+        existing = [r["name"] for r in self._sql(f"PRAGMA table_info('{table}');").fetchall()]
+        for col in cols:
+            if col.name in existing: continue
+            if col.unique:
+                logger.warning(f"SQL: can not add unique column: {col.name}, table: {table}")
+                continue
+            self._sql(f"ALTER TABLE {table} ADD COLUMN {col.name} {col.field_type_str};")
+            logger.info(f"SQL: column added: {col.name}, table: {table}")
+
+            if col.name == "perm_bits":
+                bits = " + ".join(
+                    f"(COALESCE(permissions__{name.replace('.', SQLITE_NESTING_SEPARATOR)}, 0) != 0) * {bit}"
+                    for name, bit in PERM_BITS.items()
+                )
+                self._sql(f"UPDATE {table} SET perm_bits = {bits};")
+
+    def _create_text_index(self, table: str, model: Type[T_DatabaseModel]) -> None:
+        """ create (or recreate if changed) full-text index, existing records are indexed """
+        statements = self.builder.text_index(table, model)
+        name = self.builder.text_index_name(table)
+
+        r = self._sql("SELECT sql FROM sqlite_master WHERE type='table' AND name=?;", [name]).fetchone()
+        if r and statements and r["sql"] == statements[0]:
+            return
+
+        with self.transaction():
+            # drop changed or no longer declared
+            if r:
+                for t in SQLITE_TEXT_INDEX_TRIGGERS:
+                    self._sql(f"DROP TRIGGER IF EXISTS {name}_{t};")
+                self._sql(f"DROP TABLE IF EXISTS {name};")
+                logger.info(f"SQL: text index dropped: {name}")
+
+            if not statements: return
+            for sql in statements:
+                self._sql(sql)
+            self._sql(f"INSERT INTO {name}({name}) VALUES('rebuild');")
+            logger.info(f"SQL: text index created: {name}")
+
     def _create(self, record: DatabaseModel) -> Optional[uuid.UUID]:
         table = self._table(record)
-        cols = self.builder.get_columns(record)        
-        sql, values = self.builder.insert(table, cols)
-        self._sql(sql, values)
+        statements = self.builder.statements(table, record.__class__)
+        self._sql(statements.insert_sql, statements.insert_values(record))
         
         return record.id
 
     def _update(self, record: DatabaseModel) -> Optional[uuid.UUID]:
         table = self._table(record) 
-        cols = self.builder.get_columns(record)
-        sql, values = self.builder.update(table, cols)
-        if self._sql(sql, values).rowcount == 0:
+        statements = self.builder.statements(table, record.__class__)
+        if self._sql(statements.update_sql, statements.update_values(record)).rowcount == 0:
             return None 
 
         return record.id
@@ -605,14 +1172,45 @@ class SQLiteDatabase(Database):
         
         return record.id
     
+    def _create_many(self, records: List[DatabaseModel]) -> List[uuid.UUID]:
+        table = self._table(records[0])
+        statements = self.builder.statements(table, records[0].__class__)
+        self._sql_many(statements.insert_sql, [statements.insert_values(r) for r in records])
+
+        return [r.id for r in records]
+
+    def _update_many(self, records: List[DatabaseModel]) -> List[uuid.UUID]:
+        table = self._table(records[0])
+        statements = self.builder.statements(table, records[0].__class__)
+
+        # only stored records are updated
+        existing = self._existing_ids(table, [r.id for r in records])
+        records = [r for r in records if r.id in existing]
+        if not records: return []
+
+        self._sql_many(statements.update_sql, [statements.update_values(r) for r in records])
+        return [r.id for r in records]
+
+    def _delete_many(self, records: List[DatabaseModel]) -> List[uuid.UUID]:
+        table = self._table(records[0])
+
+        existing = self._existing_ids(table, [r.id for r in records])
+        ids = [r.id for r in records if r.id in existing]
+        for i in range(0, len(ids), SQLITE_MAX_VARIABLES):
+            chunk = ids[i:i+SQLITE_MAX_VARIABLES]
+            self._sql(f"DELETE FROM {table} WHERE id IN ({', '.join('?' * len(chunk))});", chunk)
+
+        return ids
+
     def _get_one(self, id: uuid.UUID, model: Type[T_DatabaseModel]) -> T_DatabaseModel | None:
         table = self._table(model)
         sql, values = self.builder.get_one(table, id)
-        r = self._sql(sql, values).fetchone()
+        c = self._sql(sql, values)
+        r = c.fetchone()
         if not r: return None
 
         # create entity from dict
-        return model(**_dict_from_row(r))
+        return model(**_row_decoder(table, c)(r))
     
     def _find(self, query: dict, model: Type[T_DatabaseModel]) -> DbResult:
         table = self._table(model)
@@ -621,7 +1219,7 @@ class SQLiteDatabase(Database):
             data=dict(
                 table=table,
                 filters=[],
-                sort=f"ORDER BY {SQLITE_SORT[0]} {SQLITE_SORT[1]}",
+                sort=f"ORDER BY {SQLITE_SORT[0]} {SQLITE_SORT[1]}, {table}.id {SQLITE_SORT[1]}",
                 sql=self._sql
             ),
             model=model
@@ -631,10 +1229,91 @@ class SQLiteDatabase(Database):
         return db_result
     
     def _export_database(self) -> Any:
-        return super()._export_database()
+        """ online export, consistent snapshot of database (WAL readers do not block writers), zipped """
+        super()._export_database()
+        output_zip = f"{self.config.database_export_directory}/sqlite_{utils.timestamp_factory()}"
+
+        # use temp directory
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            logger.info(f"Temp directory: {tmp_dir}")
+            target = os.path.join(tmp_dir, os.path.basename(self._db_filename))
+
+            # own connection, pooled connections are not blocked
+            conn = sqlite3.connect(self._db_filename, SQLITE_TIMEOUT, isolation_level=None)
+            try:
+                if sqlite3.sqlite_version_info >= (3, 27, 0):
+                    conn.execute("VACUUM INTO ?;", (target,))
+                else:
+                    # stepped backup, writers can run between steps
+                    dst = sqlite3.connect(target)
+                    try:
+                        conn.backup(dst, pages=SQLITE_BACKUP_PAGES)
+                    finally:
+                        dst.close()
+            finally:
+                conn.close()
+
+            return utils.zip_dir(output_zip, tmp_dir)
     
     def _import_database(self, filename: str, drop: bool) -> Any:
-        return super()._import_database(filename, drop)
+        """ import zipped database, replaced (drop) or merged in one transaction """
+        super()._import_database(filename, drop)
+
+        # use temp directory
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            logger.info(f"Temp directory: {tmp_dir}")
+            if not utils.unzip(filename, tmp_dir):
+                raise ServerError(f"Unable to unzip file: {filename}")
+
+            files = [os.path.join(tmp_dir, f) for f in os.listdir(tmp_dir)]
+            if len(files) != 1:
+                raise ServerError(f"bad sqlite export file: {filename}")
+            source = files[0]
+
+            # check imported database
+            src = sqlite3.connect(source, isolation_level=None)
+            try:
+                if src.execute("PRAGMA integrity_check;").fetchone()[0] != "ok":
+                    raise ServerError(f"sqlite database integrity check failed: {filename}")
+
+                if drop:
+                    # all pages copied in one step, readers see old or new database
+                    with SQL_LOCK:
+                        src.backup(self._client)
+            finally:
+                src.close()
+
+            if not drop:
+                self._import_merge(source)
+
+        # tables, columns and indexes are checked again, missing ones (older export) are created
+        SQLiteDatabase.__cache["tables"]["created"].clear()
+        _table_columns.clear()
+        for table, model in list(SQLiteDatabase.__cache["tables"]["models"].items()):
+            self._create_table(table, model)
+        return filename
+
+    def _import_merge(self, source: str) -> None:
+        """ insert records of attached database, existing records are kept """
+        self._execute(f"ATTACH DATABASE ? AS {SQLITE_IMPORT_SCHEMA};", [source])
+        try:
+            with self.transaction():
+                tables = self._sql(f"SELECT name, sql FROM {SQLITE_IMPORT_SCHEMA}.sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';").fetchall()
+                for table, create_sql in tables:
+                    # full-text indexes are maintained by triggers of main tables
+                    if table.startswith(f"{SQLITE_TEXT_INDEX_PREFIX}_"): continue
+                    columns = [c["name"] for c in self._sql(f"PRAGMA main.table_info('{table}');").fetchall()]
+                    if not columns:
+                        self._sql(create_sql)
+                        columns = [c["name"] for c in self._sql(f"PRAGMA main.table_info('{table}');").fetchall()]
+
+                    # seq (rowid) is assigned by main table, duplicates are decided by unique id
+                    imported = {c["name"] for c in self._sql(f"PRAGMA {SQLITE_IMPORT_SCHEMA}.table_info('{table}');").fetchall()}
+                    cols = ", ".join(c for c in columns if c in imported and c != "seq")
+                    order = " ORDER BY seq" if "seq" in imported else ""
+                    self._sql(f"INSERT OR IGNORE INTO main.{table} ({cols}) SELECT {cols} FROM {SQLITE_IMPORT_SCHEMA}.{table}{order};")
+        finally:
+            self._execute(f"DETACH DATABASE {SQLITE_IMPORT_SCHEMA};")
 
 
 if __name__ == "__main__": exit()
\ No newline at end of file
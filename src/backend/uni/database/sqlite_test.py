@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+
+"""
+uni.database.sqlite_test
+
+module test
+"""
+
+import asyncio
+import os
+import orjson
+import threading
+import types
+from typing import Any, Dict, List, Optional
+import uuid
+from pydantic import PrivateAttr
+
+from ..testing import AppTesting
+from ..logger import core_logger
+
+from . import database_factory, register_db_model
+from .base import DB_ASYNC_FETCH_BATCH, DB_COUNT_SAMPLE, DbCountMode, DbCursor, DbOrder, DbParams, _get_maintenance, _model_counters, _record_cache
+from .model import DatabaseModel
+from ..events.base import EventCreated
+from ..exceptions import ServerError
+from .sqlite import SQLITE_DECODER_CACHE_SIZE, SQLiteDatabase, _columns_decoder
+from ..services.permission import Permissions, perm_bits_mask, perm_bits_values, permission_db_filter
+
+
+logger = core_logger().getChild("database.sqlite")
+
+
+class db_SQLiteTest(DatabaseModel):
+    name: str = ""
+    value: int = 0
+    _index: List[str] = PrivateAttr(default=["name"])
+    _compound_index: List[List[str]] = PrivateAttr(default=[["name", "value"]])
+
+class db_SQLiteTestChild(DatabaseModel):
+    parent_id: Optional[uuid.UUID] = None
+    tags: List[uuid.UUID] = []
+
+class db_SQLiteTestLegacy(DatabaseModel):
+    name: str = ""
+
+class db_SQLiteTestText(DatabaseModel):
+    title: str = ""
+    body: str = ""
+    _text_index: List[str] = PrivateAttr(default=["title", "body"])
+
+class db_SQLiteTestCounted(DatabaseModel):
+    user_id: Optional[uuid.UUID] = None
+    read: bool = False
+    _counters: List[List[str]] = PrivateAttr(default=[["user_id", "read"]])
+
+class db_SQLiteTestCached(DatabaseModel):
+    name: str = ""
+    _cache_ttl: int = PrivateAttr(default=60)
+
+
+if __name__ == '__main__':
+    AppTesting.basic("sqlite database")
+
+    db = database_factory()
+    if not isinstance(db, SQLiteDatabase):
+        logger.info("database is not sqlite, skipping tests")
+        exit()
+
+    register_db_model(db_SQLiteTest)
+    register_db_model(db_SQLiteTestChild)
+    register_db_model(db_SQLiteTestText)
+    register_db_model(db_SQLiteTestCached)
+    register_db_model(db_SQLiteTestCounted)
+
+    # cached database object
+    assert db is database_factory()
+
+    # connection pool, one connection per thread, WAL mode
+    assert db._client is db._client
+    assert db._sql("PRAGMA journal_mode;").fetchone()[0] == "wal"
+
+    connections: Dict[str, Any] = dict()
+    def worker():
+        connections["worker"] = db._client
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join()
+    assert connections["worker"] is not db._client
+
+    # indexes
+    indexes = [r["name"] for r in db._sql("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='db_SQLiteTest';").fetchall()]
+    for name in db.builder.indexes("db_SQLiteTest", db_SQLiteTest):
+        assert name in indexes, name
+    assert "uni_idx:db_SQLiteTest:name,value" in indexes
+    assert "uni_idx:db_SQLiteTest:created__timestamp" in indexes
+    plan = str([tuple(r) for r in db._sql("EXPLAIN QUERY PLAN SELECT * FROM db_SQLiteTest ORDER BY created__timestamp DESC;").fetchall()])
+    assert "USING INDEX" in plan, plan
+
+    # crud
+    e = db_SQLiteTest(name="test", value=1)
+    assert db.create(e) == e.id
+    assert db.get_one(e.id, db_SQLiteTest).name == "test"
+    e.value = 2
+    assert db.update(e) == e.id
+    assert db.get_one(e.id, db_SQLiteTest).value == 2
+    assert db.delete(e) == e.id
+    assert db.get_one(e.id, db_SQLiteTest) is None
+
+    # row decoder, fetch_dict equals validated models
+    e = db_SQLiteTest(name="decoder", value=3)
+    db.create(e)
+    models = list(db.find({}, db_SQLiteTest).filter(["name", "==", "decoder"]).fetch())
+    dicts = list(db.find({}, db_SQLiteTest).filter(["name", "==", "decoder"]).fetch_dict())
+    assert len(models) == 1 and [m.dict(exclude={"joined_collections"}) for m in models] == dicts
+    assert dicts[0]["enabled"] is True and dicts[0]["created"]["timestamp"] == e.created.timestamp
+    db.delete(e)
+
+    # bulk operations
+    records = [db_SQLiteTest(name="bulk", value=i) for i in range(1200)]
+    assert db.create_many(records) == [r.id for r in records]
+    assert len(db.find({}, db_SQLiteTest).filter(["name", "==", "bulk"])) == 1200
+
+    # streamed fetch, generator over batches
+    stream = db.find({}, db_SQLiteTest).filter(["name", "==", "bulk"]).fetch_dict()
+    assert isinstance(stream, types.GeneratorType)
+    assert sum(1 for _ in stream) == 1200
+    assert db.find({}, db_SQLiteTest).filter(["name", "==", "bulk"]).fetch_one().name == "bulk"
+
+    # keyset pagination, ties of sort key resolved by id
+    for sort_key, sort_order in [(None, None), ("value", DbOrder.DESC), ("name", DbOrder.ASC)]:
+        seen: List[Any] = []
+        pages: List[List[Any]] = []
+        params = DbParams(sort_key=sort_key, sort_order=sort_order, limit_from=0, limit_to=100, filters=[["name", "==", "bulk"]])
+        while True:
+            page = list(params.apply(db.find({}, db_SQLiteTest)).fetch_dict())
+            if not page: break
+            pages.append([p["id"] for p in page])
+            seen += pages[-1]
+            cursors = params.cursors(page)
+            if "next" not in cursors: break
+            params = params.copy(update=dict(after=cursors["next"]))
+        assert len(seen) == 1200 and len(set(seen)) == 1200, sort_key
+        before = DbCursor.from_record(*params.sorting, db.get_one(pages[-1][0], db_SQLiteTest)).encode()
+        params = params.copy(update=dict(after=None, before=before))
+        assert [p.id for p in params.apply(db.find({}, db_SQLiteTest)).fetch()] == pages[-2]
+
+    # page with total count, single query
+    items, total = db.find({}, db_SQLiteTest).filter(["name", "==", "bulk"]).limit(100, 150).find_with_total(as_dict=True)
+    assert len(items) == 50 and total == 1200 and "uni_total" not in items[0]
+    items, total = db.find({}, db_SQLiteTest).filter(["name", "==", "bulk"]).limit(5000, 5010).find_with_total()
+    assert items == [] and total == 1200
+
+    # records serialized directly to json, same as fetch_dict
+    r = db.find({}, db_SQLiteTest).filter(["name", "==", "bulk"]).limit(0, 100)
+    assert orjson.loads(r.fetch_json_bytes()) == orjson.loads(orjson.dumps(list(db.find({}, db_SQLiteTest).filter(["name", "==", "bulk"]).limit(0, 100).fetch_dict())))
+    assert r.edges[0] == 100 and len(r.edges[1]) == 2
+    assert db.find({}, db_SQLiteTest).filter(["name", "==", "none"]).fetch_json_bytes() == b"[]"
+    # streamed chunk by chunk, edges follow the stream
+    r = db.find({}, db_SQLiteTest).filter(["name", "==", "bulk"])
+    stream = iter(r.fetch_json_stream())
+    head = next(stream)
+    assert head.startswith(b"[{") and r.edges[0] == 1
+    assert len(orjson.loads(head + b"".join(stream))) == 1200 and r.edges[0] == 1200
+
+    # projection, only selected columns are fetched for dicts, models are complete
+    r = db.find({}, db_SQLiteTest).filter(["name", "==", "bulk"]).project(["value"])
+    assert "SELECT db_SQLiteTest.id, db_SQLiteTest.value FROM" in r.builder.query(r.q_table, [], columns=r._columns(True))[0]
+    assert set(r.fetch_one_dict().keys()) == {"id", "value"}
+    assert r.fetch_one().name == "bulk"
+    # sort key (created.timestamp) is kept for cursors
+    d = DbParams(fields=["-name", "-created", "-updated"], limit_from=0, limit_to=1).apply(db.find({}, db_SQLiteTest)).fetch_one_dict()
+    assert "name" not in d and "updated" not in d and d["created"]["timestamp"] and "value" in d
+    items, total = db.find({}, db_SQLiteTest).filter(["name", "==", "bulk"]).project(["name"]).limit(0, 10).find_with_total(as_dict=True)
+    assert total == 1200 and set(items[0].keys()) == {"id", "name"}
+    # row decoders of projections are bounded
+    assert _columns_decoder.cache_info().currsize <= SQLITE_DECODER_CACHE_SIZE and _columns_decoder.cache_info().hits
+
+    for r in records: r.value += 1
+    missing = db_SQLiteTest(name="missing")
+    assert db.update_many(records + [missing]) == [r.id for r in records]
+    assert db.get_one(records[-1].id, db_SQLiteTest).value == 1200
+    assert db.delete_many(records + [missing]) == [r.id for r in records]
+    assert len(db.find({}, db_SQLiteTest).filter(["name", "==", "bulk"])) == 0
+
+    # joins, scalar and list fields
+    p1, p2 = db_SQLiteTest(name="p1"), db_SQLiteTest(name="p2")
+    child = db_SQLiteTestChild(parent_id=p1.id, tags=[p1.id, p2.id])
+    orphan = db_SQLiteTestChild()
+    db.create_many([p1, p2])
+    db.create_many([child, orphan])
+    r = db.find({}, db_SQLiteTestChild).join("db_SQLiteTest", "parent_id", "parent").join("db_SQLiteTest", "tags", "tag_list")
+    assert "LIKE" not in r.builder.query(r.q_table, [], join=r._joined)[0]
+    joined = {e.id: e.joined_collections for e in r.fetch()}
+    assert len(joined) == 2
+    assert [p["name"] for p in joined[child.id]["parent"]] == ["p1"]
+    assert sorted(p["name"] for p in joined[child.id]["tag_list"]) == ["p1", "p2"]
+    assert joined[orphan.id]["parent"] == [] and joined[orphan.id]["tag_list"] == []
+    r = db.find({}, db_SQLiteTestChild).join("db_SQLiteTest", "parent_id", "parent").filter(["parent.name", "==", "p1"])
+    assert len(r) == 1 and r.fetch_one().id == child.id
+
+    # joined rows merged across fetch batches
+    children = [db_SQLiteTestChild(tags=[p1.id, p2.id]) for _ in range(600)]
+    db.create_many(children)
+    r = db.find({}, db_SQLiteTestChild).join("db_SQLiteTest", "tags", "tag_list").join("db_SQLiteTest", "tags", "tag_list2")
+    fetched = list(r.fetch_dict())
+    assert len(fetched) == 602 and len({f["id"] for f in fetched}) == 602
+    assert all(len(f["joined_collections"]["tag_list"]) == 2 for f in fetched if f["id"] not in (child.id, orphan.id))
+    db.delete_many(children)
+    db.delete_many([p1, p2, child, orphan])
+
+    # full-text search, index kept in sync by triggers
+    t1 = db_SQLiteTestText(title="Crème brûlée", body="dessert recipe")
+    t2 = db_SQLiteTestText(title="Pasta", body="dinner recipe")
+    db.create_many([t1, t2])
+    search = lambda k, v: sorted(e.id for e in db.find({}, db_SQLiteTestText).filter([k, "search", v]).fetch())
+    assert search("title", "creme") == [t1.id]
+    assert search("body", "recip") == sorted([t1.id, t2.id])
+    assert search("body", "pasta") == [] and search("title", "") == sorted([t1.id, t2.id])
+    r = db.find({}, db_SQLiteTestText).filter(["title", "search", "pasta"])
+    sql, values = r.builder.query(r.q_table, list(r.q_values), r._where())
+    plan = str([tuple(p) for p in db._sql(f"EXPLAIN QUERY PLAN {sql}", values).fetchall()])
+    assert "VIRTUAL TABLE INDEX" in plan, plan
+    t2.title = "Risotto"
+    db.update(t2)
+    assert search("title", "pasta") == [] and search("title", "risotto") == [t2.id]
+    db.delete(t1)
+    assert search("body", "dessert") == []
+    # not indexed field, substring match
+    assert search("id", str(t2.id)[:8]) == [t2.id]
+    db.delete(t2)
+
+    # permission filter, perm_bits maintained on write, one indexed condition
+    owner, other = uuid.uuid4(), uuid.uuid4()
+    private = db_SQLiteTest(name="perm", permissions=Permissions.new("000"))
+    private.created.user_id = owner
+    public = db_SQLiteTest(name="perm", permissions=Permissions.new("040"))
+    db.create_many([private, public])
+    assert db.get_one(public.id, db_SQLiteTest).perm_bits == 4
+    visible = lambda user_id: sorted(e.id for e in db.find({}, db_SQLiteTest).filter(["name", "==", "perm"]).filter(permission_db_filter(types.SimpleNamespace(id=user_id))).fetch())
+    assert visible(owner) == sorted([private.id, public.id]) and visible(other) == [public.id]
+    public.permissions = Permissions.new("000")
+    db.update(public)
+    assert visible(other) == []
+    r = db.find({}, db_SQLiteTest).filter(permission_db_filter(types.SimpleNamespace(id=other)))
+    sql, values = r.builder.query(r.q_table, list(r.q_values), r._where())
+    plan = str([tuple(p) for p in db._sql(f"EXPLAIN QUERY PLAN {sql}", values).fetchall()])
+    assert "perm_bits" in plan and "created__user_id" in plan, plan
+    assert len(perm_bits_values(perm_bits_mask())) == 56
+    db.delete_many([private, public])
+
+    # new columns added to existing table, perm_bits computed from permissions
+    db._sql("DROP TABLE IF EXISTS db_SQLiteTestLegacy;")
+    db._sql("CREATE TABLE db_SQLiteTestLegacy (seq INTEGER PRIMARY KEY, id GUID NOT NULL UNIQUE, name TEXT, permissions__group__read BOOL, permissions__all__read BOOL);")
+    legacy = db_SQLiteTestLegacy(name="legacy", permissions=Permissions.new("640"))
+    db._sql("INSERT INTO db_SQLiteTestLegacy (id, name, permissions__group__read, permissions__all__read) VALUES (?, ?, 1, 1);", [legacy.id, legacy.name])
+    register_db_model(db_SQLiteTestLegacy)
+    assert db._sql("SELECT perm_bits FROM db_SQLiteTestLegacy;").fetchone()[0] == 5
+    db._sql("DROP TABLE db_SQLiteTestLegacy;")
+
+    # async API, database executor, async iteration
+    async def async_api():
+        records = [db_SQLiteTest(name="async", value=i) for i in range(20)]
+        assert await asyncio.gather(*[db.acreate(r) for r in records]) == [r.id for r in records]
+        assert (await db.aget_one(records[0].id, db_SQLiteTest)).name == "async"
+        r = db.afind({}, db_SQLiteTest).filter(["name", "==", "async"])
+        assert await r.alen() == 20
+        assert sorted([e.id async for e in r]) == sorted(r.id for r in records)
+        # batches pulled from executor, early stop closes cursor
+        many = [db_SQLiteTest(name="async_many", value=i) for i in range(DB_ASYNC_FETCH_BATCH + 5)]
+        db.create_many(many)
+        assert len([e async for e in db.afind({}, db_SQLiteTest).filter(["name", "==", "async_many"])]) == len(many)
+        async for e in db.afind({}, db_SQLiteTest).filter(["name", "==", "async_many"]):
+            break
+        db.delete_many(many)
+        items, total = await db.afind({}, db_SQLiteTest).filter(["name", "==", "async"]).limit(0, 5).afind_with_total(as_dict=True)
+        assert len(items) == 5 and total == 20
+        await asyncio.gather(*[db.adelete(r) for r in records])
+        assert await db.afind({}, db_SQLiteTest).filter(["name", "==", "async"]).afetch_one() is None
+    asyncio.run(async_api())
+
+    # transaction commit
+    a, b = db_SQLiteTest(name="a"), db_SQLiteTest(name="b")
+    with db.transaction():
+        db.create(a)
+        with db.transaction():
+            db.create(b)
+        assert db.in_transaction
+    assert not db.in_transaction
+    assert db.get_one(a.id, db_SQLiteTest) and db.get_one(b.id, db_SQLiteTest)
+
+    # transaction rollback
+    c = db_SQLiteTest(name="c")
+    try:
+        with db.transaction():
+            db.create(c)
+            db.delete(a)
+            raise RuntimeError("rollback")
+    except RuntimeError:
+        pass
+    assert db.get_one(c.id, db_SQLiteTest) is None
+    assert db.get_one(a.id, db_SQLiteTest)
+    db.delete(a)
+    db.delete(b)
+
+    # get_one cache, copies of cached record, invalidated by update/delete events
+    cached = db_SQLiteTestCached(name="cached")
+    db.create(cached)
+    hits = _record_cache.hits
+    r1 = db.get_one(cached.id, db_SQLiteTestCached)
+    r2 = db.get_one(str(cached.id), db_SQLiteTestCached)
+    assert _record_cache.hits == hits + 1 and r1 == r2 and r1 is not r2
+    r1.name = "modified"
+    assert db.get_one(cached.id, db_SQLiteTestCached).name == "cached"
+    db.update(r1)
+    assert db.get_one(cached.id, db_SQLiteTestCached).name == "modified"
+    try:
+        with db.transaction():
+            r1.name = "rolled back"
+            db.update(r1)
+            assert db.get_one(cached.id, db_SQLiteTestCached).name == "rolled back"
+            raise RuntimeError("rollback")
+    except RuntimeError:
+        pass
+    assert db.get_one(cached.id, db_SQLiteTestCached).name == "modified"
+    db.delete(r1)
+    assert db.get_one(cached.id, db_SQLiteTestCached) is None
+
+    # materialized counters, first count from database, then maintained from events
+    recipient, owner = uuid.uuid4(), uuid.uuid4()
+    counted = [db_SQLiteTestCounted(user_id=recipient, permissions=Permissions.new("000")) for _ in range(3)]
+    counted[0].created.user_id = owner
+    db.create_many(counted)
+    queries = []
+    def count(read: Any, user_id: Optional[uuid.UUID] = None, op: str = "==") -> int:
+        params = DbParams(filters=[["user_id", "==", str(recipient)], ["read", op, read]])
+        def counter() -> int:
+            queries.append(params)
+            r = db.find({}, db_SQLiteTestCounted)
+            if user_id: r = r.filter(permission_db_filter(types.SimpleNamespace(id=user_id)))
+            return len(params.apply(r))
+        return db.count(db_SQLiteTestCounted, params, counter, user_id=user_id)
+    assert count(False) == 3 and count(False, owner) == 1 and len(queries) == 2
+    assert count(False) == 3 and count(False, owner) == 1 and len(queries) == 2
+    db.create(db_SQLiteTestCounted(user_id=recipient, permissions=Permissions.new("040")))
+    assert count(False) == 4 and count(False, owner) == 2
+    counted[0].read = True
+    db.update(counted[0])
+    assert count(False) == 3 and count(False, owner) == 1 and count(True) == 1
+    db.delete(counted[1])
+    assert count(False) == 2
+    try:
+        with db.transaction():
+            db.create(db_SQLiteTestCounted(user_id=recipient))
+            assert count(False) == 3
+            raise RuntimeError("rollback")
+    except RuntimeError:
+        pass
+    assert count(False) == 2 and len(queries) == 4
+    assert count(False, op="!=") == 1 and len(queries) == 5
+    assert _model_counters.hits > 0
+    # counted after write but before its event, count is not stored (event would add record again)
+    late = db_SQLiteTestCounted(user_id=recipient)
+    _model_counters.drop(db_SQLiteTestCounted)
+    with _model_counters.writing(db_SQLiteTestCounted):
+        db._create(late)
+        assert count(False) == 3
+        db._publish_event(late, EventCreated)
+    assert count(False) == 3 and count(False) == 3
+    db.delete(late)
+    assert count(False) == 2
+
+    # aggregation, GROUP BY and facet counts in one query, values keep declared types
+    r = db.find({}, db_SQLiteTestCounted).filter(["user_id", "==", str(recipient)])
+    assert r.aggregate(["read"], {"n": ("count", None)}) == [{"read": False, "n": 2}, {"read": True, "n": 1}]
+    assert r.aggregate(["created.user_id"]) == sorted([{"created.user_id": owner, "count": 1}, {"created.user_id": None, "count": 2}], key=lambda x: str(x["created.user_id"] or ""))
+    assert r.facets(["read", "user_id"]) == {"read": [{"value": False, "count": 2}, {"value": True, "count": 1}], "user_id": [{"value": recipient, "count": 3}]}
+    assert r.facets(["read"], limit=1) == {"read": [{"value": False, "count": 2}]}
+    values = [db_SQLiteTest(name="aggregate_a" if i % 3 else "aggregate_b", value=i) for i in range(12)]
+    db.create_many(values)
+    r = db.find({}, db_SQLiteTest).filter(["name", "in", ["aggregate_a", "aggregate_b"]])
+    metrics = {"total": ("sum", "value"), "avg": ("avg", "value"), "max": ("max", "value"), "n": ("count", "value")}
+    assert r.aggregate(["name"], metrics) == [{"name": "aggregate_a", "total": 48, "avg": 6.0, "max": 11, "n": 8}, {"name": "aggregate_b", "total": 18, "avg": 4.5, "max": 9, "n": 4}]
+    assert r.aggregate(None, {"total": ("sum", "value")}) == [{"total": 66}]
+    assert DbParams(limit_from=1, limit_to=2).apply(r).aggregate(["name"]) == [{"name": "aggregate_b", "count": 4}]
+    assert db.find({}, db_SQLiteTest).filter(["name", "==", "missing"]).aggregate(None, metrics) == [{"total": 0, "avg": None, "max": None, "n": 0}]
+    for bad in (lambda: r.aggregate(["value; DROP TABLE db_SQLiteTest"]), lambda: r.aggregate(None, {"x": ("median", "value")}),
+                lambda: r.aggregate(["created"]), lambda: db.find({}, db_SQLiteTestChild).facets(["tags"]),
+                lambda: db.find({}, db_SQLiteTestChild).join("db_SQLiteTest", "parent_id", "parent").aggregate()):
+        try:
+            bad()
+            raise AssertionError("ServerError not raised")
+        except ServerError:
+            pass
+    assert asyncio.run(db.afind({}, db_SQLiteTest).filter(["name", "==", "aggregate_b"]).aaggregate()) == [{"count": 4}]
+    db.delete_many(values)
+
+    # estimated count, table size from seq range, filtered share from sample spread over seq range
+    huge = [db_SQLiteTest(name="estimate_a" if i % 2 else "estimate_b", value=i) for i in range(DB_COUNT_SAMPLE + 2000)]
+    db.create_many(huge)
+    count, is_estimate = db.find({}, db_SQLiteTest).estimated_len()
+    assert is_estimate and count >= len(huge)
+    r = db.find({}, db_SQLiteTest).filter(["name", "==", "estimate_a"])
+    count, is_estimate = r.estimated_len()
+    assert is_estimate and abs(count - len(huge) / 2) < len(huge) * 0.1, count
+    # filter correlated with insert order (older half)
+    count, is_estimate = db.find({}, db_SQLiteTest).filter(["name", "in", ["estimate_a", "estimate_b"]]).filter(["value", "<", len(huge) // 2]).estimated_len()
+    assert is_estimate and abs(count - len(huge) / 2) < len(huge) * 0.1, count
+    assert db.find({}, db_SQLiteTest).filter(["value", "==", 7]).filter(["name", "==", "estimate_a"]).estimated_len() == (1, False)
+    params = DbParams(filters=[["name", "==", "estimate_a"]], limit_from=0, limit_to=5, count_mode="estimated")
+    items, total, is_estimate = params.apply(db.find({}, db_SQLiteTest)).find_page(count_mode=params.count_mode)
+    assert len(items) == 5 and is_estimate and total > 5
+    assert DbParams(filters=[["name", "==", "estimate_a"]], limit_from=0, limit_to=5).apply(db.find({}, db_SQLiteTest)).find_page(count_mode=DbCountMode.EXACT)[1:] == (len(huge) // 2, False)
+    db.delete_many(huge)
+
+    # online export (no maintenance), import replaces or merges records
+    kept = db_SQLiteTest(name="kept")
+    db.create(kept)
+    export_file = db.export_database()
+    assert os.path.exists(export_file) and not _get_maintenance()
+    added = db_SQLiteTest(name="added")
+    db.create(added)
+    db.delete(kept)
+
+    db.import_database(export_file, drop=False)
+    assert db.get_one(kept.id, db_SQLiteTest) and db.get_one(added.id, db_SQLiteTest)
+    db.import_database(export_file, drop=True)
+    assert db.get_one(kept.id, db_SQLiteTest) and db.get_one(added.id, db_SQLiteTest) is None
+    assert db._sql("PRAGMA journal_mode;").fetchone()[0] == "wal"
+    db.delete(kept)
+    os.remove(export_file)
+
+    # merge import, record with seq reused by other record is not lost
+    seq = "SELECT seq FROM db_SQLiteTest WHERE id = ?;"
+    kept = db_SQLiteTest(name="kept")
+    db.create(kept)
+    kept_seq = db._sql(seq, [kept.id]).fetchone()[0]
+    export_file = db.export_database()
+    db.delete(kept)
+    added = db_SQLiteTest(name="added")
+    db.create(added)
+    assert db._sql(seq, [added.id]).fetchone()[0] == kept_seq
+    db.import_database(export_file, drop=False)
+    assert db.get_one(kept.id, db_SQLiteTest) and db.get_one(added.id, db_SQLiteTest)
+    db.delete_many([kept, added])
+    os.remove(export_file)
+
+    # import of older export, missing indexes are created without restart
+    indexes = "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='db_SQLiteTest' AND name LIKE 'uni_%';"
+    names = sorted(r[0] for r in db._sql(indexes).fetchall())
+    db._sql(f'DROP INDEX "{names[0]}";')
+    export_file = db.export_database()
+    db.import_database(export_file, drop=True)
+    assert sorted(r[0] for r in db._sql(indexes).fetchall()) == names
+    os.remove(export_file)
+
+    logger.info("uni.database.sqlite_test tests passed")
@@ -16,8 +16,8 @@ from ..events import base
 logger = core_logger().getChild("events")
 
 
-def register_event_subscriber(event_type: Type[base.Event], callback: Callable, sync: bool =True) -> None:
-    """Register callback to subscribers."""
+def register_event_subscriber(event_type: Type[base.Event], callback: Callable, sync: bool =True, transactional: bool = False) -> None:
+    """Register callback to subscribers, transactional callback is called inside transaction of crud write."""
 
     # event not exist in subscribers register
     if not event_type.__name__ in base._subscribers:
@@ -26,6 +26,7 @@ def register_event_subscriber(event_type: Type[base.Event], callback: Callable,
     # register subscriber callback
     logger.info(color_blue(f"Subscribe: Event: {event_type.__name__}, Callback: {callback}"))
     base._subscribers[event_type.__name__].append(callback)
+    if transactional: base._transactional.add(callback)
 
 def remove_event_subscriber(event_type: Type[base.Event], callback: Callable) -> None:
     """Remove callback from subscribers."""
@@ -41,5 +42,6 @@ def remove_event_subscriber(event_type: Type[base.Event], callback: Callable) ->
     # remove
     logger.info(color_blue(f"Unsubscribe: {event_type.__name__}, Callback: {callback}"))
     base._subscribers[event_type.__name__].remove(callback)
+    if not any(callback in s for s in base._subscribers.values()): base._transactional.discard(callback)
 
 if __name__ == "__main__": exit()
\ No newline at end of file
@@ -7,7 +7,7 @@ base events
 """
 
 from __future__ import annotations
-from typing import Any, List, Optional
+from typing import Any, List, Optional, Set
 import uuid
 from typing import Any, Callable, Dict
 
@@ -21,6 +21,8 @@ logger = core_logger().getChild("events")
 
 # subscribers register
 _subscribers: Dict[str, List[Callable[[Any], None]]] = dict()
+# subscribers whose writes have to be in transaction of published write (e.g. eventsourcing record)
+_transactional: Set[Callable[[Any], None]] = set()
 
 class Event():
     """ Base Event class """
@@ -36,13 +38,14 @@ class Event():
         if not event_id: self._id = id_factory()
         else: self._id = event_id
 
-    def publish(self) -> None:
-        """Publish event."""
+    def publish(self, transactional: Optional[bool] = None) -> None:
+        """Publish event, to transactional or other subscribers only (None = all subscribers)."""
         # nothing to do
         if not self.__class__.__name__ in _subscribers:
             return None
 
         for s in _subscribers[self.__class__.__name__]:
+            if transactional is not None and (s in _transactional) != transactional: continue
             try:
                 # call subscriber
                 s(self)
@@ -82,6 +85,8 @@ class EventCreated(Event):
 
 class EventUpdated(Event):
     """Event on update."""
+    # stored record before update, set for models with materialized counters
+    previous: Any = None
 
 class EventDeleted(Event):
     """Event on delete."""
@@ -15,9 +15,10 @@ from ..events import crud
 def init():
     """ init, called once from uni application at app init """
     # NOTE: not sure if we should not use EventPre... or direct db events
-    register_event_subscriber(crud.EventPostCreate, es_event_subscriber)
-    register_event_subscriber(crud.EventPostUpdate, es_event_subscriber)
-    register_event_subscriber(crud.EventPostDelete, es_event_subscriber)
+    # record is written in transaction of entity write
+    register_event_subscriber(crud.EventPostCreate, es_event_subscriber, transactional=True)
+    register_event_subscriber(crud.EventPostUpdate, es_event_subscriber, transactional=True)
+    register_event_subscriber(crud.EventPostDelete, es_event_subscriber, transactional=True)
 
 
 if __name__ == "__main__": exit
\ No newline at end of file
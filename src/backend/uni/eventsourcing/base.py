@@ -39,7 +39,8 @@ def es_event_subscriber(event: Event) -> None:
     es_model = _registered[model]
     
     logger.debug(color_blue(f"event source event: {event}, model: {model}"))
-    with UniLock(f"es_lock_entity_{event.data.id}"):
+    # transaction first, joins the caller transaction and keeps lock order (database -> entity lock)
+    with db.transaction(), UniLock(f"es_lock_entity_{event.data.id}"):
         version = len(db.find({}, es_model).filter(["entity_id", "==", event.data.id])) + 1
 
         entity = es_model(
@@ -33,7 +33,7 @@ def es_get_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[[A
                     ["entity_id", "==", entity_id]
                 ]
             )
-            return self.apply_db_params(entities, params).fetch()
+            return list(self.apply_db_params(entities, params).fetch())
 
     def get_entities(entity_id: uuid.UUID) -> List[es_Model]:  # type: ignore
         handler = Handler.new()
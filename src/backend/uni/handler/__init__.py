@@ -6,12 +6,12 @@ uni.handler
 application base handler
 """
 from __future__ import annotations
-from typing import Any, Optional
+from typing import Any, List, Optional
 from fastapi import Depends, File, Path, Query, Header
 
 from .base import PublicHandler, PrivateHandler
 from ..services.auth import AuthToken, verify_token
-from ..database import DbOrder, DbParams
+from ..database import DbCountMode, DbOrder, DbParams
 
 __all__ = [
 
@@ -42,7 +42,11 @@ def db_params_get(
         sort_order: Optional[DbOrder] = None,
         limit_from: Optional[int] = 0,
         limit_to: Optional[int] = 100,
-        filters: Optional[Any] = None
+        filters: Optional[Any] = None,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        fields: Optional[List[str]] = Query(default=None),
+        count_mode: DbCountMode = DbCountMode.EXACT
     ) -> DbParams:
     """ database params dependency """
     return DbParams(
@@ -50,5 +54,9 @@ def db_params_get(
         sort_order=sort_order,
         limit_from=limit_from,
         limit_to=limit_to,
-        filters=filters
+        filters=filters,
+        after=after,
+        before=before,
+        fields=fields,
+        count_mode=count_mode
     )
\ No newline at end of file
@@ -7,14 +7,15 @@ application base handler
 """
 
 from __future__ import annotations
-from typing import Any, Iterable, Mapping, Optional, Tuple
-from fastapi import Request, params
+import itertools
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from fastapi import Request, Response, params
 from fastapi.responses import RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 from ..with_request import UniWithRequest
 from ..services import permission
-from ..database import Database, DbParams, DbResult, database_factory
+from ..database import Database, DbAggregateParams, DbCountMode, DbParams, DbResult, database_factory
 from ..default import UniDefault
 from ..exceptions import BaseHTTPException, ForbiddenError, NotFoundError, UnauthorizedError
 from ..logger import core_logger
@@ -28,6 +29,9 @@ from .model import StreamChunk, StreamError
 
 logger = core_logger().getChild("handler")
 
+# response header of count handlers, count is estimated (count_mode estimated)
+COUNT_ESTIMATE_HEADER = "uni-count-estimate"
+
 
 class Handler(UniWithRequest):
     """ Base Handler class"""
@@ -44,6 +48,48 @@ class Handler(UniWithRequest):
 
     def apply_db_params(self, result: DbResult, params: DbParams) -> DbResult:
         return params.apply(result)
+
+    def cursor_headers(self, response: Optional[Response], params: DbParams, items: List[Any], count: Optional[int] = None) -> List[Any]:
+        """ sets keyset pagination cursors of items to response headers: uni-cursor-next, uni-cursor-prev """
+        if response is not None:
+            for name, cursor in params.cursors(items, count).items():
+                response.headers[f"uni-cursor-{name}"] = cursor
+        return items
+
+    def count_estimate(self, params: DbParams, model: Any, entities: DbResult, user_id: Any = None) -> Tuple[int, bool]:
+        """ count of records matching params and estimate flag, materialized counter of user scope (Database.count) or estimate (count_mode) """
+        if params.count_mode == DbCountMode.ESTIMATED:
+            return self.apply_db_params(entities, params).estimated_len()
+        return self.database.count(model, params, lambda: len(self.apply_db_params(entities, params)), user_id=user_id), False
+
+    def count_result(self, response: Optional[Response], params: DbParams, model: Any, entities: DbResult, user_id: Any = None) -> int:
+        """ count of records matching params, estimate flag is set to uni-count-estimate response header (count_mode estimated) """
+        count, is_estimate = self.count_estimate(params, model, entities, user_id)
+        if response is not None and params.count_mode == DbCountMode.ESTIMATED:
+            response.headers[COUNT_ESTIMATE_HEADER] = "true" if is_estimate else "false"
+        return count
+
+    def aggregate_result(self, params: DbAggregateParams, entities: DbResult) -> Dict[str, Any]:
+        """ grouped metrics (rows) and facet counts (facets) of result with applied params, one query each """
+        rows = entities.aggregate(params.group_by, params.metrics) if params.group_by or params.metrics or not params.facets else []
+        facets = entities.facets(params.facets, params.facet_limit) if params.facets else dict()
+        return dict(rows=rows, facets=facets)
+
+    def json_response(self, response: Optional[Response], params: DbParams, result: DbResult) -> Response:
+        """ records serialized directly to json bytes (DbResult.fetch_json_stream), cursors in response headers,
+            unlimited result is streamed, headers are sent before body, page (next cursor of last record) is not """
+        if params.before is not None or (params.limit_from is not None and params.limit_to):
+            content = result.fetch_json_bytes()
+            count, edges = result.edges
+            self.cursor_headers(response, params, edges, count)
+            return Response(content=content, media_type="application/json")
+
+        # first record is read before response is started (prev cursor of keyset after)
+        stream = iter(result.fetch_json_stream())
+        head = next(stream)
+        count, edges = result.edges
+        self.cursor_headers(response, params, edges, count)
+        return StreamingResponse(itertools.chain([head], stream), media_type="application/json")
     
     def stream_response(self, stream: Iterable[Any], status_code: int = 200, headers: Optional[Mapping[str, str]] = None, media_type: Optional[str] = None) -> StreamingResponse:
         """
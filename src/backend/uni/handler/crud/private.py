@@ -8,12 +8,13 @@ application crud private handler
 
 # from __future__ import annotations  # can not be used here, (pydantic throws error)
 
-from typing import Any, Callable, List, NewType, Optional, Type
+from typing import Any, Awaitable, Callable, Dict, List, NewType, Optional, Type
 import uuid
-from fastapi import Body, Depends
+from fastapi import Body, Depends, Response
 import threading
 
-from ...database.base import Database, DbParams, T_DatabaseModel
+from ...database import database_factory
+from ...database.base import DbAggregateParams, DbCountMode, Database, DbParams, DbResult, T_DatabaseModel
 from ...database.model import DB_UPDATE_EXCLUDE
 from ...exceptions import ForbiddenError, NotFoundError, ServerError
 from ...logger import color_red, core_logger
@@ -23,7 +24,7 @@ from ...services import permission
 from ...events.crud import EventCount, EventFind, EventPostGetOne, EventPreGetOne, EventPostCreate, EventPostDelete, EventPostUpdate, EventPreCreate, EventPreDelete, EventPreUpdate
 
 from .. import db_params
-from ..base import PrivateHandler
+from ..base import COUNT_ESTIMATE_HEADER, PrivateHandler
 from .. import messages
 
 
@@ -66,12 +67,19 @@ def create_handler_factory(
             if default_permissions:
                 _entity.permissions = default_permissions
 
-            EventPreCreate(_entity, user_id=self.user.id).publish()
-            r = self.database.create(_entity)
-            if not r:
-                logger.error(color_red(messages.MSG_CREATE_ERROR))
-                raise ServerError(messages.MSG_CREATE_ERROR)
-            EventPostCreate(_entity, user_id=self.user.id).publish()
+            # single commit for entity and writes of transactional subscribers,
+            # other subscribers run outside of transaction (writers of other threads do not wait for them)
+            pre = EventPreCreate(_entity, user_id=self.user.id)
+            pre.publish(transactional=False)
+            post = EventPostCreate(_entity, user_id=self.user.id)
+            with self.database.transaction():
+                pre.publish(transactional=True)
+                r = self.database.create(_entity)
+                if not r:
+                    logger.error(color_red(messages.MSG_CREATE_ERROR))
+                    raise ServerError(messages.MSG_CREATE_ERROR)
+                post.publish(transactional=True)
+            post.publish(transactional=False)
 
             # return entity
             return self.database.get_one(r, _model)
@@ -82,37 +90,27 @@ def create_handler_factory(
 
     return create_entity
 
-def update_handler_factory(
-        model: Type[T_DatabaseModel], 
-        database_model: Optional[Type[T_DatabaseModel]] = None, 
+def _update_handler_class(
+        database_model: Type[T_DatabaseModel],
         root_only: bool = False
-    ) -> Callable[[Any], T_DatabaseModel]:
-    """ handler factory: private - update """
-    # type for fastapi
-    ModelType = NewType('Model', model)  # type: ignore
-
+    ) -> Type[PrivateHandler]:
+    """ update handler class, shared by update and update many factories """
     class Handler(PrivateHandler):
         """ update entity handler class"""
-        def request(self, entity: T_DatabaseModel) -> T_DatabaseModel:
-            """ request handler"""
+        def prepare(self, entity: T_DatabaseModel) -> T_DatabaseModel:
+            """ checks permissions, returns stored entity with updated data """
             # root check
             if root_only: self.root_check()
 
-            # db model select
-            if database_model:
-                _model = database_model
-            else:
-                _model = model
-
             # find entity
-            stored_entity = self.database.get_one(entity.id, _model)
+            stored_entity = self.database.get_one(entity.id, database_model)
             if not stored_entity:
                 msg = f"{messages.MSG_NOT_FOUND}, id: {entity.id}"
                 logger.error(color_red(msg))
                 raise NotFoundError(msg)
 
             # model permissions
-            group_name = _model.__name__
+            group_name = database_model.__name__
             if not permission.group_permission(group_name, self.user, True):
                 raise ForbiddenError(messages.MSG_PERM_DENIED)
 
@@ -127,16 +125,58 @@ def update_handler_factory(
             _entity.updated.timestamp = timestamp_factory()
             _entity.updated.user_id = self.user.id
 
-            EventPreUpdate(_entity, user_id=self.user.id).publish()
-            r = self.database.update(_entity)
-            if not r:
-                logger.error(color_red(messages.MSG_UPDATE_ERROR))
-                raise ServerError(messages.MSG_UPDATE_ERROR)
-            EventPostUpdate(_entity, user_id=self.user.id).publish()
+            return _entity
+
+        def request(self, entity: T_DatabaseModel) -> T_DatabaseModel:
+            """ request handler"""
+            _entity = self.prepare(entity)
+
+            pre = EventPreUpdate(_entity, user_id=self.user.id)
+            pre.publish(transactional=False)
+            post = EventPostUpdate(_entity, user_id=self.user.id)
+            with self.database.transaction():
+                pre.publish(transactional=True)
+                r = self.database.update(_entity)
+                if not r:
+                    logger.error(color_red(messages.MSG_UPDATE_ERROR))
+                    raise ServerError(messages.MSG_UPDATE_ERROR)
+                post.publish(transactional=True)
+            post.publish(transactional=False)
 
             # return entity
             return _entity
 
+        def request_many(self, entity_list: List[T_DatabaseModel]) -> List[T_DatabaseModel]:
+            """ request handler, all entities in one bulk update """
+            entities = [self.prepare(e) for e in entity_list]
+            if not entities: return []
+
+            pres = [EventPreUpdate(e, user_id=self.user.id) for e in entities]
+            posts = [EventPostUpdate(e, user_id=self.user.id) for e in entities]
+            for pre in pres: pre.publish(transactional=False)
+            with self.database.transaction():
+                for pre in pres: pre.publish(transactional=True)
+                r = self.database.update_many(entities)
+                if len(r) != len(entities):
+                    logger.error(color_red(messages.MSG_UPDATE_ERROR))
+                    raise ServerError(messages.MSG_UPDATE_ERROR)
+                for post in posts: post.publish(transactional=True)
+            for post in posts: post.publish(transactional=False)
+
+            return entities
+
+    return Handler
+
+def update_handler_factory(
+        model: Type[T_DatabaseModel], 
+        database_model: Optional[Type[T_DatabaseModel]] = None, 
+        root_only: bool = False
+    ) -> Callable[[Any], T_DatabaseModel]:
+    """ handler factory: private - update """
+    # type for fastapi
+    ModelType = NewType('Model', model)  # type: ignore
+    Handler = _update_handler_class(database_model or model, root_only)
+
     def update_entity(entity: ModelType = Body(), auth=Depends(verify_token)):  # type: ignore
         handler = Handler.new(auth)
         return handler.request(entity=entity)
@@ -151,15 +191,11 @@ def update_many_handler_factory(
     """ handler factory: private - update many """
     # type for fastapi
     ModelType = NewType('Model', model)  # type: ignore
+    Handler = _update_handler_class(database_model or model, root_only)
 
     def update_many(entity_list: List[ModelType], auth=Depends(verify_token)) -> List[T_DatabaseModel]:  # type: ignore
-        update_handler = update_handler_factory(model, database_model, root_only)
-        r = []
-        
-        for e in entity_list:
-            r.append(update_handler(e, auth=auth))
-            
-        return r
+        handler = Handler.new(auth)
+        return handler.request_many(entity_list)
 
     return update_many
 
@@ -192,9 +228,14 @@ def delete_handler_factory(
                 raise ForbiddenError(messages.MSG_PERM_DENIED)
 
             # delete entity
-            EventPreDelete(stored_entity, user_id=self.user.id).publish()
-            r = self.database.delete(stored_entity)
-            EventPostDelete(stored_entity, user_id=self.user.id).publish()
+            pre = EventPreDelete(stored_entity, user_id=self.user.id)
+            pre.publish(transactional=False)
+            post = EventPostDelete(stored_entity, user_id=self.user.id)
+            with self.database.transaction():
+                pre.publish(transactional=True)
+                r = self.database.delete(stored_entity)
+                post.publish(transactional=True)
+            post.publish(transactional=False)
 
             # server error
             if not r:
@@ -210,11 +251,11 @@ def delete_handler_factory(
 
     return delete_entity
 
-def get_handler_factory(
-        database_model: Type[T_DatabaseModel], 
+def _get_handler_class(
+        database_model: Type[T_DatabaseModel],
         root_only: bool = False
-    ) -> Callable[[Any], T_DatabaseModel]:
-    """ handler factory: private - get """
+    ) -> Type[PrivateHandler]:
+    """ get handler class, shared by sync and async get handlers """
     class Handler(PrivateHandler):
         def request(self, entity_id: uuid.UUID) -> T_DatabaseModel:
             """ request handler"""
@@ -250,22 +291,48 @@ def get_handler_factory(
             # return entity
             return stored_entity
 
+        async def arequest(self, entity_id: uuid.UUID) -> T_DatabaseModel:
+            """ async request handler, runs in database executor (event subscribers can block) """
+            return await self.database.arun(self.request, entity_id)
+
+    return Handler
+
+def get_handler_factory(
+        database_model: Type[T_DatabaseModel], 
+        root_only: bool = False
+    ) -> Callable[[Any], T_DatabaseModel]:
+    """ handler factory: private - get """
+    Handler = _get_handler_class(database_model, root_only)
+
     def get_entity(entity_id: uuid.UUID, auth=Depends(verify_token)):  # type: ignore
         handler = Handler.new(auth)
         return handler.request(entity_id=entity_id)
 
     return get_entity
 
-def find_handler_factory(
+def aget_handler_factory(
+        database_model: Type[T_DatabaseModel],
+        root_only: bool = False
+    ) -> Callable[..., Awaitable[T_DatabaseModel]]:
+    """ handler factory: private - get, async """
+    Handler = _get_handler_class(database_model, root_only)
+
+    async def get_entity(entity_id: uuid.UUID, auth=Depends(verify_token)):  # type: ignore
+        handler = await database_factory().arun(Handler.new, auth)
+        return await handler.arequest(entity_id=entity_id)
+
+    return get_entity
+
+def _find_handler_class(
         database_model: Type[T_DatabaseModel],
         root_only: bool = False,
         fetch_dict_disabled: bool = False,
-    ) -> Callable[[Any], List[T_DatabaseModel]]:
-    """ handler factory: private - find """
+    ) -> Type[PrivateHandler]:
+    """ find handler class, shared by find and find page handlers """
     class Handler(PrivateHandler):
         """ find entity handler class"""
-        def request(self, params: DbParams) -> Optional[List[T_DatabaseModel]]:
-            """ request handler"""
+        def prepare(self, params: DbParams, entities: Optional[DbResult] = None) -> DbResult:
+            """ checks permissions, returns result with applied params """
             # root check
             if root_only: self.root_check()
 
@@ -274,24 +341,139 @@ def find_handler_factory(
             if not permission.group_permission(group_name, self.user, False):
                 raise ForbiddenError(messages.MSG_PERM_DENIED)
 
-            entities = self.database.find({}, database_model)
+            if entities is None: entities = self.database.find({}, database_model)
             entities = self.permission_filter(entities)
 
             EventFind(params, user_id = self.user.id, model_name=database_model.__name__).publish()
+            return self.apply_db_params(entities, params)
 
-            if params.fetch_dict and not fetch_dict_disabled:
-                # fetching dict for faster respond serialization
-                # needs to be disabled for users!!
-                return list(self.apply_db_params(entities, params).fetch_dict())
-            else:
-                return list(self.apply_db_params(entities, params).fetch())
+        def fetch_dict(self, params: DbParams) -> bool:
+            """ fetching dict for faster respond serialization, needs to be disabled for users!! """
+            return params.fetch_dict and not fetch_dict_disabled
 
-    def find_entities(params: DbParams = Depends(db_params), auth=Depends(verify_token)):  # type: ignore
+        def request(self, params: DbParams, response: Optional[Response] = None) -> Any:
+            """ request handler"""
+            entities = self.prepare(params)
+            if self.fetch_dict(params):
+                return self.json_response(response, params, entities)
+            items = list(entities.fetch())
+            return self.cursor_headers(response, params, items)
+
+        def request_page(self, params: DbParams, response: Optional[Response] = None) -> Dict[str, Any]:
+            """ page request handler, records and total count """
+            items, total, is_estimate = self.prepare(params).find_page(self.fetch_dict(params), params.count_mode)
+            return dict(items=self.cursor_headers(response, params, items), total=total, is_estimate=is_estimate)
+
+        async def aprepare(self, params: DbParams) -> DbResult:
+            """ async prepare, event subscribers run in database executor """
+            return await self.database.arun(self.prepare, params, self.database.afind({}, database_model))
+
+        async def arequest(self, params: DbParams, response: Optional[Response] = None) -> Any:
+            """ async request handler"""
+            entities = await self.aprepare(params)
+            if self.fetch_dict(params):
+                return await self.database.arun(self.json_response, response, params, entities)
+            items = await entities.afetch()
+            return self.cursor_headers(response, params, items)
+
+        async def arequest_page(self, params: DbParams, response: Optional[Response] = None) -> Dict[str, Any]:
+            """ async page request handler, records and total count """
+            items, total, is_estimate = await (await self.aprepare(params)).afind_page(self.fetch_dict(params), params.count_mode)
+            return dict(items=self.cursor_headers(response, params, items), total=total, is_estimate=is_estimate)
+
+        def request_aggregate(self, params: DbAggregateParams) -> Dict[str, Any]:
+            """ aggregate request handler, grouped metrics and facet counts of records matching params """
+            return self.aggregate_result(params, self.prepare(params))
+
+        async def arequest_aggregate(self, params: DbAggregateParams) -> Dict[str, Any]:
+            """ async aggregate request handler """
+            entities = await self.aprepare(params)
+            return await self.database.arun(self.aggregate_result, params, entities)
+
+    return Handler
+
+def find_handler_factory(
+        database_model: Type[T_DatabaseModel],
+        root_only: bool = False,
+        fetch_dict_disabled: bool = False,
+    ) -> Callable[[Any], List[T_DatabaseModel]]:
+    """ handler factory: private - find """
+    Handler = _find_handler_class(database_model, root_only, fetch_dict_disabled)
+
+    def find_entities(response: Response, params: DbParams = Depends(db_params), auth=Depends(verify_token)):  # type: ignore
         handler = Handler.new(auth)
-        return handler.request(params)
+        return handler.request(params, response)
 
     return find_entities
 
+def find_page_handler_factory(
+        database_model: Type[T_DatabaseModel],
+        root_only: bool = False,
+        fetch_dict_disabled: bool = False,
+    ) -> Callable[[Any], Dict[str, Any]]:
+    """ handler factory: private - find page (records + total count) """
+    Handler = _find_handler_class(database_model, root_only, fetch_dict_disabled)
+
+    def find_entities_page(response: Response, params: DbParams = Depends(db_params), auth=Depends(verify_token)):  # type: ignore
+        handler = Handler.new(auth)
+        return handler.request_page(params, response)
+
+    return find_entities_page
+
+def afind_handler_factory(
+        database_model: Type[T_DatabaseModel],
+        root_only: bool = False,
+        fetch_dict_disabled: bool = False,
+    ) -> Callable[..., Awaitable[List[T_DatabaseModel]]]:
+    """ handler factory: private - find, async """
+    Handler = _find_handler_class(database_model, root_only, fetch_dict_disabled)
+
+    async def find_entities(response: Response, params: DbParams = Depends(db_params), auth=Depends(verify_token)):  # type: ignore
+        handler = await database_factory().arun(Handler.new, auth)
+        return await handler.arequest(params, response)
+
+    return find_entities
+
+def afind_page_handler_factory(
+        database_model: Type[T_DatabaseModel],
+        root_only: bool = False,
+        fetch_dict_disabled: bool = False,
+    ) -> Callable[..., Awaitable[Dict[str, Any]]]:
+    """ handler factory: private - find page (records + total count), async """
+    Handler = _find_handler_class(database_model, root_only, fetch_dict_disabled)
+
+    async def find_entities_page(response: Response, params: DbParams = Depends(db_params), auth=Depends(verify_token)):  # type: ignore
+        handler = await database_factory().arun(Handler.new, auth)
+        return await handler.arequest_page(params, response)
+
+    return find_entities_page
+
+def aggregate_handler_factory(
+        database_model: Type[T_DatabaseModel],
+        root_only: bool = False,
+    ) -> Callable[[Any], Dict[str, Any]]:
+    """ handler factory: private - aggregate (group metrics + facet counts) """
+    Handler = _find_handler_class(database_model, root_only)
+
+    def aggregate_entities(params: DbAggregateParams, auth=Depends(verify_token)):  # type: ignore
+        handler = Handler.new(auth)
+        return handler.request_aggregate(params)
+
+    return aggregate_entities
+
+def aaggregate_handler_factory(
+        database_model: Type[T_DatabaseModel],
+        root_only: bool = False,
+    ) -> Callable[..., Awaitable[Dict[str, Any]]]:
+    """ handler factory: private - aggregate (group metrics + facet counts), async """
+    Handler = _find_handler_class(database_model, root_only)
+
+    async def aggregate_entities(params: DbAggregateParams, auth=Depends(verify_token)):  # type: ignore
+        handler = await database_factory().arun(Handler.new, auth)
+        return await handler.arequest_aggregate(params)
+
+    return aggregate_entities
+
 def count_handler_factory(
         database_model: Type[T_DatabaseModel],
         root_only: bool = False
@@ -299,7 +481,7 @@ def count_handler_factory(
     """ handler factory: private - find """
     class Handler(PrivateHandler):
         """ find entity handler class"""
-        def request(self, params: DbParams) -> int:
+        def request(self, params: DbParams, response: Optional[Response] = None) -> int:
             """ request handler"""
             # root check
             if root_only: self.root_check()
@@ -314,25 +496,24 @@ def count_handler_factory(
 
             EventCount(params, user_id = self.user.id, model_name=database_model.__name__).publish()
 
-            return len(
-                self.apply_db_params(entities, params)
-            )
+            # user scope of materialized counter (root: all records)
+            return self.count_result(response, params, database_model, entities, None if self.user.root else self.user.id)
 
-    def count_entities(params: DbParams = Depends(db_params), auth=Depends(verify_token)):  # type: ignore
+    def count_entities(response: Response, params: DbParams = Depends(db_params), auth=Depends(verify_token)):  # type: ignore
         handler = Handler.new(auth)
-        return handler.request(params)
+        return handler.request(params, response)
 
     return count_entities
 
 def count_multiple_handler_factory(
         database_model: Type[T_DatabaseModel],
         root_only: bool = False
-    ) -> Callable[[Any], List[int]]:
+    ) -> Callable[..., List[int]]:
     """ handler factory: private - count multiple """
     class Handler(PrivateHandler):
         """ count multiple entities handler class"""
-        def request(self, params: List[DbParams]) -> List[int]:
-            """ request handler"""
+        def request(self, params: List[DbParams], response: Optional[Response] = None) -> List[int]:
+            """ request handler, estimate flags of counts are set to uni-count-estimate response header (comma separated, count_mode estimated) """
             # root check
             if root_only: self.root_check()
 
@@ -347,12 +528,14 @@ def count_multiple_handler_factory(
                     EventCount(p, user_id = self.user.id, model_name=database_model.__name__).publish()
                 entities = database.find({}, database_model)
                 entities = self.permission_filter(entities)
-                res_item = len(self.apply_db_params(entities, p))
+                res_item, is_estimate = self.count_estimate(p, database_model, entities, None if self.user.root else self.user.id)
                 with T_LOCK:
                     res[idx] = res_item
+                    estimates[idx] = is_estimate
             
             db = self.database
             r = []
+            estimates = [False] * len(params)
             workers: List[threading.Thread] = []
             idx = 0
             for p in params:
@@ -365,12 +548,14 @@ def count_multiple_handler_factory(
                 idx += 1
           
             for t in workers: t.join()
-                
+
+            if response is not None and any(p.count_mode == DbCountMode.ESTIMATED for p in params):
+                response.headers[COUNT_ESTIMATE_HEADER] = ",".join("true" if e else "false" for e in estimates)
             return r
 
-    def count_multiple_entities(params: List[DbParams], auth=Depends(verify_token)):  # type: ignore
+    def count_multiple_entities(response: Response, params: List[DbParams], auth=Depends(verify_token)):  # type: ignore
         handler = Handler.new(auth)
-        return handler.request(params)
+        return handler.request(params, response)
 
     return count_multiple_entities
 
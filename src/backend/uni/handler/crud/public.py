@@ -8,12 +8,12 @@ application crud public handler
 
 # from __future__ import annotations  # can not be used here, (pydantic throws error)
 
-from typing import Callable, List, NewType, Optional, Type, Any
+from typing import Awaitable, Callable, Dict, List, NewType, Optional, Type, Any
 import uuid
-from fastapi import Body, Depends
+from fastapi import Body, Depends, Response
 
 from ...logger import color_red, core_logger
-from ...database.base import DbParams, T_DatabaseModel
+from ...database.base import DbAggregateParams, DbParams, DbResult, T_DatabaseModel
 from ...database.model import DB_UPDATE_EXCLUDE
 from ...exceptions import NotFoundError, ServerError
 from ...utils import timestamp_factory
@@ -63,26 +63,14 @@ def create_handler_factory(
 
     return create_entity
 
-def update_handler_factory(
-        model: Type[T_DatabaseModel], 
-        database_model: Optional[Type[T_DatabaseModel]] = None
-    ) -> Callable[[Any], T_DatabaseModel]:
-    """ handler factory: public - update """
-    # type for fastapi
-    ModelType = NewType('Model', model)  # type: ignore
-
+def _update_handler_class(database_model: Type[T_DatabaseModel]) -> Type[PublicHandler]:
+    """ update handler class, shared by update and update many factories """
     class Handler(PublicHandler):
         """ update entity handler class"""
-        def request(self, entity: T_DatabaseModel) -> T_DatabaseModel:
-            """ request handler"""
-            # db model select
-            if database_model:
-                _model = database_model
-            else:
-                _model = model
-
+        def prepare(self, entity: T_DatabaseModel) -> T_DatabaseModel:
+            """ returns stored entity with updated data """
             # find entity
-            stored_entity = self.database.get_one(entity.id, _model)
+            stored_entity = self.database.get_one(entity.id, database_model)
             if not stored_entity:
                 msg = f"{messages.MSG_NOT_FOUND}, id: {entity.id}"
                 logger.error(color_red(msg))
@@ -94,6 +82,12 @@ def update_handler_factory(
             _entity = _entity.parse_obj(_entity)
             _entity.updated.timestamp = timestamp_factory()
 
+            return _entity
+
+        def request(self, entity: T_DatabaseModel) -> T_DatabaseModel:
+            """ request handler"""
+            _entity = self.prepare(entity)
+
             EventPreUpdate(_entity).publish()
             r = self.database.update(_entity)
             if not r:
@@ -104,6 +98,33 @@ def update_handler_factory(
             # return entity
             return _entity
 
+        def request_many(self, entity_list: List[T_DatabaseModel]) -> List[T_DatabaseModel]:
+            """ request handler, all entities in one bulk update """
+            entities = [self.prepare(e) for e in entity_list]
+            if not entities: return []
+
+            for e in entities:
+                EventPreUpdate(e).publish()
+            r = self.database.update_many(entities)
+            if len(r) != len(entities):
+                logger.error(color_red(messages.MSG_UPDATE_ERROR))
+                raise ServerError(messages.MSG_UPDATE_ERROR)
+            for e in entities:
+                EventPostUpdate(e).publish()
+
+            return entities
+
+    return Handler
+
+def update_handler_factory(
+        model: Type[T_DatabaseModel], 
+        database_model: Optional[Type[T_DatabaseModel]] = None
+    ) -> Callable[[Any], T_DatabaseModel]:
+    """ handler factory: public - update """
+    # type for fastapi
+    ModelType = NewType('Model', model)  # type: ignore
+    Handler = _update_handler_class(database_model or model)
+
     def update_entity(entity: ModelType = Body()):  # type: ignore
         handler = Handler.new()
         return handler.request(entity=entity)
@@ -118,15 +139,11 @@ def update_many_handler_factory(
     """ handler factory: public - update many """
     # type for fastapi
     ModelType = NewType('Model', model)  # type: ignore
+    Handler = _update_handler_class(database_model or model)
 
     def update_many(entity_list: List[ModelType]) -> List[T_DatabaseModel]:  # type: ignore
-        update_handler = update_handler_factory(model, database_model)
-        r = []
-        
-        for e in entity_list:
-            r.append(update_handler(e))
-            
-        return r
+        handler = Handler.new()
+        return handler.request_many(entity_list)
 
     return update_many
 
@@ -160,8 +177,8 @@ def delete_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[[A
 
     return delete_entity
 
-def get_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[[Any], T_DatabaseModel]:
-    """ handler factory: public - get """
+def _get_handler_class(database_model: Type[T_DatabaseModel]) -> Type[PublicHandler]:
+    """ get handler class, shared by sync and async get handlers """
     class Handler(PublicHandler):
         def request(self, entity_id: uuid.UUID) -> T_DatabaseModel:
             """ request handler"""
@@ -183,50 +200,158 @@ def get_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[[Any]
             # return entity
             return _entity
 
+        async def arequest(self, entity_id: uuid.UUID) -> T_DatabaseModel:
+            """ async request handler, runs in database executor (event subscribers can block) """
+            return await self.database.arun(self.request, entity_id)
+
+    return Handler
+
+def get_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[[Any], T_DatabaseModel]:
+    """ handler factory: public - get """
+    Handler = _get_handler_class(database_model)
+
     def get_entity(entity_id: uuid.UUID):  # type: ignore
         handler = Handler.new()
         return handler.request(entity_id=entity_id)
 
     return get_entity
 
-def find_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[[Any], List[T_DatabaseModel]]:
-    """ handler factory: public - find """
+def aget_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[..., Awaitable[T_DatabaseModel]]:
+    """ handler factory: public - get, async """
+    Handler = _get_handler_class(database_model)
+
+    async def get_entity(entity_id: uuid.UUID):  # type: ignore
+        handler = Handler.new()
+        return await handler.arequest(entity_id=entity_id)
+
+    return get_entity
+
+def _find_handler_class(database_model: Type[T_DatabaseModel]) -> Type[PublicHandler]:
+    """ find handler class, shared by find and find page handlers """
     class Handler(PublicHandler):
         """ find entity handler class"""
-        def request(self, params: DbParams) -> Optional[List[T_DatabaseModel]]:
-            """ request handler"""
-            
+        def prepare(self, params: DbParams, entities: Optional[DbResult] = None) -> DbResult:
+            """ returns result with applied params """
             EventFind(params, model_name=database_model.__name__).publish()
-            entities = self.database.find({}, database_model)
-            
+            if entities is None: entities = self.database.find({}, database_model)
+            return self.apply_db_params(entities, params)
+
+        def request(self, params: DbParams, response: Optional[Response] = None) -> Any:
+            """ request handler"""
+            entities = self.prepare(params)
+            if params.fetch_dict:
+                # records serialized directly to json for faster respond
+                return self.json_response(response, params, entities)
+            items = list(entities.fetch())
+            return self.cursor_headers(response, params, items)
+
+        def request_page(self, params: DbParams, response: Optional[Response] = None) -> Dict[str, Any]:
+            """ page request handler, records and total count """
+            items, total, is_estimate = self.prepare(params).find_page(params.fetch_dict, params.count_mode)
+            return dict(items=self.cursor_headers(response, params, items), total=total, is_estimate=is_estimate)
+
+        async def aprepare(self, params: DbParams) -> DbResult:
+            """ async prepare, event subscribers run in database executor """
+            return await self.database.arun(self.prepare, params, self.database.afind({}, database_model))
+
+        async def arequest(self, params: DbParams, response: Optional[Response] = None) -> Any:
+            """ async request handler"""
+            entities = await self.aprepare(params)
             if params.fetch_dict:
-                # fetching dict for faster respond serialization
-                return list(self.apply_db_params(entities, params).fetch_dict())
-            else:
-                return list(self.apply_db_params(entities, params).fetch())
+                return await self.database.arun(self.json_response, response, params, entities)
+            items = await entities.afetch()
+            return self.cursor_headers(response, params, items)
+
+        async def arequest_page(self, params: DbParams, response: Optional[Response] = None) -> Dict[str, Any]:
+            """ async page request handler, records and total count """
+            items, total, is_estimate = await (await self.aprepare(params)).afind_page(params.fetch_dict, params.count_mode)
+            return dict(items=self.cursor_headers(response, params, items), total=total, is_estimate=is_estimate)
+
+        def request_aggregate(self, params: DbAggregateParams) -> Dict[str, Any]:
+            """ aggregate request handler, grouped metrics and facet counts of records matching params """
+            return self.aggregate_result(params, self.prepare(params))
+
+        async def arequest_aggregate(self, params: DbAggregateParams) -> Dict[str, Any]:
+            """ async aggregate request handler """
+            entities = await self.aprepare(params)
+            return await self.database.arun(self.aggregate_result, params, entities)
+
+    return Handler
+
+def find_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[[Any], List[T_DatabaseModel]]:
+    """ handler factory: public - find """
+    Handler = _find_handler_class(database_model)
+
+    def find_entities(response: Response, params: DbParams = Depends(db_params)):  # type: ignore
+        handler = Handler.new()
+        return handler.request(params, response)
+
+    return find_entities
+
+def find_page_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[[Any], Dict[str, Any]]:
+    """ handler factory: public - find page (records + total count) """
+    Handler = _find_handler_class(database_model)
+
+    def find_entities_page(response: Response, params: DbParams = Depends(db_params)):  # type: ignore
+        handler = Handler.new()
+        return handler.request_page(params, response)
+
+    return find_entities_page
+
+def afind_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[..., Awaitable[List[T_DatabaseModel]]]:
+    """ handler factory: public - find, async """
+    Handler = _find_handler_class(database_model)
 
-    def find_entities(params: DbParams = Depends(db_params)):  # type: ignore
+    async def find_entities(response: Response, params: DbParams = Depends(db_params)):  # type: ignore
         handler = Handler.new()
-        return handler.request(params)
+        return await handler.arequest(params, response)
 
     return find_entities
 
+def afind_page_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[..., Awaitable[Dict[str, Any]]]:
+    """ handler factory: public - find page (records + total count), async """
+    Handler = _find_handler_class(database_model)
+
+    async def find_entities_page(response: Response, params: DbParams = Depends(db_params)):  # type: ignore
+        handler = Handler.new()
+        return await handler.arequest_page(params, response)
+
+    return find_entities_page
+
+def aggregate_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[[Any], Dict[str, Any]]:
+    """ handler factory: public - aggregate (group metrics + facet counts) """
+    Handler = _find_handler_class(database_model)
+
+    def aggregate_entities(params: DbAggregateParams):  # type: ignore
+        handler = Handler.new()
+        return handler.request_aggregate(params)
+
+    return aggregate_entities
+
+def aaggregate_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[..., Awaitable[Dict[str, Any]]]:
+    """ handler factory: public - aggregate (group metrics + facet counts), async """
+    Handler = _find_handler_class(database_model)
+
+    async def aggregate_entities(params: DbAggregateParams):  # type: ignore
+        handler = Handler.new()
+        return await handler.arequest_aggregate(params)
+
+    return aggregate_entities
+
 def count_handler_factory(database_model: Type[T_DatabaseModel]) -> Callable[[Any], List[T_DatabaseModel]]:
     """ handler factory: public - find """
     class Handler(PublicHandler):
         """ count entity handler class"""
-        def request(self, params: DbParams) -> int:
+        def request(self, params: DbParams, response: Optional[Response] = None) -> int:
             """ request handler"""
             
             EventCount(params, model_name=database_model.__name__).publish()
             entities = self.database.find({}, database_model)
-            return len(
-                self.apply_db_params(entities, params)
-            )
+            return self.count_result(response, params, database_model, entities)
 
-    def count_entities(params: DbParams = Depends(db_params)):  # type: ignore
+    def count_entities(response: Response, params: DbParams = Depends(db_params)):  # type: ignore
         handler = Handler.new()
-        return handler.request(params)
+        return handler.request(params, response)
 
     return count_entities
 
@@ -4,8 +4,9 @@
 uni.handler.model
 """
 from __future__ import annotations
-from typing import Any, Optional
+from typing import Any, Dict, Generic, List, Optional, TypeVar
 from pydantic import BaseModel, Field
+from pydantic.generics import GenericModel
 
 from ..utils import timestamp_factory
 
@@ -37,4 +38,41 @@ class StreamChunk(BaseModel):
     error: Optional[StreamError] = None
 
 
+T = TypeVar("T")
+
+class FindPage(GenericModel, Generic[T]):
+    """
+    FindPage is a model representing one page of find result.
+    Attributes:
+        items (List[T]): Records of the page.
+        total (int): Count of all records matching the query, limit excluded.
+        is_estimate (bool): Total is estimated (count_mode estimated).
+    """
+    items: List[T]
+    total: int
+    is_estimate: bool = False
+
+
+class FacetCount(BaseModel):
+    """
+    FacetCount is a model representing count of one value of facet field.
+    Attributes:
+        value (Any): Field value.
+        count (int): Count of records with the value.
+    """
+    value: Any
+    count: int
+
+
+class AggregateResult(BaseModel):
+    """
+    AggregateResult is a model representing aggregation of find result.
+    Attributes:
+        rows (List[Dict[str, Any]]): Group keys and metrics, one row per group.
+        facets (Dict[str, List[FacetCount]]): Value counts of facet fields, most frequent values first.
+    """
+    rows: List[Dict[str, Any]] = []
+    facets: Dict[str, List[FacetCount]] = {}
+
+
 if __name__ == "__main__": exit()
\ No newline at end of file
@@ -10,7 +10,7 @@ import io
 import os
 from typing import BinaryIO, Optional
 import uuid
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 from ...filestorage import UniFileStorageFactory
 from ...config import get_config
@@ -49,6 +49,8 @@ class File(DatabaseModel, BaseFile):
 
 class db_File(File):
     """ Internal, stored in db"""
+    # get_one cache
+    _cache_ttl: int = PrivateAttr(default=5)
     
 class UniUploadFile():  
     def __init__(self, filename: str, orig_name: str,  content_type: str = ""):
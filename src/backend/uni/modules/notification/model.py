@@ -64,6 +64,8 @@ class Notification(DatabaseModel, BaseNotification):
 class db_Notification(Notification):
     """ database model """
     _index: List[str] = PrivateAttr(default=["user_id", "read"])
+    # unread notifications badge, /count by user_id and read
+    _counters: List[List[str]] = PrivateAttr(default=[["user_id", "read"], ["user_id"]])
 
 class CreateNotification(BaseNotification):
     """ update model """
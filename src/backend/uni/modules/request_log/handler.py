@@ -25,10 +25,10 @@ class GetRequestLogHandler(PrivateHandler):
         # only root should have access
         self.root_check()
 
-        return self.apply_db_params(
+        return list(self.apply_db_params(
             self.database.find({}, db_RequestLog),
             params
-        ).fetch()
+        ).fetch())
 
 
     @classmethod
@@ -37,6 +37,8 @@ class User(DatabaseModel, BaseUser):
     root: bool = False
 
     _unique: List[str] = PrivateAttr(default=['email'])
+    # get_one cache, looked up on every authenticated request
+    _cache_ttl: int = PrivateAttr(default=5)
 
 class db_User(User):
     """ Internal, stored in db"""
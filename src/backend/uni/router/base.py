@@ -9,7 +9,7 @@ application base router
 from __future__ import annotations
 from enum import IntEnum, auto
 from typing import Any, Callable, List, Optional
-from fastapi import FastAPI, Request, Request, Depends, WebSocket
+from fastapi import FastAPI, Request, Request, Depends, Response, WebSocket
 from fastapi.responses import ORJSONResponse
 
 from ..default import UniDefault
@@ -116,6 +116,12 @@ class Router(UniDefault):
 
         return handler_name
 
+    def _orjson_response(self, content: Any, response: Response) -> ORJSONResponse:
+        """ json response, keeps headers set by handler """
+        ret = ORJSONResponse(content=content)
+        ret.headers.raw.extend(response.headers.raw)
+        return ret
+
     def _log_request(self, r: Route, request: Request) -> None:
         """ log public request """    
         if hasattr(r.handler, "__self__"):  # type: ignore
@@ -134,10 +140,13 @@ class Router(UniDefault):
             tags=[r.tag]
         )
         @rename(self._get_handler_name(r.handler))
-        async def route(request: Request, respond: Any = Depends(r.handler)):
+        async def route(request: Request, response: Response, respond: Any = Depends(r.handler)):
             self._log_request(r, request)
+            if isinstance(respond, Response):
+                respond.raw_headers.extend(response.headers.raw)
+                return respond
             if r.response_class == ORJSONResponse:
-                try: return ORJSONResponse(content=respond)
+                try: return self._orjson_response(respond, response)
                 except: pass
             return respond
 
@@ -153,10 +162,13 @@ class Router(UniDefault):
             tags=[r.tag]
         )
         @rename(self._get_handler_name(r.handler))
-        async def route(request: Request, respond: Any = Depends(r.handler)):
+        async def route(request: Request, response: Response, respond: Any = Depends(r.handler)):
             self._log_request(r, request)
+            if isinstance(respond, Response):
+                respond.raw_headers.extend(response.headers.raw)
+                return respond
             if r.response_class == ORJSONResponse:
-                try: return ORJSONResponse(content=respond)
+                try: return self._orjson_response(respond, response)
                 except: pass
             return respond
 
@@ -15,6 +15,7 @@ from ..limiter import ApiLimiter
 from ..services.permission import Permissions
 from ..logger import core_logger
 from ..handler.crud import private, public
+from ..handler.model import AggregateResult, FindPage
 
 from .base import Route, RouteMethod
 
@@ -40,8 +41,11 @@ def private_crud_routes(
         delete: bool = True, 
         get: bool = True, 
         find: bool = True,
+        find_page: bool = False,
+        aggregate: bool = False,
         count: bool = True,
         count_many = True,
+        async_handlers: bool = False,
         limiter_factory: Optional[Callable[[], List[ApiLimiter]]] = None
 ) -> List[Route]:
     if create:
@@ -98,7 +102,7 @@ def private_crud_routes(
                 path=f"{base_path}/get",
                 method=RouteMethod.POST,
                 tag=tag,
-                handler=private.get_handler_factory(database_model, root_only=root_only),
+                handler=(private.aget_handler_factory if async_handlers else private.get_handler_factory)(database_model, root_only=root_only),
                 response_model=base_model,
                 limits=limiter_factory() if limiter_factory else None
             )
@@ -110,12 +114,36 @@ def private_crud_routes(
                 path=f"{base_path}/find",
                 method=RouteMethod.POST,
                 tag=tag,
-                handler=private.find_handler_factory(database_model, root_only=root_only, fetch_dict_disabled=find_fetch_dict_disabled),
+                handler=(private.afind_handler_factory if async_handlers else private.find_handler_factory)(database_model, root_only=root_only, fetch_dict_disabled=find_fetch_dict_disabled),
                 response_model=List[base_model],
                 limits=limiter_factory() if limiter_factory else None
             )
         )
 
+    if find_page:
+        routes.append(
+            Route(
+                path=f"{base_path}/find_page",
+                method=RouteMethod.POST,
+                tag=tag,
+                handler=(private.afind_page_handler_factory if async_handlers else private.find_page_handler_factory)(database_model, root_only=root_only, fetch_dict_disabled=find_fetch_dict_disabled),
+                response_model=FindPage[base_model],  # type: ignore
+                limits=limiter_factory() if limiter_factory else None
+            )
+        )
+
+    if aggregate:
+        routes.append(
+            Route(
+                path=f"{base_path}/aggregate",
+                method=RouteMethod.POST,
+                tag=tag,
+                handler=(private.aaggregate_handler_factory if async_handlers else private.aggregate_handler_factory)(database_model, root_only=root_only),
+                response_model=AggregateResult,
+                limits=limiter_factory() if limiter_factory else None
+            )
+        )
+
     if count:
         routes.append(
             Route(
@@ -157,7 +185,10 @@ def public_crud_routes(
         delete: bool = True, 
         get: bool = True, 
         find: bool = True,
+        find_page: bool = False,
+        aggregate: bool = False,
         count: bool = True,
+        async_handlers: bool = False,
         limiter_factory: Optional[Callable[[], List[ApiLimiter]]] = None
 ) -> List[Route]:
     if create:
@@ -214,7 +245,7 @@ def public_crud_routes(
                 path=f"{base_path}/get",
                 method=RouteMethod.POST,
                 tag=tag,
-                handler=public.get_handler_factory(database_model),
+                handler=(public.aget_handler_factory if async_handlers else public.get_handler_factory)(database_model),
                 response_model=base_model,
                 limits=limiter_factory() if limiter_factory else None
             )
@@ -226,12 +257,36 @@ def public_crud_routes(
                 path=f"{base_path}/find",
                 method=RouteMethod.POST,
                 tag=tag,
-                handler=public.find_handler_factory(database_model),
+                handler=(public.afind_handler_factory if async_handlers else public.find_handler_factory)(database_model),
                 response_model=List[base_model],
                 limits=limiter_factory() if limiter_factory else None
             )
         )
 
+    if find_page:
+        routes.append(
+            Route(
+                path=f"{base_path}/find_page",
+                method=RouteMethod.POST,
+                tag=tag,
+                handler=(public.afind_page_handler_factory if async_handlers else public.find_page_handler_factory)(database_model),
+                response_model=FindPage[base_model],  # type: ignore
+                limits=limiter_factory() if limiter_factory else None
+            )
+        )
+
+    if aggregate:
+        routes.append(
+            Route(
+                path=f"{base_path}/aggregate",
+                method=RouteMethod.POST,
+                tag=tag,
+                handler=(public.aaggregate_handler_factory if async_handlers else public.aggregate_handler_factory)(database_model),
+                response_model=AggregateResult,
+                limits=limiter_factory() if limiter_factory else None
+            )
+        )
+
     if count:
         routes.append(
             Route(
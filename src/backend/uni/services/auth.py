@@ -61,6 +61,8 @@ class db_User(DatabaseModel):
     root: bool = False
     password_hash: str = ""
 
+    _cache_ttl: int = PrivateAttr(default=5)
+
 # tokens storge
 __tokens: Dict[str, AuthToken] = {
     __SYSTEM_TOKEN.token: __SYSTEM_TOKEN
@@ -22,6 +22,17 @@ logger = core_logger().getChild("permission")
 
 MSG_PERM_DENIED = "permission denied"
 
+# permission bits, denormalized in DatabaseModel.perm_bits for indexed permission filter
+PERM_BITS = {
+    "group.read": 1,
+    "group.write": 2,
+    "all.read": 4,
+    "all.write": 8,
+    "other.read": 16,
+    "other.write": 32,
+}
+PERM_BITS_MAX = 64
+
 class ModelMeta(BaseModel):
     """ Database model meta """
     timestamp: int = 0
@@ -73,6 +84,25 @@ class Permissions(BaseModel):
             logger.error(color_red(str(e)))
             raise
 
+    def bits(self) -> int:
+        """ permissions as bitmask (PERM_BITS) """
+        ret = 0
+        for name, bit in PERM_BITS.items():
+            level, _type = name.split(".")
+            if getattr(getattr(self, level), _type): ret |= bit
+        return ret
+
+def perm_bits_mask(write: bool = False) -> int:
+    """ bitmask of group, other and all permission of given type """
+    _type = "write" if write else "read"
+    return PERM_BITS[f"group.{_type}"] | PERM_BITS[f"other.{_type}"] | PERM_BITS[f"all.{_type}"]
+
+def perm_bits_values(mask: int) -> List[int]:
+    """ all perm_bits values matching mask (perm_bits & mask), as list for indexed "in" filter,
+        56 values for read or write mask (3 of 6 bits), each one index lookup,
+        bitwise predicate is not indexable and OR with owner condition would scan whole table (SQLite) """
+    return [v for v in range(PERM_BITS_MAX) if v & mask]
+
 class User(Protocol):
     id: uuid.UUID
     root: bool
@@ -231,25 +261,20 @@ def permission_db_filter(user: Optional[User], write: bool = False):
         write (bool): If True, checks for write permissions. If False, checks for read permissions. Default is False.
     Returns:
         dict: A dictionary representing the OR conditions for the database filter based on the user's permissions.
+    Group, other and all permissions are matched by one indexed condition on perm_bits
+    (perm_bits & mask compiled to "in" of all matching values).
     """
     conditions: List[Tuple[str, str, Any]] = []
 
-    # permission type
-    _type = "read"
-    if write:
-        _type = "write"
-
     # user? check owner id
     if user:
         conditions.append(
             ("created.user_id", "==", user.id)
         )
 
-    conditions += [
-        (f"permissions.group.{_type}", "==", True),
-        (f"permissions.other.{_type}", "==", True),
-        (f"permissions.all.{_type}", "==", True)
-    ]
+    conditions.append(
+        ("perm_bits", "in", perm_bits_values(perm_bits_mask(write)))
+    )
 
     return {"OR": conditions}
 